@@ -1,11 +1,13 @@
 # app.py
 import os
+import time
+import secrets
 import subprocess
 from datetime import datetime
 
 import streamlit as st
-import tensorflow as tf
-from tensorflow.python.client import device_lib
+
+from src.utils.gpu_info import probe_devices
 
 # ======= Página =======
 st.set_page_config(page_title="GPT-OSS WebChat", page_icon="💬", layout="wide")
@@ -40,31 +42,30 @@ if st.sidebar.button("🧹 Limpar conversa"):
     st.session_state["history"] = []
     st.experimental_rerun()
 
+# Painel de ambiente/GPU sob demanda: o TensorFlow só é importado ao abrir
 st.sidebar.markdown("---")
-st.sidebar.markdown("### 💻 Ambiente Ativo")
-st.sidebar.write("**TensorFlow:**", tf.__version__)
-st.sidebar.write("**Dispositivos TensorFlow:**", len(tf.config.list_physical_devices()))
+show_env = st.sidebar.checkbox("💻 Mostrar ambiente e GPU", value=False, key="show_env")
+if show_env:
+    st.sidebar.markdown("### 💻 Ambiente Ativo")
+    with st.spinner("Consultando TensorFlow (apenas na primeira vez)..."):
+        env = probe_devices()
+    st.sidebar.write("**TensorFlow:**", env.tf_version or "não carregado")
+    st.sidebar.write("**Dispositivos TensorFlow:**", env.n_devices)
 
 # ======= GPU info =======
 def show_gpu_info():
-    try:
-        devices = device_lib.list_local_devices()
-        gpus = [d for d in devices if d.device_type == "GPU"]
-        if gpus:
-            gpu = gpus[0]
-            st.success("✅ GPU detectada e ativa!")
-            name = gpu.physical_device_desc.split("name: ")[1].split(",")[0]
-            st.write(f"**Nome:** {name}")
-            st.write(f"**Tipo:** {gpu.device_type}")
-            st.write(f"**Memória disponível:** {round(gpu.memory_limit / (1024**3), 2)} GB")
-
-            build = tf.sysconfig.get_build_info()
-            st.write(f"**CUDA:** {build.get('cuda_version', 'Desconhecida')}")
-            st.write(f"**cuDNN:** {build.get('cudnn_version', 'Desconhecida')}")
-        else:
-            st.warning("⚠️ Nenhuma GPU detectada. TensorFlow está usando apenas CPU.")
-    except Exception as e:
-        st.error(f"Erro ao verificar status da GPU: {e}")
+    env = probe_devices()
+    if env.error:
+        st.error(f"Erro ao verificar status da GPU: {env.error}")
+    elif env.gpu_name:
+        st.success("✅ GPU detectada e ativa!")
+        st.write(f"**Nome:** {env.gpu_name}")
+        st.write(f"**Tipo:** {env.device_type}")
+        st.write(f"**Memória disponível:** {env.memory_gb} GB")
+        st.write(f"**CUDA:** {env.cuda}")
+        st.write(f"**cuDNN:** {env.cudnn}")
+    else:
+        st.warning("⚠️ Nenhuma GPU detectada. TensorFlow está usando apenas CPU.")
 
 # ======= Estado inicial =======
 if "messages" not in st.session_state:
@@ -73,6 +74,9 @@ if "messages" not in st.session_state:
         {"role": "assistant", "content": "Tudo certo, Maykon. O TensorFlow está operando com aceleração de hardware!", "ts": datetime.now().strftime("%H:%M:%S")},
     ]
 
+# Identifica a sessão na fila de geração (rodízio justo entre usuários)
+st.session_state.setdefault("session_id", secrets.token_hex(8))
+
 # Histórico “canônico” para export/contagem da sidebar
 if "history" not in st.session_state:
     st.session_state["history"] = st.session_state["messages"][:]
@@ -84,36 +88,88 @@ st.markdown("""
 .user-bubble { background-color:#1E88E5;color:#fff;padding:12px;border-radius:12px;margin-bottom:8px;max-width:80%; }
 .assistant-bubble { background-color:#E8EAF6;color:#000;padding:12px;border-radius:12px;margin-bottom:8px;max-width:80%; }
 .timestamp { font-size:.75em;color:gray;text-align:right;margin-bottom:15px; }
+.cached-tag { font-size:.75em;color:#6A1B9A;margin-left:6px; }
 </style>
 """, unsafe_allow_html=True)
 
 # ======= Render das mensagens =======
+def bubble_html(role: str, content: str, cached: bool = False) -> str:
+    bubble = "user-bubble" if role == "user" else "assistant-bubble"
+    prefix = "🧑 Você:" if role == "user" else "🤖 Assistente:"
+    tag = "<span class='cached-tag'>⚡ cache</span>" if cached else ""
+    return f"<div class='{bubble}'><b>{prefix}</b>{tag}<br>{content}</div>"
+
+def dropped_notice(dropped: dict) -> str:
+    """Aviso do que o orçamento de tokens deixou fora do prompt."""
+    return "ℹ️ Para caber no contexto ficaram de fora: " + ", ".join(f"{n} item(ns) de {name}" for name, n in dropped.items() if n)
+
 for msg in st.session_state["messages"]:
-    bubble = "user-bubble" if msg["role"] == "user" else "assistant-bubble"
-    prefix = "🧑 Você:" if msg["role"] == "user" else "🤖 Assistente:"
-    st.markdown(f"<div class='{bubble}'><b>{prefix}</b><br>{msg['content']}</div>", unsafe_allow_html=True)
+    st.markdown(bubble_html(msg["role"], msg["content"], msg.get("cached", False)), unsafe_allow_html=True)
+    if msg.get("dropped"):
+        st.caption(dropped_notice(msg["dropped"]))
     st.markdown(f"<div class='timestamp'>{msg.get('ts','')}</div>", unsafe_allow_html=True)
 
 # ======= Montagem de prompt (Contexto + KB + Histórico) =======
-from src.utils.knowledge_base import retrieve
-from src.utils.history_manager import build_history_text, chunk_history_dynamic
-from src.utils.ollama_client import OllamaClient
+from src.utils.knowledge_base import embed_query, retrieve_passages
+from src.utils.history_manager import build_history_text
+from src.utils.history_compactor import get_history_compactor
+from src.utils.prompt_budget import BudgetSection, PromptBudgetError, allocate, prompt_budget
+from src.utils.response_cache import cache_scope, get_response_cache
+from src.utils.conversation_store import get_conversation_store
+from src.utils.async_ollama import get_bridged_client
+from src.utils.scheduler import GenerationCancelled, get_scheduler
+from src.utils.tokens import count_tokens
+from src.utils.tracing import span, start_trace, traces_to_jsonl
+
+PROMPT_TEMPLATE = """Você é um assistente técnico que responde em português do Brasil, direto ao ponto, sem floreios e com humor sagaz quando couber.
+
+# Contexto do usuário
+{user_ctx}
+
+# Trechos relevantes dos anexos (RAG)
+{recovered}
+
+# Histórico (resumo bruto)
+{history}
+
+# Pergunta atual
+{query}
+
+# Exigências de estilo
+- Seja {style}
+- Se usar o material dos anexos, cite trechos/referências de forma natural dentro do texto
+- Se faltar dado, diga o que falta em vez de inventar
+"""
+
+def context_size() -> int:
+    return int(st.session_state.get("context_size") or 4096)
 
 def build_prompt(query: str) -> str:
+    with span("build_prompt") as sp:
+        return _build_prompt(query, sp)
+
+def _build_prompt(query: str, sp) -> str:
     # 1) Contexto manual
-    user_ctx = st.session_state.get("context") or ""
+    user_ctx = (st.session_state.get("context") or "").strip()
 
-    # 2) Contexto recuperado da KB (RAG-lite)
+    # 2) Contexto recuperado da KB (RAG-lite), em ordem de relevância
     kb = st.session_state.get("kb")
-    recovered_text = ""
-    meta = []
+    passages = []
     if kb:
-        recovered_text, meta = retrieve(query, kb, top_k=4, max_chars=4000)
+        passages = [p for p, _ in retrieve_passages(query, kb, top_k=4, max_chars=4000)]
 
-    # 3) Histórico (texto plain concatenado, com chunking seguro)
+    # 3) Histórico: uma mensagem por item, para o orçamento cortar das mais antigas para as
+    #    mais recentes (a última troca entra sempre que couber; blocos grandes de 8000
+    #    caracteres saíam inteiros, levando junto o turno anterior)
+    #    Com a compactação ligada: resumos prontos dos segmentos antigos + últimas mensagens literais
     hist = st.session_state.get("history", [])
-    _, total_chars, n_chunks, chunks = chunk_history_dynamic(hist, max_chars_per_chunk=8000, overlap=800)
-    history_text = "\n\n".join(chunks) if chunks else ""
+    if st.session_state.get("history_compaction"):
+        with span("history_compaction", messages=len(hist)) as hsp:
+            compacted = get_history_compactor().compact(hist)
+            chunks = compacted.items
+            hsp.set(items=len(chunks), summarized=compacted.summarized, pending=compacted.pending)
+    else:
+        chunks = [build_history_text([m]) for m in hist if m.get("content", "")]
 
     # 4) Esforço/estilo da resposta
     effort = (st.session_state.get("effort") or "conciso").strip().lower()
@@ -124,33 +180,106 @@ def build_prompt(query: str) -> str:
     else:
         style = "resposta curta, direta e técnica"
 
-    # 5) Prompt final (PT-BR, sem floreios)
-    prompt = f"""Você é um assistente técnico que responde em português do Brasil, direto ao ponto, sem floreios e com humor sagaz quando couber.
-
-# Contexto do usuário
-{user_ctx.strip()}
-
-# Trechos relevantes dos anexos (RAG)
-{recovered_text.strip() or "[nenhum trecho relevante]"}
-
-# Histórico (resumo bruto)
-{history_text.strip() or "[início de conversa]"}
-
-# Pergunta atual
-{query.strip()}
-
-# Exigências de estilo
-- Seja {style}
-- Se usar o material dos anexos, cite trechos/referências de forma natural dentro do texto
-- Se faltar dado, diga o que falta em vez de inventar
-"""
+    # 5) Orçamento de tokens: pergunta > contexto manual > anexos > histórico (recente primeiro);
+    #    o num_ctx inteiro não vai para o prompt: parte fica reservada para a resposta
+    overhead = count_tokens(PROMPT_TEMPLATE.format(user_ctx="", recovered="", history="", query="", style=style))
+    budget = allocate(prompt_budget(context_size()), [
+        BudgetSection("pergunta", [query.strip()], required=True),
+        BudgetSection("contexto", [user_ctx] if user_ctx else [], truncatable=True),
+        BudgetSection("anexos", passages),
+        BudgetSection("historico", chunks[::-1], truncatable=True),
+    ], overhead=overhead)
+    st.session_state["prompt_budget"] = budget
+    if budget.exceeded:
+        raise PromptBudgetError(
+            f"a pergunta atual sozinha já ocupa ~{budget.used} tokens, acima do limite de {budget.budget} "
+            f"(tamanho do contexto menos a reserva para a resposta). "
+            f"Aumente o Tamanho do contexto (tokens) na barra lateral."
+        )
+
+    # 6) Prompt final (PT-BR, sem floreios)
+    kept = budget.kept
+    prompt = PROMPT_TEMPLATE.format(
+        user_ctx="".join(kept["contexto"]),
+        recovered="\n\n".join(kept["anexos"]) or "[nenhum trecho relevante]",
+        history="\n\n".join(kept["historico"][::-1]) or "[início de conversa]",
+        query=query.strip(),
+        style=style,
+    )
+    sp.set(prompt_chars=len(prompt), prompt_tokens=budget.used, passages=len(kept["anexos"]))
     return prompt
 
-def answer_with_ollama(prompt: str) -> str:
-    client = OllamaClient()
+def stream_with_ollama(prompt: str, on_wait=None):
+    """
+    Gera StreamChunks conforme o modelo responde, passando pela fila do processo
+    (vagas por modelo, rodízio entre sessões). `on_wait(posição)` é chamado enquanto espera.
+    """
     model = st.session_state.get("model_choice") or "gpt-oss:20b"
     temperature = float(st.session_state.get("temperature") or 1.0)
-    return client.ask(prompt=prompt, model=model, temperature=temperature)
+    return get_scheduler().stream(
+        get_bridged_client(), st.session_state["session_id"],
+        prompt=prompt, model=model, temperature=temperature, num_ctx=context_size(), on_wait=on_wait,
+    )
+
+def response_cache_lookup(query: str):
+    """(escopo, embedding da pergunta, resposta em cache ou None) — só com o cache de respostas ligado."""
+    kb = st.session_state.get("kb")
+    scope = cache_scope(
+        model=st.session_state.get("model_choice") or "gpt-oss:20b",
+        temperature=float(st.session_state.get("temperature") or 1.0),
+        kb_sig=kb.meta.get("kb_sig") if kb else None,
+        user_ctx=st.session_state.get("context") or "",
+        effort=st.session_state.get("effort") or "conciso",
+        history=st.session_state.get("history", []),  # a pergunta atual ainda não foi registrada
+    )
+    try:
+        qvec = embed_query(query)
+    except Exception:
+        qvec = None  # sem embeddings: só o match exato
+    return scope, qvec, get_response_cache().get(scope, query, qvec)
+
+def record_message(msg: dict) -> None:
+    """Mensagem vai para a tela, para o histórico do prompt e para o log da conversa em disco."""
+    st.session_state["messages"].append(msg)
+    st.session_state["history"].append({"role": msg["role"], "content": msg["content"]})
+    convo_id = st.session_state.get("current_convo_id")
+    if convo_id:
+        try:
+            get_conversation_store().append(convo_id, msg)
+        except OSError as e:
+            st.warning(f"Não foi possível salvar a mensagem em disco: {e}")
+
+STREAM_REFRESH_S = 0.05  # intervalo mínimo entre redesenhos do balão parcial
+MAX_SESSION_TRACES = 50   # traces guardados na sessão (exportáveis em JSONL)
+
+def keep_trace(trace) -> None:
+    """Guarda o trace só na sessão (os últimos MAX_SESSION_TRACES); em disco, só pelo botão de exportar JSONL."""
+    traces = st.session_state.setdefault("traces", [])
+    traces.append(trace)
+    del traces[:-MAX_SESSION_TRACES]
+
+def show_last_trace() -> None:
+    traces = st.session_state.get("traces") or []
+    if not traces:
+        return
+    trace = traces[-1]
+    with st.expander(f"⏱️ Etapas da última resposta – {trace.total_ms / 1000:.2f} s", expanded=False):
+        st.table([
+            {
+                "etapa": ("  " * s.depth) + s.name,
+                "início (ms)": round(s.start_ms, 1),
+                "duração (ms)": round(s.dur_ms, 1),
+                "detalhes": ", ".join(f"{k}={v}" for k, v in s.attrs.items()),
+            }
+            for s in sorted(trace.spans, key=lambda s: s.start_ms)
+        ])
+        st.download_button(
+            f"⬇️ Exportar traces da sessão ({len(traces)}) em JSONL",
+            traces_to_jsonl(traces), file_name="traces.jsonl", mime="application/x-ndjson",
+        )
+
+if st.session_state.get("show_metrics"):
+    show_last_trace()
 
 # ======= Form de envio (compatível: limpa input, sem eco) =======
 with st.form("chat_form", clear_on_submit=True):
@@ -158,28 +287,87 @@ with st.form("chat_form", clear_on_submit=True):
     submitted = st.form_submit_button("Enviar")
 
 if submitted and user_input:
-    # inclui pergunta no histórico
-    now = datetime.now().strftime("%H:%M:%S")
-    st.session_state["messages"].append({"role": "user", "content": user_input, "ts": now})
-    st.session_state["history"].append({"role": "user", "content": user_input})
-
-    # monta prompt unificado (contexto + KB + histórico)
-    try:
-        prompt = build_prompt(user_input)
-        reply = answer_with_ollama(prompt)
-    except Exception as e:
-        reply = f"Falha ao consultar o modelo local (Ollama). Detalhes: {e}"
-
-    # inclui resposta
-    st.session_state["messages"].append({"role": "assistant", "content": reply, "ts": datetime.now().strftime("%H:%M:%S")})
-    st.session_state["history"].append({"role": "assistant", "content": reply})
-
-    # rerun sem reusar o input (o form já limpou)
-    st.experimental_rerun()
+    model = st.session_state.get("model_choice") or "gpt-oss:20b"
+    # a pergunta só entra no histórico (tela, prompt e disco) junto com a resposta: rejeitada
+    # pelo orçamento, ela não fica registrada sem resposta nem duplica quando reenviada
+    question = {"role": "user", "content": user_input, "ts": datetime.now().strftime("%H:%M:%S")}
+    rejected = False
+    with start_trace("chat", model=model, query_chars=len(user_input)) as trace:
+        # pergunta + balão da resposta, preenchido conforme os tokens chegam
+        st.markdown(bubble_html("user", user_input), unsafe_allow_html=True)
+        placeholder = st.empty()
+        placeholder.markdown(bubble_html("assistant", "<i>pensando…</i>"), unsafe_allow_html=True)
+
+        # cache de respostas (opcional): pergunta repetida no mesmo escopo volta na hora
+        use_cache = st.session_state.get("response_cache_on", False)
+        hit = None
+        if use_cache:
+            with span("cache_lookup") as sp:
+                scope, qvec, hit = response_cache_lookup(user_input)
+                sp.set(hit=hit is not None)
+
+        parts, stats, dropped = [], {}, {}
+        if hit is not None:
+            reply = hit.answer
+            stats = {**hit.stats, "cached": True, "similarity": round(hit.similarity, 3)}
+        else:
+            # monta prompt unificado (contexto + KB + histórico)
+            complete = False
+            try:
+                prompt = build_prompt(user_input)
+                dropped = {k: n for k, n in st.session_state["prompt_budget"].dropped.items() if n}
+                if dropped:
+                    st.caption(dropped_notice(dropped))
+                last_draw = 0.0
+
+                def show_queue(position: int) -> None:
+                    ahead = f"{position} pedido(s) à frente" if position else "você é o próximo"
+                    placeholder.markdown(bubble_html("assistant", f"<i>⏳ Modelo ocupado – na fila, {ahead}…</i>"), unsafe_allow_html=True)
+
+                for chunk in stream_with_ollama(prompt, on_wait=show_queue):
+                    if chunk.text:
+                        parts.append(chunk.text)
+                        if time.perf_counter() - last_draw >= STREAM_REFRESH_S:
+                            placeholder.markdown(bubble_html("assistant", "".join(parts) + " ▌"), unsafe_allow_html=True)
+                            last_draw = time.perf_counter()
+                    if chunk.done:
+                        stats = chunk.stats
+                reply = "".join(parts).strip() or "*Resposta vazia do modelo.*"
+                complete = bool(parts)
+            except PromptBudgetError as e:
+                reply, rejected = f"🚨 Prompt não enviado: {e}", True
+            except GenerationCancelled as e:
+                reply = ("".join(parts).strip() + "\n\n" if parts else "") + f"*(geração cancelada: {e})*"
+            except Exception as e:
+                if parts:  # conexão caiu no meio: preserva o que já chegou
+                    reply = "".join(parts).strip() + f"\n\n*(resposta interrompida: {e})*"
+                else:
+                    reply = f"Falha ao consultar o modelo local (Ollama). Detalhes: {e}"
+            if use_cache and complete:  # só respostas inteiras vão para o cache
+                try:
+                    get_response_cache().put(scope, user_input, reply, vector=qvec, stats=stats)
+                except Exception:
+                    pass  # cache é otimização: falha de disco não afeta a conversa
+        placeholder.markdown(bubble_html("assistant", reply, cached=hit is not None), unsafe_allow_html=True)
+
+        if not rejected:
+            # inclui pergunta e resposta
+            record_message(question)
+            record_message({"role": "assistant", "content": reply, "ts": datetime.now().strftime("%H:%M:%S"), "stats": stats, "cached": hit is not None, "dropped": dropped})
+
+            # resumos dos segmentos antigos em segundo plano: prontos para os próximos turnos
+            if st.session_state.get("history_compaction"):
+                get_history_compactor().schedule(st.session_state["history"], model, num_ctx=context_size())
+    keep_trace(trace)
+
+    # rerun sem reusar o input (o form já limpou); rejeitada, o aviso fica na tela até o próximo envio
+    if not rejected:
+        st.experimental_rerun()
 
 # Linha divisória (compat)
 st.markdown("<hr>", unsafe_allow_html=True)
 
-# GPU
-show_gpu_info()
+# GPU (somente com o painel aberto)
+if show_env:
+    show_gpu_info()
 st.caption("🔹 GPT-OSS WebChat – Ambiente acelerado por GPU NVIDIA RTX 3050 Ti")
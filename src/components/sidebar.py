@@ -1,13 +1,15 @@
 # src/components/sidebar.py
 from __future__ import annotations
-import json
+import secrets
 from pathlib import Path
 from datetime import datetime
 import streamlit as st
 
-from src.utils.ollama_client import OllamaClient
-from src.utils.knowledge_base import build_kb_from_uploads
-from src.utils.history_manager import export_history_to_txt, export_history_to_docx
+from src.utils.model_catalog import get_model_catalog
+from src.utils.knowledge_base import EMBED_MODEL, KBCache, build_kb_from_uploads, retrieval_cache_stats
+from src.utils.embedding_store import get_store
+from src.utils.export_worker import get_export_worker
+from src.utils.conversation_store import get_conversation_store
 
 # Persistência de conversas
 HIST_DIR = Path(__file__).resolve().parent.parent.parent / "conversations"
@@ -15,48 +17,91 @@ HIST_DIR.mkdir(exist_ok=True)
 EXPORT_DIR = HIST_DIR / "exports"
 EXPORT_DIR.mkdir(exist_ok=True)
 
-def _save_conversation(convo_id: str, history: list[dict]) -> None:
-    (HIST_DIR / f"{convo_id}.json").write_text(
-        json.dumps(history, ensure_ascii=False, indent=2),
-        encoding="utf-8"
-    )
-
 def _new_conversation_id() -> str:
-    return datetime.now().strftime("%Y%m%d_%H%M%S")
+    # sufixo aleatório: duas sessões podem abrir conversa no mesmo segundo
+    return datetime.now().strftime("%Y%m%d_%H%M%S_") + secrets.token_hex(2)
+
+def _age_label(age_s: float | None) -> str:
+    if age_s is None:
+        return "?"
+    return f"{age_s / 60:.0f} min" if age_s >= 60 else f"{age_s:.0f} s"
+
+def _open_conversation(convo_id: str) -> None:
+    messages = get_conversation_store().load(convo_id)
+    st.session_state["current_convo_id"] = convo_id
+    st.session_state["messages"] = messages
+    st.session_state["history"] = [{"role": m.get("role"), "content": m.get("content", "")} for m in messages]
+
+def _show_past_conversations() -> None:
+    store = get_conversation_store()
+    with st.sidebar.expander("🗂️ Conversas anteriores", expanded=False):
+        query = st.text_input("Buscar nas conversas", key="convo_search", placeholder="Palavra ou trecho…")
+        current = st.session_state.get("current_convo_id")
+        if query.strip():
+            hits = store.search(query, limit=20)
+            if not hits:
+                st.caption("Nada encontrado.")
+            for i, hit in enumerate(hits):
+                st.markdown(f"**{hit.meta.title or hit.meta.id}** · {hit.role}: {hit.snippet}")
+                if hit.meta.id != current and st.button("Abrir", key=f"open_hit_{i}_{hit.meta.id}"):
+                    _open_conversation(hit.meta.id)
+                    st.experimental_rerun()
+            return
+        for meta in store.list(limit=20):
+            when = datetime.fromtimestamp(meta.updated).strftime("%d/%m %H:%M")
+            label = f"{meta.title or meta.id} ({meta.n} msgs, {when})"
+            if meta.id == current:
+                st.caption(f"▶ {label}")
+            elif st.button(label, key=f"open_{meta.id}"):
+                _open_conversation(meta.id)
+                st.experimental_rerun()
 
 def _count_user_assistant(history: list[dict]) -> int:
     return sum(1 for m in history if m.get("role") in {"user", "assistant"})
 
 def _auto_export_history(history: list[dict]) -> tuple[Path, Path] | None:
+    """Agenda TXT + DOCX em segundo plano (o clique em "Novo chat" não espera o DOCX)."""
     if not history:
         return None
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    txt_path = EXPORT_DIR / f"chat_{ts}.txt"
-    docx_path = EXPORT_DIR / f"chat_{ts}.docx"
-    # TXT
-    txt_buf = export_history_to_txt(history)
-    txt_path.write_bytes(txt_buf.getvalue())
-    # DOCX
-    docx_buf = export_history_to_docx(history)
-    docx_path.write_bytes(docx_buf.getvalue())
-    return txt_path, docx_path
+    paths, future = get_export_worker().export_files(history, EXPORT_DIR, f"chat_{ts}")
+    st.session_state["pending_export"] = future
+    return paths
+
+def _report_pending_export() -> None:
+    # Resultado da exportação automática aparece no primeiro rerun depois de concluída
+    future = st.session_state.get("pending_export")
+    if future is None or not future.done():
+        return
+    del st.session_state["pending_export"]
+    try:
+        txtp, docxp = future.result()
+        st.sidebar.success(f"💾 Histórico exportado em:\n- {txtp}\n- {docxp}")
+    except Exception as e:
+        st.sidebar.error(f"Falha na exportação automática: {e}")
 
 def setup_sidebar() -> None:
     st.sidebar.title("📚 Configuração")
+    st.session_state.setdefault("current_convo_id", _new_conversation_id())
+    _report_pending_export()
 
-    # Cliente de modelos (Ollama)
-    client = OllamaClient()
-    try:
-        models = client.list_models()
-    except Exception as exc:
-        st.sidebar.error(f"Falha ao obter modelos do Ollama: {exc}")
+    # Catálogo de modelos (Ollama): lido da memória; atualizado em segundo plano
+    catalog = get_model_catalog().snapshot()
+    models = catalog.names
+    if not models:
+        if catalog.error:
+            st.sidebar.error(f"Falha ao obter modelos do Ollama: {catalog.error}")
         models = ["gpt-oss:20b"]
+    elif catalog.error:
+        st.sidebar.caption(f"⚠️ Ollama não respondeu; lista de modelos de {_age_label(catalog.age_s())} atrás.")
+    labels = {m.name: m.label for m in catalog.models}
 
     default_model = "gpt-oss:20b" if "gpt-oss:20b" in models else models[0]
     model_choice = st.sidebar.selectbox(
         label="Modelo",
         options=models,
         index=models.index(default_model),
+        format_func=lambda name: labels.get(name, name),
         key="model_choice",
     )
 
@@ -84,6 +129,21 @@ def setup_sidebar() -> None:
         value=True,
         key="show_metrics",
     )
+    st.sidebar.checkbox(
+        "⚡ Reaproveitar respostas de perguntas repetidas",
+        value=False,
+        key="response_cache_on",
+        help="Mesma pergunta (ou muito parecida), mesmo modelo, temperatura, tipo de resposta, anexos, contexto "
+             "e mesmos turnos anteriores da conversa: a resposta salva volta na hora, sem gerar de novo.",
+    )
+    st.sidebar.checkbox(
+        "🗜️ Compactar histórico antigo (resumos)",
+        value=False,
+        key="history_compaction",
+        help="Depois de cada resposta, o modelo incorpora as mensagens antigas a um resumo acumulado, "
+             "em segundo plano e só quando nenhuma pergunta está na fila; o prompt leva esse resumo + "
+             "as últimas mensagens literais, e não cresce a cada turno. Resumos guardados em disco.",
+    )
 
     context = st.sidebar.text_area(
         "Contexto adicional (opcional)",
@@ -117,14 +177,24 @@ def setup_sidebar() -> None:
     )
 
     # Indexação leve (RAG-lite) assim que houver anexos
+    # (cache por conteúdo: reruns não re-embutem arquivos já processados;
+    #  o store em disco evita re-embutir entre sessões e reinícios)
     if uploaded_files:
         try:
-            kb = build_kb_from_uploads(uploaded_files)
+            kb_cache = st.session_state.setdefault("kb_cache", KBCache())
+            kb = build_kb_from_uploads(uploaded_files, cache=kb_cache, store=get_store(EMBED_MODEL))
             st.session_state["kb"] = kb
+            dups = kb.meta.get("duplicates") or 0
+            count = f"{len(kb.chunks)} trechos" + (f", {dups} repetidos ignorados" if dups else "")
             if kb.use_embeddings:
-                st.sidebar.success(f"Base preparada ({len(kb.chunks)} trechos). Embeddings: ok.")
+                st.sidebar.success(f"Base preparada ({count}). Embeddings: ok.")
             else:
-                st.sidebar.warning(f"Base preparada ({len(kb.chunks)} trechos). Embeddings indisponíveis (fallback: palavras-chave).")
+                st.sidebar.warning(f"Base preparada ({count}). Embeddings indisponíveis (fallback: palavras-chave).")
+            if show_metrics:
+                st.sidebar.caption(" · ".join(
+                    f"Cache de {name}: {s.hits}/{s.hits + s.misses} acertos"
+                    for name, s in retrieval_cache_stats().items()
+                ))
         except Exception as e:
             st.sidebar.error(f"Falha ao preparar base de conhecimento: {e}")
             st.session_state["kb"] = None
@@ -154,22 +224,20 @@ def setup_sidebar() -> None:
                 # Exporta antes de limpar
                 history = st.session_state.get("history", [])
                 if export_auto and history:
-                    try:
-                        out = _auto_export_history(history)
-                        if out:
-                            txtp, docxp = out
-                            st.sidebar.success(f"💾 Histórico exportado em:\n- {txtp}\n- {docxp}")
-                    except Exception as e:
-                        st.sidebar.error(f"Falha na exportação automática: {e}")
-
-                # Salva conversa atual (json) se houver
+                    out = _auto_export_history(history)
+                    if out:
+                        txtp, docxp = out
+                        st.sidebar.info(f"💾 Exportando histórico em segundo plano para:\n- {txtp}\n- {docxp}")
+
+                # Conversa atual já está no log (mensagem a mensagem): só garante o fsync
                 convo_id = st.session_state.get("current_convo_id")
-                if convo_id and st.session_state.get("history"):
-                    _save_conversation(convo_id, st.session_state["history"])
+                if convo_id:
+                    get_conversation_store().flush(convo_id)
 
                 # Reset total de caches/estado
                 st.session_state["current_convo_id"] = _new_conversation_id()
                 st.session_state["history"] = []
+                st.session_state["messages"] = []
                 st.session_state["kb"] = None
 
                 if purge_side:
@@ -181,6 +249,8 @@ def setup_sidebar() -> None:
             if c2.button("Cancelar", key="cancel_new_chat"):
                 st.session_state[pending_key] = False
 
+    _show_past_conversations()
+
     # Aviso de 30 mensagens
     history = st.session_state.get("history", [])
     if _count_user_assistant(history) >= 30:
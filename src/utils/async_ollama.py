@@ -0,0 +1,289 @@
+# src/utils/async_ollama.py
+from __future__ import annotations
+import json
+import time
+import queue
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, List, Optional, TypeVar
+
+import httpx
+import numpy as np
+
+from src.utils.ollama_client import (
+    CONNECT_TIMEOUT_S, DEFAULT_HOST, GENERATE_READ_TIMEOUT_S, LIST_TIMEOUT_S, POOL_SIZE, PROBE_ROUTES, PROBE_TIMEOUT_S,
+    READ_TIMEOUT_S, _STAT_KEYS, Capabilities, StreamChunk, build_payload, endpoint_missing,
+    parse_model_names, response_text, stream_delta,
+)
+from src.utils.tracing import generation_attrs, span
+
+T = TypeVar("T")
+
+# ---------- laço de eventos do processo + ponte síncrona ----------
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Um único event loop por processo, rodando numa thread daemon."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="ollama-asyncio", daemon=True).start()
+            _loop = loop
+        return _loop
+
+def run_sync(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Executa a corrotina no loop do processo e espera o resultado (para o código síncrono do Streamlit)."""
+    fut = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        return fut.result(timeout)
+    except BaseException:
+        fut.cancel()  # timeout/interrupção da sessão: não deixa a requisição órfã no loop
+        raise
+
+_END = object()
+
+def iter_sync(agen: AsyncIterator[T]) -> Iterator[T]:
+    """
+    Consome um gerador assíncrono como iterador comum. Fechar o iterador (break,
+    exceção, sessão encerrada) cancela a tarefa no loop e fecha a conexão HTTP.
+    """
+    q: "queue.Queue" = queue.Queue()  # sem limite: o consumidor (UI) só acumula texto
+    loop = get_loop()
+
+    async def pump() -> None:
+        try:
+            async for item in agen:
+                q.put_nowait(item)
+            q.put_nowait(_END)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:  # repassa o erro para o lado síncrono
+            q.put_nowait(e)
+        finally:
+            await agen.aclose()
+
+    task = asyncio.run_coroutine_threadsafe(pump(), loop)
+    try:
+        while True:
+            item = q.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        task.cancel()
+
+# ---------- cliente ----------
+def retryable(exc: BaseException) -> bool:
+    """Vale tentar de novo: falha de transporte (conexão, timeout) ou erro 5xx do servidor; 4xx não muda na repetição."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+class AsyncOllamaClient:
+    """
+    Cliente assíncrono do Ollama (httpx.AsyncClient): ask, ask_stream, list_models
+    e embed. Todas as sessões do
+    Streamlit compartilham um pool de conexões e um event loop; o código
+    síncrono chama via run_sync/iter_sync (ou pelo BridgedOllamaClient).
+    """
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        connect_timeout: float = CONNECT_TIMEOUT_S,
+        read_timeout: float = READ_TIMEOUT_S,
+        pool_size: int = POOL_SIZE,
+        generate_timeout: float = GENERATE_READ_TIMEOUT_S,
+    ):
+        self.host = host.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.generate_timeout = generate_timeout
+        self.http = httpx.AsyncClient(
+            base_url=self.host,
+            timeout=self._timeout(),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        self._caps: Optional[Capabilities] = None
+        self._batch_embed: Optional[bool] = None  # /api/embed disponível? None = ainda não sabido
+
+    def _timeout(self, read: Optional[float] = None) -> httpx.Timeout:
+        return httpx.Timeout(read if read is not None else self.read_timeout, connect=self.connect_timeout)
+
+    # ---------- detecção de rotas ----------
+    async def probe(self) -> Capabilities:
+        caps = Capabilities()
+
+        async def check(name: str, method: str, path: str) -> None:
+            kwargs = {"json": {}} if method == "POST" else {}
+            r = await self.http.request(method, path, timeout=self._timeout(PROBE_TIMEOUT_S), **kwargs)
+            setattr(caps, name, not endpoint_missing(r))
+
+        await asyncio.gather(*(check(*route) for route in PROBE_ROUTES))
+        return caps
+
+    async def capabilities(self) -> Capabilities:
+        """Rotas suportadas (sondadas uma vez; com o servidor fora do ar, assume o padrão)."""
+        if self._caps is None:
+            try:
+                self._caps = await self.probe()
+            except httpx.HTTPError:
+                return Capabilities()
+        return self._caps
+
+    # ---------- geração ----------
+    async def generate(self, *, prompt: str, model: str, temperature: float = 1.0, num_ctx: Optional[int] = None) -> Dict[str, Any]:
+        """JSON cru da geração sem streaming: texto mais as estatísticas do Ollama (eval_count, durações...)."""
+        caps = await self.capabilities()
+        path, payload = build_payload(caps.generate, prompt, model, temperature, False, num_ctx)
+        r = await self.http.post(path, json=payload, timeout=self._timeout(self.generate_timeout))
+        r.raise_for_status()
+        return r.json()
+
+    async def ask(self, *, prompt: str, model: str, temperature: float = 1.0, num_ctx: Optional[int] = None) -> str:
+        return response_text(await self.generate(prompt=prompt, model=model, temperature=temperature, num_ctx=num_ctx))
+
+    async def ask_stream(self, *, prompt: str, model: str, temperature: float = 1.0, num_ctx: Optional[int] = None) -> AsyncIterator[StreamChunk]:
+        """Deltas conforme chegam e, por fim, StreamChunk(done=True) com as estatísticas do Ollama e `ttft_s`/`total_s` medidos no cliente."""
+        start = time.perf_counter()
+        stats: Dict[str, Any] = {}
+        caps = await self.capabilities()
+        path, payload = build_payload(caps.generate, prompt, model, temperature, True, num_ctx)
+        async with self.http.stream("POST", path, json=payload, timeout=self._timeout(self.generate_timeout)) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                delta = stream_delta(data)
+                if delta:
+                    if "ttft_s" not in stats:
+                        stats["ttft_s"] = time.perf_counter() - start
+                    yield StreamChunk(text=delta)
+                if data.get("done"):
+                    stats.update({k: data[k] for k in _STAT_KEYS if k in data})
+                    break
+        stats["total_s"] = time.perf_counter() - start
+        yield StreamChunk(done=True, stats=stats)
+
+    # ---------- modelos ----------
+    async def model_tags(self) -> Any:
+        """JSON cru de /api/tags (ou /api/models): nomes e detalhes (tamanho, família, quantização)."""
+        caps = await self.capabilities()
+        ep = "/api/tags" if caps.tags or not caps.models else "/api/models"
+        r = await self.http.get(ep, timeout=self._timeout(LIST_TIMEOUT_S))
+        r.raise_for_status()
+        return r.json()
+
+    async def list_models(self) -> List[str]:
+        return parse_model_names(await self.model_tags())
+
+    # ---------- embeddings ----------
+    async def _post_single(self, model: str, text: str, timeout: float) -> List[float]:
+        r = await self.http.post("/api/embeddings", json={"model": model, "prompt": text}, timeout=self._timeout(timeout))
+        r.raise_for_status()
+        vec = r.json().get("embedding")
+        if not vec:
+            raise RuntimeError("Resposta de embeddings sem vetor.")
+        return vec
+
+    async def _post_batch(self, model: str, batch: List[str], timeout: float) -> List[List[float]]:
+        if self._batch_embed is not False:
+            r = await self.http.post("/api/embed", json={"model": model, "input": batch}, timeout=self._timeout(timeout))
+            if endpoint_missing(r):
+                self._batch_embed = False
+            else:
+                r.raise_for_status()
+                vecs = r.json().get("embeddings")
+                if not vecs or len(vecs) != len(batch):
+                    raise RuntimeError("Resposta de embeddings em lote incompleta.")
+                self._batch_embed = True
+                return vecs
+        return [await self._post_single(model, t, timeout) for t in batch]
+
+    async def embed(
+        self,
+        texts: List[str],
+        model: str,
+        *,
+        batch_size: int = 32,
+        max_in_flight: int = 4,
+        retries: int = 2,
+        backoff_s: float = 0.5,
+        timeout: float = 60,
+    ) -> np.ndarray:
+        """
+        Embeddings em lotes (/api/embed; senão /api/embeddings um a um), no máximo
+        `max_in_flight` lotes simultâneos, com novas tentativas só para falhas de transporte
+        e 5xx (ver `retryable`); vetores na ordem de entrada.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self._batch_embed is None and (await self.capabilities()).embed is False:
+            self._batch_embed = False
+        sem = asyncio.Semaphore(max(1, max_in_flight))
+
+        async def one(batch: List[str]) -> List[List[float]]:
+            last_exc: Optional[Exception] = None
+            async with sem:
+                for attempt in range(retries + 1):
+                    try:
+                        return await self._post_batch(model, batch, timeout)
+                    except (httpx.HTTPError, RuntimeError, ValueError) as e:
+                        if not retryable(e):  # ex.: 400 (entrada inválida), 404 (modelo não baixado)
+                            raise RuntimeError(f"Falha ao gerar embeddings: {e}") from e
+                        last_exc = e
+                        if attempt < retries:
+                            await asyncio.sleep(backoff_s * (2 ** attempt))
+            raise RuntimeError(f"Falha ao gerar embeddings após {retries + 1} tentativas: {last_exc}")
+
+        size = max(1, batch_size)
+        results = await asyncio.gather(*(one(texts[i:i + size]) for i in range(0, len(texts), size)))
+        return np.array([v for vecs in results for v in vecs], dtype=np.float32)
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+class BridgedOllamaClient:
+    """Fachada síncrona (ask, ask_stream, list_models, embed) sobre o AsyncOllamaClient do processo."""
+    def __init__(self, aclient: AsyncOllamaClient):
+        self.aclient = aclient
+        self.host = aclient.host
+
+    @property
+    def capabilities(self) -> Capabilities:
+        return run_sync(self.aclient.capabilities())
+
+    def ask(self, *, prompt: str, model: str, temperature: float = 1.0, num_ctx: Optional[int] = None) -> str:
+        # Span medido deste lado: o contexto do trace não atravessa para a thread do event loop
+        with span("generate", model=model, prompt_chars=len(prompt)) as sp:
+            j = run_sync(self.aclient.generate(prompt=prompt, model=model, temperature=temperature, num_ctx=num_ctx))
+            sp.set(**generation_attrs(j))
+            return response_text(j)
+
+    def ask_stream(self, *, prompt: str, model: str, temperature: float = 1.0, num_ctx: Optional[int] = None) -> Iterator[StreamChunk]:
+        return iter_sync(self.aclient.ask_stream(prompt=prompt, model=model, temperature=temperature, num_ctx=num_ctx))
+
+    def list_models(self) -> List[str]:
+        return run_sync(self.aclient.list_models())
+
+    def embed(self, texts: List[str], model: str, **kwargs: Any) -> np.ndarray:
+        return run_sync(self.aclient.embed(texts, model, **kwargs))
+
+_CLIENTS: Dict[str, AsyncOllamaClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+def get_async_client(host: str = DEFAULT_HOST) -> AsyncOllamaClient:
+    """Cliente assíncrono compartilhado por host (usar só dentro do loop de get_loop())."""
+    key = host.rstrip("/")
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = AsyncOllamaClient(host=key)
+        return client
+
+def get_bridged_client(host: str = DEFAULT_HOST) -> BridgedOllamaClient:
+    return BridgedOllamaClient(get_async_client(host))
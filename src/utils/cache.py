@@ -0,0 +1,66 @@
+# src/utils/cache.py
+from __future__ import annotations
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+class LRUCache:
+    """
+    Cache LRU thread-safe em memória, com limite de itens e validade opcional (ttl_s).
+    Itens vencidos são descartados na leitura; o excesso, pelo menos usado.
+    """
+    def __init__(self, maxsize: int = 256, ttl_s: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                expires, value = item
+                if expires is None or expires > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        expires = self._clock() + self.ttl_s if self.ttl_s else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(hits=self.hits, misses=self.misses, size=len(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,293 @@
+# src/utils/chunker.py
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Muda quando a segmentação/empacotamento muda: entra na chave do cache de embeddings
+CHUNKER_VERSION = 2
+
+MIN_FILL = 0.5             # um título novo fecha o chunk atual se ele já tiver metade do alvo
+HEADING_CHARS = 120        # título repetido no início dos chunks de continuação da seção
+MAX_SEGMENT_CHARS = 1 << 16  # parágrafo sem linha em branco maior que isso é emitido assim mesmo
+
+Chunk = Tuple[str, Dict[str, Any]]
+
+@dataclass
+class Segment:
+    """Unidade indivisível (se couber): parágrafo, título, bloco de código, tabela ou slide."""
+    text: str
+    kind: str = "text"            # text | heading | code | table
+    page: Optional[int] = None    # 1-based, PDFs
+    slide: Optional[int] = None   # 1-based, apresentações
+
+_INLINE_WS = re.compile(r"[ \t\f\v\r\u00a0]+")
+_BLANK_LINE = re.compile(r"\n[ \t\f\v\r]*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?…;])\s+")
+_MD_HEADING = re.compile(r"#{1,6}\s+\S")
+_TABLE_SEP = re.compile(r"\|?\s*:?-{3,}")
+_FENCE = "```"
+
+# ---------- segmentação ----------
+def _clean(text: str) -> str:
+    """Espaços colapsados dentro da linha; quebras de linha preservadas; linhas vazias fora."""
+    lines = (_INLINE_WS.sub(" ", ln).strip() for ln in text.replace("\x00", " ").split("\n"))
+    return "\n".join(ln for ln in lines if ln)
+
+def _block_segments(block: str, **loc: Any) -> Iterator[Segment]:
+    """Um bloco entre linhas em branco vira título(s), tabela ou parágrafo."""
+    if block.lstrip().startswith(_FENCE):
+        code = "\n".join(ln.rstrip() for ln in block.strip("\n").split("\n"))
+        yield Segment(code, "code", **loc)
+        return
+    text = _clean(block)
+    if not text:
+        return
+    lines = text.split("\n")
+    # "# Título" seguido de texto no mesmo bloco (markdown sem linha em branco)
+    while lines and _MD_HEADING.match(lines[0]):
+        yield Segment(lines.pop(0), "heading", **loc)
+    if not lines:
+        return
+    if len(lines) > 1 and all(ln.startswith("|") for ln in lines):
+        yield Segment("\n".join(lines), "table", **loc)
+    else:
+        yield Segment("\n".join(lines), "text", **loc)
+
+def iter_text_segments(pieces: Iterable[str], **loc: Any) -> Iterator[Segment]:
+    """
+    Parágrafos (separados por linha em branco) a partir de blocos de texto em fluxo;
+    blocos ``` ficam inteiros, com indentação. Só o parágrafo incompleto do fim do
+    bloco é carregado para o próximo, limitado a MAX_SEGMENT_CHARS: tempo linear.
+    """
+    carry, fence = "", []
+    for piece in pieces:
+        parts = _BLANK_LINE.split(carry + piece)
+        carry = parts.pop()
+        if len(carry) > MAX_SEGMENT_CHARS:
+            parts.append(carry)
+            carry = ""
+        for part in parts:
+            if fence:
+                fence.append(part)
+                if part.count(_FENCE) % 2 or sum(map(len, fence)) > MAX_SEGMENT_CHARS:
+                    yield from _block_segments("\n\n".join(fence), **loc)
+                    fence = []
+            elif part.lstrip().startswith(_FENCE) and part.count(_FENCE) % 2:
+                fence = [part]  # bloco de código com linhas em branco: junta até fechar
+            else:
+                yield from _block_segments(part, **loc)
+    tail = "\n\n".join(fence + [carry]) if fence else carry
+    if tail.strip():
+        yield from _block_segments(tail, **loc)
+
+def split_page_paragraphs(text: str) -> List[str]:
+    """
+    Parágrafos de uma página de PDF (o extrator devolve só linhas): quebra depois de
+    linha que termina frase e é visivelmente mais curta que as linhas cheias da página.
+    """
+    lines = [ln for ln in (_INLINE_WS.sub(" ", ln).strip() for ln in text.split("\n")) if ln]
+    if not lines:
+        return []
+    lens = sorted(len(ln) for ln in lines)
+    full = lens[min(len(lens) - 1, int(len(lens) * 0.9))]  # largura de uma linha cheia
+    paras, cur = [], []
+    for ln in lines:
+        cur.append(ln)
+        if ln[-1] in ".!?:…" and len(ln) < 0.85 * full:
+            paras.append("\n".join(cur))
+            cur = []
+    if cur:
+        paras.append("\n".join(cur))
+    return paras
+
+def iter_page_segments(pages: Iterable[str], first_page: int = 1) -> Iterator[Segment]:
+    for i, page in enumerate(pages):
+        for para in split_page_paragraphs(page):
+            yield Segment(para, "text", page=first_page + i)
+
+def iter_slide_segments(slides: Iterable[str]) -> Iterator[Segment]:
+    for i, slide in enumerate(slides, 1):
+        text = _clean(slide)
+        if text:
+            yield Segment(text, "text", slide=i)
+
+def iter_docx_segments(blocks: Iterable[Tuple[str, str]]) -> Iterator[Segment]:
+    """(texto, estilo) dos parágrafos do DOCX; estilos de título viram seções."""
+    for text, style in blocks:
+        text = _clean(text)
+        if not text:
+            continue
+        style = (style or "").lower()
+        heading = style.startswith(("heading", "título", "titulo", "title"))
+        yield Segment(text, "heading" if heading else "text")
+
+# ---------- empacotamento ----------
+def _cut(text: str, limit: int) -> Tuple[str, str]:
+    """Prefixo de até `limit` caracteres, cortado num espaço se possível, e o resto."""
+    cut = text.rfind(" ", 0, limit + 1)
+    cut = cut if cut > limit // 2 else limit  # palavra gigante: corte seco
+    return text[:cut].rstrip(), text[cut:].lstrip()
+
+def _split_words(text: str, limit: int) -> Iterator[str]:
+    while len(text) > limit:
+        head, text = _cut(text, limit)
+        yield head
+    if text:
+        yield text
+
+def _greedy(units: Iterable[str], limit: int, sep: str, first: Optional[int] = None) -> Iterator[str]:
+    """Junta unidades em pedaços de até `limit` (o primeiro, até `first`: o espaço que sobra no chunk)."""
+    buf: List[str] = []
+    n = 0
+    cap = first if first is not None else limit
+    for u in units:
+        while not buf and len(u) > cap:  # só o 1º pedaço tem teto menor que o das unidades
+            head, u = _cut(u, cap)
+            yield head
+            cap = limit
+        if not u:
+            continue
+        if buf and n + len(sep) + len(u) > cap:
+            yield sep.join(buf)
+            buf, n, cap = [], 0, limit
+        buf.append(u)
+        n += len(u) + (len(sep) if len(buf) > 1 else 0)
+    if buf:
+        yield sep.join(buf)
+
+def _fit(seg: Segment, limit: int, first: Optional[int] = None) -> Iterator[str]:
+    """Pedaços de no máximo `limit`: por frases (texto), por linhas (código/tabela), por palavras em último caso."""
+    if seg.kind in ("code", "table"):
+        lines = seg.text.split("\n")
+        header: List[str] = []
+        if seg.kind == "table" and len(lines) > 2 and _TABLE_SEP.match(lines[1]):
+            header = lines[:2]  # cabeçalho da tabela repetido em cada pedaço
+            lines = lines[2:]
+        head = "\n".join(header)
+        if len(head) + 1 > limit // 2:  # cabeçalho enorme: repeti-lo estouraria o limite
+            head, lines = "", header + lines
+        extra = len(head) + 1 if head else 0
+        room = limit - extra
+        units = (p for ln in lines for p in _split_words(ln, room))
+        first_room = None if first is None else max(first - extra, 1)
+        for body in _greedy(units, room, "\n", first_room):
+            yield f"{head}\n{body}" if head else body
+        return
+    units = (p for s in _SENTENCE_END.split(seg.text) for p in _split_words(s, limit))
+    yield from _greedy(units, limit, " ", first)
+
+def _overlap_tail(text: str, overlap: int) -> str:
+    """Frases inteiras do fim do chunk que cabem em `overlap` (nenhuma, se a última já não couber)."""
+    if overlap <= 0 or len(text) <= overlap:
+        return ""
+    m = _SENTENCE_END.search(text[-overlap:])
+    return text[-overlap:][m.end():] if m else ""
+
+class _Packer:
+    def __init__(self, size: int, overlap: int):
+        self.size = size
+        self.overlap = overlap
+        # Chunks de continuação começam com título + sobreposição: o resto cabe em `limit`
+        self.limit = max(size - min(HEADING_CHARS + overlap + 4, size // 3), 1)
+        self.parts: List[str] = []
+        self.length = 0
+        self.locs: Dict[str, List[int]] = {}
+        self.has_body = False
+        self.emitted = False
+        self.section: Optional[str] = None        # título em vigor
+        self.chunk_section: Optional[str] = None  # título em vigor no início do chunk
+        self.heads: List[Segment] = []            # títulos esperando o 1º parágrafo da seção
+
+    def _add(self, text: str, seg: Optional[Segment] = None, body: bool = False) -> None:
+        self.length += len(text) + (2 if self.parts else 0)
+        self.parts.append(text)
+        if body and not self.has_body:
+            self.has_body = True
+            self.chunk_section = self.section
+        if seg is not None:
+            for key in ("page", "slide"):
+                v = getattr(seg, key)
+                if v is not None:
+                    lo_hi = self.locs.setdefault(key, [v, v])
+                    lo_hi[0], lo_hi[1] = min(lo_hi[0], v), max(lo_hi[1], v)
+
+    def _place_heads(self) -> None:
+        for h in self.heads:
+            self._add(h.text, h)
+        self.heads = []
+
+    def _room(self) -> int:
+        heads = sum(len(h.text) + 2 for h in self.heads)
+        return self.size - self.length - heads - (2 if self.parts else 0)
+
+    def _flush(self, continuing: bool) -> Chunk:
+        meta: Dict[str, Any] = {}
+        if self.chunk_section:
+            meta["section"] = self.chunk_section
+        for key, (lo, hi) in self.locs.items():
+            meta[f"{key}_start"], meta[f"{key}_end"] = lo, hi
+        chunk = ("\n\n".join(self.parts), meta)
+        # Título + sobreposição cabem em size - limit: um pedaço de até `limit` ainda cabe depois
+        prefix = self.size - self.limit
+        section = (self.section or "")[:max(prefix - 2, 0)] if continuing else ""
+        carry = _overlap_tail(self.parts[-1], min(self.overlap, prefix - len(section) - 4)) if continuing else ""
+        self.parts, self.length, self.has_body, self.emitted = [], 0, False, True
+        self.locs = {k: [v[1], v[1]] for k, v in self.locs.items()} if continuing else {}
+        if section:
+            self._add(section)
+        if carry:
+            self._add(carry)
+        return chunk
+
+    def feed(self, seg: Segment) -> Iterator[Chunk]:
+        if seg.kind == "heading" and len(seg.text) > self.limit // 2:
+            seg = Segment(seg.text, "text", seg.page, seg.slide)  # "título" do tamanho de um parágrafo
+        if seg.kind == "heading":
+            if self.has_body and self.length >= self.size * MIN_FILL:
+                yield self._flush(continuing=False)
+            elif not self.has_body:
+                self.parts, self.length, self.locs = [], 0, {}  # prefixo de continuação: a seção mudou
+            if self.heads and sum(len(h.text) + 2 for h in self.heads) + len(seg.text) > self.limit // 2:
+                # Títulos seguidos demais para abrir um chunk: saem num chunk só deles
+                if self.has_body:
+                    yield self._flush(continuing=False)
+                self._place_heads()
+                yield self._flush(continuing=False)
+            self.heads.append(seg)
+            self.section = seg.text[:HEADING_CHARS]
+            return
+        room = self._room()
+        if len(seg.text) <= room:
+            self._place_heads()
+            self._add(seg.text, seg, body=True)
+            return
+        if self.has_body and (len(seg.text) <= self.limit or room < self.limit // 4):
+            yield self._flush(continuing=not self.heads)
+            room = self._room()
+        for i, piece in enumerate(_fit(seg, self.limit, first=max(room, 1))):
+            if i:
+                yield self._flush(continuing=True)
+            else:
+                self._place_heads()
+            self._add(piece, seg, body=True)
+
+    def finish(self) -> Iterator[Chunk]:
+        if self.has_body or ((self.parts or self.heads) and not self.emitted):
+            self._place_heads()  # documento só com títulos ainda vira um chunk
+            yield self._flush(continuing=False)
+
+def pack_segments(segments: Iterable[Segment], size: int, overlap: int = 0) -> Iterator[Chunk]:
+    """
+    Junta segmentos em chunks de até `size` caracteres sem quebrar parágrafos
+    (só segmentos maiores que o espaço livre são divididos, por frase/linha). Um
+    título fecha o chunk se ele já estiver meio cheio e nunca fica sozinho no fim
+    de um chunk; chunks de continuação levam o título da seção e, como
+    sobreposição, só as frases finais inteiras do anterior (até `overlap` caracteres).
+    Nenhum chunk passa de `size`: título e sobreposição encolhem se preciso.
+    Uma passada, tempo linear. Meta: seção e faixa de páginas/slides do chunk.
+    """
+    packer = _Packer(size, overlap)
+    for seg in segments:
+        yield from packer.feed(seg)
+    yield from packer.finish()
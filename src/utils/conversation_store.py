@@ -0,0 +1,234 @@
+# src/utils/conversation_store.py
+from __future__ import annotations
+import os
+import json
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# Mesma raiz de dados das conversas (ver sidebar.HIST_DIR)
+CONVERSATIONS_DIR = Path(__file__).resolve().parent.parent.parent / "conversations"
+FSYNC_EVERY = 8            # mensagens por fsync...
+FSYNC_INTERVAL_S = 2.0     # ...ou a cada N segundos, o que vier primeiro
+MAX_OPEN_LOGS = 32         # arquivos de log mantidos abertos (conversas ativas)
+TITLE_CHARS = 60
+SNIPPET_CHARS = 160
+
+@dataclass
+class ConversationMeta:
+    id: str
+    title: str
+    created: float
+    updated: float
+    n: int = 0   # nº de mensagens
+
+@dataclass
+class SearchHit:
+    meta: ConversationMeta
+    index: int        # posição da mensagem na conversa
+    role: str
+    snippet: str
+
+class _Log:
+    """Arquivo de log aberto em modo append, com fsync em lote."""
+    def __init__(self, path: Path):
+        self.f = open(path, "a", encoding="utf-8")
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def write(self, line: str, fsync_every: int, interval_s: float) -> None:
+        self.f.write(line)
+        self.f.flush()  # já visível para leitores (busca/reabrir); o fsync garante o disco
+        self.pending += 1
+        if self.pending >= fsync_every or time.monotonic() - self.last_sync >= interval_s:
+            self.sync()
+
+    def sync(self) -> None:
+        if self.pending:
+            os.fsync(self.f.fileno())
+            self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self) -> None:
+        self.sync()
+        self.f.close()
+
+class ConversationStore:
+    """
+    Conversas em disco, só com escrita incremental:
+      logs/<id>.jsonl -> uma mensagem por linha, acrescentada quando acontece
+      index.jsonl     -> {id, title, created, updated, n} (o último registro de cada id vale);
+                         compactado quando acumula registros velhos demais
+    Listar/reabrir lê só o índice (em memória após a 1ª carga) e o log da conversa escolhida.
+    """
+    def __init__(self, root: Path = CONVERSATIONS_DIR, fsync_every: int = FSYNC_EVERY, fsync_interval_s: float = FSYNC_INTERVAL_S):
+        self.root = Path(root)
+        self.logs_dir = self.root / "logs"
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "index.jsonl"
+        self.fsync_every = fsync_every
+        self.fsync_interval_s = fsync_interval_s
+        self._lock = threading.RLock()
+        self._open: "OrderedDict[str, _Log]" = OrderedDict()
+        self._index: Dict[str, ConversationMeta] = {}
+        self._index_records = 0
+        self._load_index()
+
+    # ---------- índice ----------
+    def _load_index(self) -> None:
+        if not self.index_path.exists():
+            self._import_legacy()
+            return
+        with open(self.index_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    meta = ConversationMeta(**json.loads(line))
+                except (ValueError, TypeError):
+                    continue  # linha truncada por queda no meio da escrita
+                self._index[meta.id] = meta
+                self._index_records += 1
+
+    def _import_legacy(self) -> None:
+        # Conversas do formato antigo (<id>.json com a lista inteira) viram logs + índice
+        for path in sorted(self.root.glob("*.json")):
+            try:
+                history = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if isinstance(history, list) and history:
+                mtime = path.stat().st_mtime
+                for msg in history:
+                    self.append(path.stem, msg, now=mtime)
+        self.flush()
+        self._compact()
+
+    def _write_index(self, meta: ConversationMeta) -> None:
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(asdict(meta), ensure_ascii=False) + "\n")
+        self._index_records += 1
+        if self._index_records > 2 * len(self._index) + 1000:
+            self._compact()
+
+    def _compact(self) -> None:
+        tmp = self.index_path.with_suffix(".jsonl.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for meta in self._index.values():
+                f.write(json.dumps(asdict(meta), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.index_path)
+        self._index_records = len(self._index)
+
+    # ---------- escrita ----------
+    def _log(self, convo_id: str) -> _Log:
+        log = self._open.get(convo_id)
+        if log is None:
+            log = _Log(self.logs_dir / f"{convo_id}.jsonl")
+            self._open[convo_id] = log
+            while len(self._open) > MAX_OPEN_LOGS:
+                self._open.popitem(last=False)[1].close()
+        self._open.move_to_end(convo_id)
+        return log
+
+    def append(self, convo_id: str, message: Dict, now: Optional[float] = None) -> ConversationMeta:
+        """Acrescenta uma mensagem ao log da conversa e atualiza o índice."""
+        now = time.time() if now is None else now
+        line = json.dumps(message, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._log(convo_id).write(line, self.fsync_every, self.fsync_interval_s)
+            meta = self._index.get(convo_id) or ConversationMeta(id=convo_id, title="", created=now, updated=now)
+            if not meta.title and message.get("role") == "user" and message.get("content"):
+                meta.title = " ".join(str(message["content"]).split())[:TITLE_CHARS]
+            meta.updated = now
+            meta.n += 1
+            self._index[convo_id] = meta
+            self._write_index(meta)
+            return meta
+
+    def flush(self, convo_id: Optional[str] = None) -> None:
+        """fsync pendente de uma conversa (ou de todas)."""
+        with self._lock:
+            logs = [self._open[convo_id]] if convo_id in self._open else ([] if convo_id else list(self._open.values()))
+            for log in logs:
+                log.sync()
+
+    def close(self) -> None:
+        with self._lock:
+            while self._open:
+                self._open.popitem()[1].close()
+
+    # ---------- leitura ----------
+    def list(self, limit: Optional[int] = None) -> List[ConversationMeta]:
+        """Conversas da mais recente para a mais antiga (só o índice em memória)."""
+        with self._lock:
+            metas = sorted(self._index.values(), key=lambda m: m.updated, reverse=True)
+        return metas[:limit] if limit else metas
+
+    def get_meta(self, convo_id: str) -> Optional[ConversationMeta]:
+        return self._index.get(convo_id)
+
+    def _iter_messages(self, convo_id: str) -> Iterator[Dict]:
+        path = self.logs_dir / f"{convo_id}.jsonl"
+        if not path.exists():
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def load(self, convo_id: str) -> List[Dict]:
+        return list(self._iter_messages(convo_id))
+
+    def search(self, query: str, limit: int = 20) -> List[SearchHit]:
+        """
+        Busca textual (sem diferenciar maiúsculas) em todas as conversas, das mais recentes
+        para as mais antigas, lendo os logs em fluxo. Só decodifica o JSON das linhas que
+        contêm cada palavra do termo (na forma escapada do JSON); a frase inteira é
+        conferida no texto já decodificado, onde quebras de linha e aspas são texto normal.
+        """
+        needle = " ".join(query.split()).casefold()
+        if not needle:
+            return []
+        words = [json.dumps(w, ensure_ascii=False)[1:-1] for w in needle.split()]
+        hits: List[SearchHit] = []
+        for meta in self.list():
+            path = self.logs_dir / f"{meta.id}.jsonl"
+            if not path.exists():
+                continue
+            with open(path, encoding="utf-8") as f:
+                for i, line in enumerate(f):
+                    raw = line.casefold()
+                    if not all(w in raw for w in words):
+                        continue
+                    try:
+                        msg = json.loads(line)
+                    except ValueError:
+                        continue
+                    text = " ".join(str(msg.get("content", "")).split())
+                    pos = text.casefold().find(needle)
+                    if pos < 0:
+                        continue  # termo só na chave/metadado
+                    start = max(0, pos - SNIPPET_CHARS // 2)
+                    snippet = ("…" if start else "") + text[start:start + SNIPPET_CHARS]
+                    hits.append(SearchHit(meta=meta, index=i, role=msg.get("role", ""), snippet=snippet))
+                    if len(hits) >= limit:
+                        return hits
+        return hits
+
+_store: Optional[ConversationStore] = None
+_store_lock = threading.Lock()
+
+def get_conversation_store() -> ConversationStore:
+    """Store de conversas do processo (compartilhado pelas sessões do Streamlit)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore()
+            atexit.register(_store.close)
+        return _store
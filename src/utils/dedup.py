@@ -0,0 +1,114 @@
+# src/utils/dedup.py
+from __future__ import annotations
+import re
+import zlib
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Quase-duplicatas por MinHash sobre shingles de palavras, com LSH em bandas para achar candidatos
+SHINGLE_WORDS = 5
+MINHASH_PERMS = 64
+LSH_BANDS = 16               # 16 bandas x 4 linhas: pares com Jaccard ≳ 0.5 viram candidatos
+NEAR_DUP_JACCARD = 0.7       # Jaccard estimado (shingles) a partir do qual um trecho é cópia: ~2% de palavras trocadas
+MMR_LAMBDA = 0.7             # peso da relevância frente à redundância na diversificação
+
+# Permutações por multiplicação ímpar + soma em uint64 (módulo 2^64 de graça no NumPy);
+# semente fixa: assinaturas comparáveis entre execuções
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(0, 1 << 63, MINHASH_PERMS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.integers(0, 1 << 63, MINHASH_PERMS, dtype=np.uint64)
+_MIX = np.uint64(0x100000001B3)   # combina os hashes das palavras de um shingle
+_WORD = re.compile(r"\w+")
+
+@dataclass(frozen=True)
+class ChunkSignature:
+    exact: str               # sha1 do texto normalizado (maiúsculas/espaços/pontuação ignorados)
+    minhash: np.ndarray      # MINHASH_PERMS x uint64
+
+def signature(text: str) -> ChunkSignature:
+    words = _WORD.findall(text.casefold())
+    norm = " ".join(words)
+    wh = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words or [""]), dtype=np.uint64)
+    n = max(len(wh) - SHINGLE_WORDS + 1, 1)
+    shingles = wh[:n].copy()
+    for j in range(1, min(SHINGLE_WORDS, len(wh))):
+        shingles = shingles * _MIX + wh[j:j + n]
+    minhash = (_A[:, None] * shingles[None, :] + _B[:, None]).min(axis=1)
+    return ChunkSignature(hashlib.sha1(norm.encode("utf-8")).hexdigest(), minhash)
+
+class DuplicateIndex:
+    """
+    Trechos vistos até agora, na ordem de chegada: `add` devolve o id do primeiro
+    trecho igual (mesmo texto normalizado) ou quase igual (Jaccard estimado dos
+    shingles ≥ `threshold`), ou o próprio id se o trecho é novo. Ids = ordem de `add`.
+    """
+    def __init__(self, threshold: float = NEAR_DUP_JACCARD):
+        self.threshold = threshold
+        self._count = 0
+        self._exact: Dict[str, int] = {}
+        self._minhash: Dict[int, np.ndarray] = {}   # só dos originais
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _bands(self, minhash: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(b, band.tobytes()) for b, band in enumerate(np.split(minhash, LSH_BANDS))]
+
+    def _near(self, sig: ChunkSignature, bands: List[Tuple[int, bytes]]) -> Optional[int]:
+        seen = set()
+        for band in bands:
+            for cand in self._buckets.get(band, ()):
+                if cand in seen:
+                    continue
+                seen.add(cand)
+                if np.mean(self._minhash[cand] == sig.minhash) >= self.threshold:
+                    return cand
+        return None
+
+    def add(self, sig: ChunkSignature) -> int:
+        new_id = self._count
+        self._count += 1
+        orig = self._exact.get(sig.exact)
+        if orig is not None:
+            return orig
+        bands = self._bands(sig.minhash)
+        orig = self._near(sig, bands)
+        if orig is not None:
+            return orig
+        self._exact[sig.exact] = new_id
+        self._minhash[new_id] = sig.minhash
+        for band in bands:
+            self._buckets.setdefault(band, []).append(new_id)
+        return new_id
+
+def canonical_rows(signatures: List[ChunkSignature], threshold: float = NEAR_DUP_JACCARD) -> np.ndarray:
+    """Para cada trecho, a linha do seu original (ela mesma, se não for cópia de um anterior)."""
+    index = DuplicateIndex(threshold)
+    return np.fromiter((index.add(s) for s in signatures), dtype=np.int64, count=len(signatures))
+
+def mmr_select(vectors: np.ndarray, relevance: np.ndarray, k: int, lambda_: float = MMR_LAMBDA) -> List[int]:
+    """
+    Maximal marginal relevance sobre candidatos já ranqueados: a cada passo escolhe
+    o que maximiza λ·relevância − (1−λ)·similaridade máxima com os já escolhidos.
+    `vectors` normalizados (cosseno = produto interno); devolve posições em `vectors`.
+    """
+    n = len(vectors)
+    if n == 0 or k <= 0:
+        return []
+    v = np.asarray(vectors, dtype=np.float32)
+    sims = v @ v.T
+    relevance = np.asarray(relevance, dtype=np.float32)
+    redundancy = np.zeros(n, dtype=np.float32)
+    free = np.ones(n, dtype=bool)
+    chosen: List[int] = []
+    for _ in range(min(k, n)):
+        score = lambda_ * relevance - (1 - lambda_) * redundancy if chosen else relevance
+        best = int(np.argmax(np.where(free, score, -np.inf)))
+        chosen.append(best)
+        free[best] = False
+        redundancy = np.maximum(redundancy, sims[best])
+    return chosen
@@ -0,0 +1,63 @@
+# src/utils/embedder.py
+from __future__ import annotations
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.utils.async_ollama import get_async_client, run_sync
+
+# Parâmetros padrão do pipeline de embeddings
+EMBED_BATCH_SIZE = 32      # textos por requisição em /api/embed
+EMBED_MAX_IN_FLIGHT = 4    # lotes simultâneos no servidor
+EMBED_RETRIES = 2          # novas tentativas por lote
+EMBED_BACKOFF_S = 0.5      # espera base entre tentativas (dobra a cada falha)
+
+class BatchEmbedder:
+    """
+    Motor de embeddings em lote para o Ollama.
+    - Usa /api/embed (vários textos por requisição) quando o servidor suporta;
+      senão cai para /api/embeddings, um texto por vez
+    - Requisições no event loop do processo (AsyncOllamaClient): o fan-out
+      dos lotes não ocupa threads e divide o pool de conexões com a geração
+    - No máximo `max_in_flight` lotes em andamento ao mesmo tempo
+    - Lotes com falha de transporte ou 5xx são re-tentados (4xx não); os vetores voltam na ordem de entrada
+    """
+    def __init__(
+        self,
+        host: str = "http://localhost:11434",
+        model: str = "nomic-embed-text",
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_in_flight: int = EMBED_MAX_IN_FLIGHT,
+        retries: int = EMBED_RETRIES,
+        timeout: int = 60,
+    ):
+        self.host = host.rstrip("/")
+        self.model = model
+        self.batch_size = max(1, int(batch_size))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.retries = max(0, int(retries))
+        self.timeout = timeout
+        self.client = get_async_client(self.host)
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        return await self.client.embed(
+            texts, self.model,
+            batch_size=self.batch_size, max_in_flight=self.max_in_flight,
+            retries=self.retries, backoff_s=EMBED_BACKOFF_S, timeout=self.timeout,
+        )
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return run_sync(self.aembed(texts))
+
+_EMBEDDERS: Dict[Tuple[str, str, int], BatchEmbedder] = {}
+_EMBEDDERS_LOCK = threading.Lock()
+
+def get_embedder(host: str = "http://localhost:11434", model: str = "nomic-embed-text", timeout: int = 60) -> BatchEmbedder:
+    """Embedder por (host, modelo) compartilhado no processo (cliente assíncrono e rotas do host)."""
+    key = (host.rstrip("/"), model, timeout)
+    with _EMBEDDERS_LOCK:
+        emb = _EMBEDDERS.get(key)
+        if emb is None:
+            emb = _EMBEDDERS[key] = BatchEmbedder(host=host, model=model, timeout=timeout)
+        return emb
@@ -0,0 +1,239 @@
+# src/utils/embedding_store.py
+from __future__ import annotations
+import os
+import re
+import json
+import time
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Mesma raiz de dados das conversas (ver sidebar.HIST_DIR)
+KB_STORE_DIR = Path(__file__).resolve().parent.parent.parent / "conversations" / "kb_store"
+
+# Teto de disco por modelo (vetores + textos): ao passar, os arquivos usados há mais tempo
+# saem e o store é reescrito até KB_STORE_TARGET_FRACTION do teto (não reescreve a cada put)
+KB_STORE_MAX_BYTES = 2 * 1024 ** 3
+KB_STORE_TARGET_FRACTION = 0.8
+
+# Cabeçalho .npy de tamanho fixo: permite crescer o shape sem reescrever o arquivo
+_NPY_HEADER_LEN = 128
+
+def _npy_header(rows: int, dim: int) -> bytes:
+    d = "{'descr': '<f4', 'fortran_order': False, 'shape': (%d, %d), }" % (rows, dim)
+    body = _NPY_HEADER_LEN - 10
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", body) + d.encode("latin1").ljust(body - 1) + b"\n"
+
+def _atomic_write_json(path: Path, obj: Any) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+class EmbeddingStore:
+    """
+    Repositório persistente de trechos e vetores, um diretório por modelo de embedding:
+      manifest.json  -> {"model": ..., "dim": D, "rows": N}
+      chunks.jsonl   -> um trecho por linha: {"t": texto, "m": meta}
+      vectors.npy    -> float32 (N, D), lido via memmap (não carrega tudo na RAM)
+      index.json     -> {chave_do_arquivo: [linha_ini, linha_fim, byte_ini, byte_fim, último_uso]}
+    Cresce por append; a chave é a mesma do KBCache (assinatura + parâmetros). Passando
+    de `max_bytes`, os arquivos menos usados são descartados e o restante é reescrito
+    (memmaps já abertos continuam lendo a versão anterior). Arquivos ilegíveis zeram o
+    store: é só um cache, os trechos voltam a ser embutidos.
+    """
+    def __init__(self, model: str, root: Path = KB_STORE_DIR, max_bytes: int = KB_STORE_MAX_BYTES):
+        self.model = model
+        self.dir = Path(root) / re.sub(r"[^A-Za-z0-9._-]+", "_", model)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._manifest_path = self.dir / "manifest.json"
+        self._index_path = self.dir / "index.json"
+        self._chunks_path = self.dir / "chunks.jsonl"
+        self._vectors_path = self.dir / "vectors.npy"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._mm: Optional[np.ndarray] = None
+
+        self.dim: Optional[int] = None
+        self.rows = 0
+        self.index: Dict[str, List[int]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            manifest = json.loads(self._manifest_path.read_text(encoding="utf-8"))
+            if manifest.get("model") != self.model:
+                return
+            self.dim = manifest.get("dim")
+            index = json.loads(self._index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        try:
+            if self.dim and self._vectors_path.exists():
+                mm = np.load(self._vectors_path, mmap_mode="r")
+                if mm.ndim != 2 or mm.shape[1] != self.dim or mm.dtype != np.float32:
+                    raise ValueError(f"vectors.npy com shape/dtype inesperado: {mm.shape} {mm.dtype}")
+                self.rows = int(mm.shape[0])
+            size = self._chunks_path.stat().st_size if self._chunks_path.exists() else 0
+            # Descarta entradas que apontam além do que chegou ao disco (gravação interrompida)
+            self.index = {k: list(v[:4]) + [float(v[4]) if len(v) > 4 else 0.0] for k, v in index.items() if v[1] <= self.rows and v[3] <= size}
+        except (OSError, ValueError, TypeError, IndexError):
+            self._reset()
+
+    def _reset(self) -> None:
+        """Store ilegível (cabeçalho/índice corrompido): começa vazio."""
+        self.dim, self.rows, self.index, self._mm = None, 0, {}, None
+        for path in (self._index_path, self._manifest_path, self._vectors_path, self._chunks_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                pass  # ex.: ainda mapeado no Windows; o put seguinte sobrescreve do início
+
+    def _vectors(self) -> np.ndarray:
+        if self._mm is None:
+            self._mm = np.load(self._vectors_path, mmap_mode="r")
+        return self._mm
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def get(self, key: str) -> Optional[Tuple[List[Tuple[str, Dict[str, Any]]], np.ndarray]]:
+        """Devolve ([(texto, meta), ...], vetores) de um arquivo já embutido, ou None."""
+        with self._lock:  # a evicção reescreve os arquivos e muda os offsets
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            r0, r1, b0, b1 = entry[:4]
+            entry[4] = time.time()
+            with open(self._chunks_path, "rb") as f:
+                f.seek(b0)
+                raw = f.read(b1 - b0)
+            vecs = self._vectors()[r0:r1]
+        chunks = []
+        for line in raw.splitlines():
+            rec = json.loads(line)
+            chunks.append((rec["t"], rec["m"]))
+        return chunks, vecs
+
+    def put(self, key: str, chunks: List[Tuple[str, Dict[str, Any]]], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(chunks) != len(vectors):
+            raise ValueError("Quantidade de trechos e vetores diverge.")
+        with self._lock:
+            if key in self.index:
+                return
+            if len(vectors):
+                dim = int(vectors.shape[1])
+                if self.dim is None:
+                    self.dim = dim
+                elif dim != self.dim:
+                    raise ValueError(f"Dimensão {dim} difere da base ({self.dim}).")
+
+            # 1) textos
+            with open(self._chunks_path, "ab") as f:
+                b0 = f.tell()
+                for text, meta in chunks:
+                    f.write(json.dumps({"t": text, "m": meta}, ensure_ascii=False).encode("utf-8") + b"\n")
+                b1 = f.tell()
+
+            # 2) vetores: grava os dados logo após a última linha válida e só então o novo shape
+            r0, r1 = self.rows, self.rows + len(vectors)
+            if len(vectors):
+                mode = "r+b" if self._vectors_path.exists() else "w+b"
+                with open(self._vectors_path, mode) as f:
+                    f.seek(_NPY_HEADER_LEN + r0 * self.dim * 4)
+                    f.write(vectors.tobytes())
+                    f.flush()
+                    f.seek(0)
+                    f.write(_npy_header(r1, self.dim))
+                self.rows = r1
+                self._mm = None
+
+            # 3) índice por último: é ele que torna as linhas visíveis
+            self.index[key] = [r0, r1, b0, b1, time.time()]
+            _atomic_write_json(self._index_path, self.index)
+            _atomic_write_json(self._manifest_path, {"model": self.model, "dim": self.dim, "rows": self.rows})
+            if self.disk_bytes() > self.max_bytes:
+                try:
+                    self._evict_locked(int(self.max_bytes * KB_STORE_TARGET_FRACTION))
+                except OSError:
+                    pass  # ex.: arquivo ainda mapeado no Windows; tenta de novo no próximo put
+
+    def disk_bytes(self) -> int:
+        """Tamanho em disco de vetores + textos (inclui linhas já sem dono)."""
+        return sum(p.stat().st_size for p in (self._vectors_path, self._chunks_path) if p.exists())
+
+    def _entry_bytes(self, entry: List[float]) -> int:
+        return int((entry[1] - entry[0]) * (self.dim or 0) * 4 + (entry[3] - entry[2]))
+
+    def _evict_locked(self, target: int) -> None:
+        """Mantém os arquivos usados mais recentemente até `target` bytes e reescreve o store sem o resto."""
+        keep, total = set(), 0
+        for key in sorted(self.index, key=lambda k: self.index[k][4], reverse=True):
+            size = self._entry_bytes(self.index[key])
+            if total + size <= target:
+                keep.add(key)
+                total += size
+        # Ordem original das linhas: arquivos gravados juntos continuam contíguos (view sem cópia)
+        kept = sorted(keep, key=lambda k: self.index[k][0])
+        vec_tmp = self._vectors_path.with_suffix(".npy.tmp")
+        chunks_tmp = self._chunks_path.with_suffix(".jsonl.tmp")
+        index: Dict[str, List[float]] = {}
+        rows = 0
+        with open(self._chunks_path, "rb") as src, open(chunks_tmp, "wb") as dst_chunks, open(vec_tmp, "wb") as dst_vecs:
+            dst_vecs.write(_npy_header(0, self.dim or 0))
+            old = self._vectors() if self._vectors_path.exists() else None
+            for key in kept:
+                r0, r1, b0, b1, used = self.index[key]
+                src.seek(b0)
+                c0 = dst_chunks.tell()
+                dst_chunks.write(src.read(b1 - b0))
+                if r1 > r0 and old is not None:
+                    dst_vecs.write(np.ascontiguousarray(old[r0:r1]).tobytes())
+                index[key] = [rows, rows + (r1 - r0), c0, dst_chunks.tell(), used]
+                rows += r1 - r0
+            dst_vecs.seek(0)
+            dst_vecs.write(_npy_header(rows, self.dim or 0))
+        # Índice vazio primeiro: se o processo cair no meio da troca, o store só recomeça vazio
+        _atomic_write_json(self._index_path, {})
+        self._mm = None
+        os.replace(vec_tmp, self._vectors_path)
+        os.replace(chunks_tmp, self._chunks_path)
+        self.rows, self.index = rows, index
+        _atomic_write_json(self._index_path, self.index)
+        _atomic_write_json(self._manifest_path, {"model": self.model, "dim": self.dim, "rows": self.rows})
+
+    def view(self, keys: List[str]) -> Optional[np.ndarray]:
+        """
+        Vetores das chaves como fatia do memmap (sem cópia), se as linhas forem contíguas
+        e na mesma ordem; senão None (o chamador concatena).
+        """
+        with self._lock:
+            spans = []
+            for k in keys:
+                entry = self.index.get(k)
+                if entry is None:
+                    return None
+                if entry[1] > entry[0]:
+                    spans.append(entry[:2])
+            if not spans:
+                return None
+            for (_, prev_end), (start, _) in zip(spans, spans[1:]):
+                if start != prev_end:
+                    return None
+            return self._vectors()[spans[0][0]:spans[-1][1]]
+
+_STORES: Dict[str, EmbeddingStore] = {}
+_STORES_LOCK = threading.Lock()
+
+def get_store(model: str) -> EmbeddingStore:
+    """Store persistente do modelo, compartilhado no processo."""
+    with _STORES_LOCK:
+        store = _STORES.get(model)
+        if store is None:
+            store = _STORES[model] = EmbeddingStore(model)
+        return store
@@ -0,0 +1,80 @@
+# src/utils/export_worker.py
+from __future__ import annotations
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.cache import LRUCache
+from src.utils.history_manager import export_history_to_docx, export_history_to_txt
+
+EXPORT_WORKERS = 2
+EXPORT_CACHE_SIZE = 16   # versões de histórico com exportação guardada (por formato)
+
+_EXPORTERS = {"txt": export_history_to_txt, "docx": export_history_to_docx}
+
+def history_version(history: List[Dict]) -> str:
+    """Assinatura do conteúdo do histórico: muda a cada mensagem nova ou editada."""
+    h = hashlib.sha1()
+    for m in history:
+        h.update(str(m.get("role", "")).encode("utf-8"))
+        h.update(b"\x00")
+        h.update(str(m.get("content", "")).encode("utf-8"))
+        h.update(b"\x01")
+    return f"{len(history)}:{h.hexdigest()}"
+
+class ExportWorker:
+    """
+    Gera exportações TXT/DOCX numa thread de fundo, uma vez por versão do histórico
+    (bytes guardados por versão: a mesma conversa não é exportada duas vezes).
+    """
+    def __init__(self, max_workers: int = EXPORT_WORKERS, cache_size: int = EXPORT_CACHE_SIZE):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+        self._jobs = LRUCache(maxsize=cache_size)   # (versão, formato) -> Future[bytes]
+        self._lock = threading.Lock()
+
+    def result(self, version: str, fmt: str) -> Optional[bytes]:
+        """Bytes da exportação se já estiver pronta; None se não pedida, pendente ou com erro."""
+        fut = self._jobs.get((version, fmt))
+        if fut is None or not fut.done() or fut.exception() is not None:
+            return None
+        return fut.result()
+
+    def _bytes_now(self, history: List[Dict], version: str, fmt: str) -> bytes:
+        # Dentro de uma tarefa do pool: nunca espera outra tarefa do mesmo pool (evita deadlock)
+        data = self.result(version, fmt)
+        if data is not None:
+            return data
+        data = _EXPORTERS[fmt](history).getvalue()  # fora do lock: pode demorar
+        with self._lock:
+            ready = self.result(version, fmt)  # outra tarefa pode ter terminado antes
+            if ready is not None:
+                return ready
+            done: Future = Future()
+            done.set_result(data)
+            self._jobs.put((version, fmt), done)
+        return data
+
+    def export_files(self, history: List[Dict], out_dir: Path, stem: str) -> Tuple[Tuple[Path, Path], Future]:
+        """Grava <stem>.txt e <stem>.docx em segundo plano; devolve os caminhos e o Future da gravação."""
+        txt_path, docx_path = Path(out_dir) / f"{stem}.txt", Path(out_dir) / f"{stem}.docx"
+        snapshot = [dict(m) for m in history]
+        version = history_version(snapshot)
+
+        def write() -> Tuple[Path, Path]:
+            txt_path.write_bytes(self._bytes_now(snapshot, version, "txt"))
+            docx_path.write_bytes(self._bytes_now(snapshot, version, "docx"))
+            return txt_path, docx_path
+
+        return (txt_path, docx_path), self._pool.submit(write)
+
+_worker: Optional[ExportWorker] = None
+_worker_lock = threading.Lock()
+
+def get_export_worker() -> ExportWorker:
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = ExportWorker()
+        return _worker
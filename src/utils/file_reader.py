@@ -2,50 +2,77 @@
 import io
 import base64
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
-import pandas as pd
 from docx import Document
 import pdfplumber
 from pptx import Presentation
 from PIL import Image
 
-# CSV
-def read_csv_file(bytes_: bytes) -> str:
-    text = bytes_.decode("utf-8", errors="ignore")
-    # limitamos tamanho para não explodir o prompt
-    return text[:5000]
+from src.utils.tabular import read_table_text
 
-# Excel
-def read_excel_file(bytes_: bytes) -> str:
-    df = pd.read_excel(io.BytesIO(bytes_))
-    return df.head(10).to_markdown(index=False)
+# CSV – todas as linhas, em grupos com o cabeçalho (ver tabular.iter_table_chunks)
+def read_csv_file(bytes_: bytes, name: str = "dados.csv") -> str:
+    return read_table_text(name, bytes_)
+
+# Excel – todas as abas
+def read_excel_file(bytes_: bytes, name: str = "planilha.xlsx") -> str:
+    return read_table_text(name, bytes_)
 
 # TXT / MD / RTF
 def read_txt_file(bytes_: bytes) -> str:
     return bytes_.decode("utf-8", errors="ignore")
 
+def iter_txt_file(bytes_: bytes, block_chars: int = 1 << 16):
+    """Texto em blocos de ~64k caracteres, sempre cortados em espaço/quebra de linha."""
+    text = read_txt_file(bytes_)
+    start, n = 0, len(text)
+    while start < n:
+        end = min(start + block_chars, n)
+        if end < n:
+            cut = max(text.rfind("\n", start, end), text.rfind(" ", start, end))
+            end = cut + 1 if cut > start else end
+        yield text[start:end]
+        start = end
+
 # DOCX
 def read_docx_file(bytes_: bytes) -> str:
+    return "\n".join(iter_docx_file(bytes_))
+
+def iter_docx_file(bytes_: bytes):
+    for text, _ in iter_docx_blocks(bytes_):
+        yield text
+
+def iter_docx_blocks(bytes_: bytes):
+    """(texto, nome do estilo) de cada parágrafo: títulos marcam as seções no chunking."""
     doc = Document(io.BytesIO(bytes_))
-    return "\n".join([para.text for para in doc.paragraphs])
+    for para in doc.paragraphs:
+        yield para.text, (para.style.name if para.style is not None else "")
 
 # PDF
 def read_pdf_file(bytes_: bytes) -> str:
-    text = ""
+    return "".join(iter_pdf_pages(bytes_))
+
+def count_pdf_pages(bytes_: bytes) -> int:
+    with pdfplumber.open(io.BytesIO(bytes_)) as pdf:
+        return len(pdf.pages)
+
+def iter_pdf_pages(bytes_: bytes, start: int = 0, stop: Optional[int] = None):
+    """Texto página a página (opcionalmente só as páginas [start, stop))."""
     with pdfplumber.open(io.BytesIO(bytes_)) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() or ""
-    return text
+        for page in pdf.pages[start:stop]:
+            yield page.extract_text() or ""
+            page.close()  # libera o cache de objetos da página
 
 # PPTX
 def read_pptx_file(bytes_: bytes) -> str:
+    return "\n\n".join(iter_pptx_slides(bytes_))
+
+def iter_pptx_slides(bytes_: bytes):
     prs = Presentation(io.BytesIO(bytes_))
-    slides_text = []
     for slide in prs.slides:
         texts = [shape.text for shape in slide.shapes if hasattr(shape, "text")]
-        slides_text.append("\n".join(texts))
-    return "\n\n".join(slides_text)
+        yield "\n".join(texts)
 
 # Imagem – devolve string base64 (não gera texto real)
 def read_image_file(bytes_: bytes) -> str:
@@ -0,0 +1,48 @@
+# src/utils/gpu_info.py
+from __future__ import annotations
+import functools
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+@dataclass
+class GPUInfo:
+    tf_version: str = ""
+    n_devices: int = 0
+    gpu_name: Optional[str] = None      # None = nenhuma GPU visível ao TensorFlow
+    device_type: str = ""
+    memory_gb: float = 0.0
+    cuda: str = "Desconhecida"
+    cudnn: str = "Desconhecida"
+    devices: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+@functools.lru_cache(maxsize=1)
+def probe_devices() -> GPUInfo:
+    """
+    Importa o TensorFlow e consulta os dispositivos uma única vez por processo.
+    O import é feito aqui dentro (e não no topo dos módulos) porque custa segundos
+    e centenas de MB; o chat só fala com o Ollama via HTTP e não precisa dele.
+    """
+    try:
+        import tensorflow as tf
+        from tensorflow.python.client import device_lib
+    except Exception as e:
+        return GPUInfo(error=f"TensorFlow indisponível: {e}")
+
+    info = GPUInfo(tf_version=tf.__version__)
+    try:
+        info.n_devices = len(tf.config.list_physical_devices())
+        devices = device_lib.list_local_devices()
+        info.devices = [str(d) for d in devices]
+        gpus = [d for d in devices if d.device_type == "GPU"]
+        if gpus:
+            gpu = gpus[0]
+            info.gpu_name = gpu.physical_device_desc.split("name: ")[1].split(",")[0]
+            info.device_type = gpu.device_type
+            info.memory_gb = round(gpu.memory_limit / (1024**3), 2)
+            build = tf.sysconfig.get_build_info()
+            info.cuda = build.get("cuda_version", "Desconhecida")
+            info.cudnn = build.get("cudnn_version", "Desconhecida")
+    except Exception as e:
+        info.error = str(e)
+    return info
@@ -0,0 +1,245 @@
+# src/utils/history_compactor.py
+from __future__ import annotations
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.utils.async_ollama import get_bridged_client
+from src.utils.cache import LRUCache
+from src.utils.history_manager import build_history_text
+from src.utils.ollama_client import DEFAULT_HOST
+from src.utils.prompt_budget import BudgetSection, allocate
+from src.utils.scheduler import PRIORITY_BACKGROUND, get_scheduler
+from src.utils.tokens import count_tokens
+
+# Mesma raiz de dados das conversas (ver sidebar.HIST_DIR)
+SUMMARIES_DIR = Path(__file__).resolve().parent.parent.parent / "conversations" / "summaries"
+SEGMENT_MESSAGES = 6          # mensagens por segmento resumido (3 trocas pergunta/resposta)
+KEEP_RECENT_MESSAGES = 6      # as últimas mensagens sempre vão literais
+SUMMARY_WORDS = 200           # tamanho pedido para o resumo acumulado (não cresce com a conversa)
+SUMMARY_TEMPERATURE = 0.2
+SUMMARY_RESERVE_TOKENS = 512  # espaço deixado no num_ctx para o resumo gerado
+SUMMARY_MEMORY_CACHE = 512
+SUMMARY_VERSION = 2           # muda com o prompt de resumo: resumos antigos deixam de valer
+COMPACTOR_SESSION = "history-compactor"  # sessão própria na fila de geração (prioridade de fundo)
+
+SUMMARY_PROMPT = """Resuma o trecho de conversa abaixo em português do Brasil, em no máximo {words} palavras.
+Preserve fatos, decisões, números, nomes (arquivos, funções, pessoas) e pedidos ainda em aberto.
+Não invente nada e não comente o trecho: devolva só o resumo.
+
+# Trecho
+{text}
+"""
+
+ROLLING_PROMPT = """Atualize o resumo de uma conversa incorporando o trecho novo, em português do Brasil, em no máximo {words} palavras.
+Preserve fatos, decisões, números, nomes (arquivos, funções, pessoas) e pedidos ainda em aberto; do resumo
+anterior, condense o que perdeu importância em vez de repetir tudo.
+Não invente nada e não comente o texto: devolva só o resumo atualizado.
+
+# Resumo até aqui
+{summary}
+
+# Trecho novo
+{text}
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    key TEXT PRIMARY KEY,         -- hash encadeado dos segmentos já resumidos + versão do prompt
+    summary TEXT NOT NULL,
+    model TEXT NOT NULL,
+    messages INTEGER NOT NULL,    -- mensagens cobertas (do início da conversa até o fim do segmento)
+    created REAL NOT NULL
+);
+"""
+
+def segment_key(messages: List[Dict], previous: str = "") -> str:
+    """
+    Assinatura do resumo acumulado até o fim deste segmento: encadeia a chave do
+    resumo anterior (`previous`) com as mensagens do segmento. Mesmo começo de
+    conversa (em qualquer sessão) = mesma cadeia de resumos.
+    """
+    h = hashlib.sha1(f"v{SUMMARY_VERSION}:{SUMMARY_WORDS}:{previous}".encode("utf-8"))
+    for m in messages:
+        h.update(b"\x02")
+        h.update(str(m.get("role", "")).encode("utf-8"))
+        h.update(b"\x00")
+        h.update(str(m.get("content", "")).encode("utf-8"))
+    return h.hexdigest()
+
+def old_segments(n_messages: int) -> List[Tuple[int, int]]:
+    """
+    Segmentos [início, fim) resumíveis: blocos fixos de SEGMENT_MESSAGES contados do
+    começo (as fronteiras nunca mudam, então o hash de cada segmento também não),
+    todos fora das KEEP_RECENT_MESSAGES finais.
+    """
+    old = n_messages - KEEP_RECENT_MESSAGES
+    return [(i, i + SEGMENT_MESSAGES) for i in range(0, old - SEGMENT_MESSAGES + 1, SEGMENT_MESSAGES)]
+
+def chain_keys(history: List[Dict]) -> List[Tuple[int, str]]:
+    """(fim do segmento, chave do resumo acumulado até ele), para cada segmento antigo."""
+    out, key = [], ""
+    for a, b in old_segments(len(history)):
+        key = segment_key(history[a:b], key)
+        out.append((b, key))
+    return out
+
+def _render(messages: List[Dict]) -> List[str]:
+    return [build_history_text([m]) for m in messages if m.get("content", "")]
+
+@dataclass
+class CompactedHistory:
+    items: List[str] = field(default_factory=list)  # em ordem cronológica: resumo, depois mensagens literais
+    summarized: int = 0        # segmentos cobertos pelo resumo acumulado
+    pending: int = 0           # segmentos antigos ainda sem resumo (entram literais)
+
+class HistoryCompactor:
+    """
+    Compactação opcional do histórico: depois de cada resposta, os segmentos antigos
+    ainda não resumidos são incorporados, um a um, a um resumo acumulado (resumo
+    anterior + segmento novo -> resumo novo, de tamanho fixo) numa thread de fundo,
+    pela fila de geração com prioridade de fundo: só ocupa o modelo quando nenhum
+    usuário está esperando. O prompt usa o resumo mais recente pronto + os segmentos
+    posteriores e as últimas mensagens literais, então nada se perde e o histórico
+    não cresce com a conversa. Resumos ficam em memória e em SQLite, indexados pela
+    chave encadeada: o mesmo começo de conversa nunca é resumido duas vezes.
+    """
+    def __init__(self, host: str = DEFAULT_HOST, root: Path = SUMMARIES_DIR):
+        self.host = host.rstrip("/")
+        self.path = Path(root) / "summaries.sqlite"
+        self._memory = LRUCache(SUMMARY_MEMORY_CACHE)
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compactor")
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.RLock()  # o callback de um Future já concluído roda dentro de schedule()
+        self.generated = 0
+        self.failed = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:  # commit/rollback
+                yield conn
+        finally:
+            conn.close()
+
+    def summary(self, key: str) -> Optional[str]:
+        text = self._memory.get(key)
+        if text is None:
+            try:
+                with self._connect() as db:
+                    row = db.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None:
+                text = row[0]
+                self._memory.put(key, text)
+        return text
+
+    def _store(self, key: str, text: str, model: str, n_messages: int) -> None:
+        self._memory.put(key, text)
+        try:
+            with self._connect() as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO summaries (key, summary, model, messages, created) VALUES (?, ?, ?, ?, ?)",
+                    (key, text, model, n_messages, time.time()),
+                )
+        except sqlite3.Error:
+            pass  # fica só em memória: a conversa segue
+
+    def compact(self, history: List[Dict]) -> CompactedHistory:
+        """Itens do histórico para o prompt; não bloqueia nem gera nada."""
+        out = CompactedHistory()
+        chain = chain_keys(history)
+        end = 0
+        for i in range(len(chain) - 1, -1, -1):  # o resumo pronto mais recente cobre todos os anteriores
+            text = self.summary(chain[i][1])
+            if text is not None:
+                end = chain[i][0]
+                out.summarized = i + 1
+                out.items.append(f"### Resumo das mensagens 1–{end}\n{text}")
+                break
+        out.pending = len(chain) - out.summarized
+        out.items.extend(_render(history[end:]))
+        return out
+
+    def schedule(self, history: List[Dict], model: str, num_ctx: int = 4096) -> List[Future]:
+        """Agenda a atualização do resumo acumulado até o último segmento antigo (se ainda não existe nem está sendo gerado)."""
+        chain = chain_keys(history)
+        if not chain:
+            return []
+        target = chain[-1][1]
+        with self._lock:
+            fut = self._inflight.get(target)
+            if fut is not None and not fut.done():
+                return [fut]
+            if self.summary(target) is not None:
+                return []
+            history = [dict(m) for m in history]  # a sessão continua mexendo na lista original
+            fut = self._pool.submit(self._summarize_chain, history, model, num_ctx)
+            self._inflight[target] = fut
+            fut.add_done_callback(lambda f, k=target: self._done(k, f))
+            return [fut]
+
+    def _done(self, key: str, fut: Future) -> None:
+        with self._lock:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+            if fut.exception() is not None:
+                self.failed += 1  # sem resumo: o segmento segue literal e é tentado de novo na próxima resposta
+
+    def _summarize_chain(self, history: List[Dict], model: str, num_ctx: int) -> str:
+        """Percorre a cadeia a partir do último resumo pronto, incorporando um segmento por vez."""
+        summary = ""
+        for (a, b), (_, key) in zip(old_segments(len(history)), chain_keys(history)):
+            text = self.summary(key)
+            if text is None:
+                text = self._summarize(key, summary, history[a:b], b, model, num_ctx)
+            summary = text
+        return summary
+
+    def _summarize(self, key: str, previous: str, segment: List[Dict], covered: int, model: str, num_ctx: int) -> str:
+        text = "\n\n".join(_render(segment))
+        template = ROLLING_PROMPT if previous else SUMMARY_PROMPT
+        overhead = count_tokens(template.format(words=SUMMARY_WORDS, summary=previous, text=""))
+        room = max(int(num_ctx) - overhead - SUMMARY_RESERVE_TOKENS, 1)
+        kept = allocate(room, [BudgetSection("segmento", [text], truncatable=True)]).kept["segmento"]
+        prompt = template.format(words=SUMMARY_WORDS, summary=previous, text=kept[0] if kept else "")
+        parts = [
+            chunk.text for chunk in get_scheduler().stream(
+                get_bridged_client(self.host), COMPACTOR_SESSION,
+                prompt=prompt, model=model, temperature=SUMMARY_TEMPERATURE, num_ctx=num_ctx,
+                priority=PRIORITY_BACKGROUND,
+            )
+        ]
+        summary = "".join(parts).strip()
+        if not summary:
+            raise ValueError("resumo vazio")
+        self._store(key, summary, model, covered)
+        with self._lock:
+            self.generated += 1
+        return summary
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"gerados": self.generated, "em_andamento": len(self._inflight), "falhas": self.failed}
+
+_COMPACTORS: Dict[str, HistoryCompactor] = {}
+_COMPACTORS_LOCK = threading.Lock()
+
+def get_history_compactor(host: str = DEFAULT_HOST) -> HistoryCompactor:
+    key = host.rstrip("/")
+    with _COMPACTORS_LOCK:
+        comp = _COMPACTORS.get(key)
+        if comp is None:
+            comp = _COMPACTORS[key] = HistoryCompactor(host=key)
+        return comp
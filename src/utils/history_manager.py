@@ -4,17 +4,81 @@ import io
 from typing import List, Dict, Tuple
 from docx import Document
 
+from src.utils.tracing import span
+
+def _history_line(m: Dict) -> str:
+    role = m.get("role", "").capitalize()
+    return f"{role}:\n{m.get('content', '')}\n"
+
 def build_history_text(history: List[Dict]) -> str:
     """Renderiza o histórico completo em texto plano, preservando a ordem."""
-    lines = []
-    for m in history:
-        role = m.get("role", "").capitalize()
-        content = m.get("content", "")
-        if not content:
-            continue
-        lines.append(f"{role}:\n{content}\n")
+    lines = [_history_line(m) for m in history if m.get("content", "")]
     return "\n".join(lines).strip()
 
+class HistoryBuffer:
+    """
+    Histórico renderizado e chunkado de forma incremental (guardado no session_state).
+    Cada mensagem nova custa O(tamanho da mensagem + chunk): só o último chunk,
+    ainda aberto, é recortado de novo; os turnos antigos não são re-renderizados.
+    O resultado é idêntico ao de chunk_history_dynamic.
+    """
+    def __init__(self, max_chars_per_chunk: int = 8000, overlap: int = 800):
+        self.size = max_chars_per_chunk
+        self.overlap = overlap
+        self.reset()
+
+    def reset(self) -> None:
+        self._history_id = None
+        self._n_msgs = 0              # mensagens já consumidas
+        self._last: Tuple[str, str] | None = None
+        self._closed: list[str] = []  # chunks completos (não mudam mais)
+        self._closed_text = ""        # chunks completos já com cabeçalho "### Histórico (parte i)"
+        self._tail = ""               # texto bruto desde o início do chunk aberto
+        self._tail_start = 0          # posição absoluta de _tail no histórico
+
+    def _append_line(self, line: str) -> None:
+        self._tail = f"{self._tail}\n{line}" if self._tail or self._closed else line
+        stripped = self._tail.rstrip()
+        step = self.size - self.overlap
+        while len(stripped) > self.size:
+            chunk = stripped[:self.size]
+            self._closed.append(chunk)
+            sep = "\n\n" if self._closed_text else ""
+            self._closed_text += f"{sep}### Histórico (parte {len(self._closed)})\n{chunk}"
+            self._tail, stripped = self._tail[step:], stripped[step:]
+            self._tail_start += step
+
+    def sync(self, history: List[Dict]) -> "HistoryBuffer":
+        """Consome só as mensagens novas; se o histórico encolheu ou foi trocado, recomeça."""
+        n = self._n_msgs
+        if (
+            id(history) != self._history_id
+            or len(history) < n
+            or (n and (history[n - 1].get("role"), history[n - 1].get("content")) != self._last)
+        ):
+            self.reset()
+            self._history_id = id(history)
+        for m in history[self._n_msgs:]:
+            if m.get("content", ""):
+                self._append_line(_history_line(m))
+            self._last = (m.get("role"), m.get("content"))
+        self._n_msgs = len(history)
+        return self
+
+    def chunks(self) -> list[str]:
+        tail = self._tail.rstrip()
+        return self._closed + [tail] if tail else list(self._closed)
+
+    def result(self) -> Tuple[str, int, int, list[str]]:
+        """Mesmo retorno de chunk_history_dynamic: (texto_unido, total_chars, n_chunks, chunks)."""
+        tail = self._tail.rstrip()
+        if not tail:
+            return "", 0, 0, []
+        n_chunks = len(self._closed) + 1
+        last = f"### Histórico (parte {n_chunks})\n{tail}"
+        joined = f"{self._closed_text}\n\n{last}" if self._closed_text else last
+        return joined, self._tail_start + len(tail), n_chunks, self.chunks()
+
 def chunk_history_dynamic(
     history: List[Dict],
     max_chars_per_chunk: int = 8000,
@@ -28,25 +92,12 @@ def chunk_history_dynamic(
       - total_chars: tamanho total do histórico
       - n_chunks: número de partes
       - chunks: lista com o conteúdo de cada parte
+    Para uso a cada turno, prefira um HistoryBuffer persistente (incremental).
     """
-    text = build_history_text(history)
-    if not text:
-        return "", 0, 0, []
-
-    n = len(text)
-    chunks, start = [], 0
-    while start < n:
-        end = min(start + max_chars_per_chunk, n)
-        chunk = text[start:end]
-        chunks.append(chunk)
-        if end >= n:
-            break
-        start = max(0, end - overlap)
-
-    parts = []
-    for i, c in enumerate(chunks, 1):
-        parts.append(f"### Histórico (parte {i})\n{c}")
-    return "\n\n".join(parts), n, len(chunks), chunks
+    with span("history_chunking", messages=len(history)) as sp:
+        result = HistoryBuffer(max_chars_per_chunk, overlap).sync(history).result()
+        sp.set(chunks=result[2], chars=result[1])
+        return result
 
 def export_history_to_txt(history: List[Dict]) -> io.BytesIO:
     """Exporta o histórico completo para um arquivo TXT em memória."""
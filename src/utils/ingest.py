@@ -0,0 +1,137 @@
+# src/utils/ingest.py
+from __future__ import annotations
+import os
+import atexit
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from src.utils.chunker import (
+    Chunk, Segment, iter_docx_segments, iter_page_segments, iter_slide_segments, iter_text_segments, pack_segments,
+)
+from src.utils.file_reader import (
+    iter_txt_file, iter_docx_blocks, iter_pdf_pages, count_pdf_pages, iter_pptx_slides,
+)
+from src.utils.tabular import TABLE_EXTS, iter_table_chunks
+
+# Paralelismo da ingestão
+INGEST_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# "spawn": o processo do Streamlit tem várias threads (servidor, event loop do Ollama, fila,
+# exportações); um fork copiaria locks presos por elas e o filho poderia travar
+INGEST_START_METHOD = "spawn"
+PDF_PAGES_PER_TASK = 25            # PDFs grandes são divididos em faixas de páginas
+PARALLEL_MIN_BYTES = 256 * 1024    # abaixo disso (no total) o pool custa mais do que economiza
+INGEST_VERSION = 4                 # muda quando a leitura/chunking muda: invalida o cache de embeddings
+
+def iter_file_segments(name: str, data: bytes, pages: Optional[Tuple[int, int]] = None) -> Iterator[Segment]:
+    """Segmentos do arquivo com a estrutura do leitor: parágrafos/títulos, páginas, slides."""
+    ext = Path(name).suffix.lower()
+    if ext in {".txt", ".md", ".rtf"}:
+        yield from iter_text_segments(iter_txt_file(data))
+    elif ext == ".docx":
+        yield from iter_docx_segments(iter_docx_blocks(data))
+    elif ext == ".pdf":
+        start, stop = pages or (0, None)
+        yield from iter_page_segments(iter_pdf_pages(data, start, stop), first_page=start + 1)
+    elif ext in {".pptx", ".odp"}:
+        yield from iter_slide_segments(iter_pptx_slides(data))
+    elif ext in {".png", ".jpg", ".jpeg", ".gif", ".webp", ".tif"}:
+        yield Segment(f"[Imagem anexada: {name}]")
+    else:
+        yield Segment(f"[Arquivo {name} ({ext}) não suportado]")
+
+def iter_file_chunks(name: str, data: bytes, size: int, overlap: int, pages: Optional[Tuple[int, int]] = None) -> Iterator[Chunk]:
+    """Chunks do arquivo: planilhas por grupos de linhas (com cabeçalho), o resto pelo chunker estrutural."""
+    if Path(name).suffix.lower() in TABLE_EXTS:
+        yield from iter_table_chunks(name, data, size)
+    else:
+        yield from pack_segments(iter_file_segments(name, data, pages), size, overlap)
+
+def _chunk_task(name: str, data: Union[bytes, str], pages: Optional[Tuple[int, int]], size: int, overlap: int) -> List[Chunk]:
+    # Executa no processo filho (importado pelo nome: precisa ficar no nível do módulo):
+    # parse + chunking de um arquivo (ou faixa de páginas).
+    # `data` pode ser um caminho temporário (PDF dividido: evita copiar os bytes por tarefa)
+    if isinstance(data, str):
+        data = Path(data).read_bytes()
+    return list(iter_file_chunks(name, data, size, overlap, pages))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=INGEST_WORKERS, mp_context=multiprocessing.get_context(INGEST_START_METHOD))
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _split_tasks(name: str, data: bytes) -> List[Optional[Tuple[int, int]]]:
+    if Path(name).suffix.lower() != ".pdf":
+        return [None]
+    try:
+        n_pages = count_pdf_pages(data)
+    except Exception:
+        return [None]  # o erro real aparece no parse
+    if n_pages <= PDF_PAGES_PER_TASK:
+        return [None]
+    return [(p, min(p + PDF_PAGES_PER_TASK, n_pages)) for p in range(0, n_pages, PDF_PAGES_PER_TASK)]
+
+def ingest_files(files: List[Tuple[str, bytes]], size: int, overlap: int) -> List[Union[List[Chunk], Exception]]:
+    """
+    Lê e fatia vários arquivos em paralelo (pool de processos; PDFs grandes
+    também por faixas de páginas). Devolve, na ordem de entrada, a lista de
+    chunks de cada arquivo ou a exceção que impediu a leitura.
+    """
+    if not files:
+        return []
+    if INGEST_WORKERS == 1 or sum(len(d) for _, d in files) < PARALLEL_MIN_BYTES:
+        out: List[Union[List[Chunk], Exception]] = []
+        for name, data in files:
+            try:
+                out.append(_chunk_task(name, data, None, size, overlap))
+            except Exception as e:
+                out.append(e)
+        return out
+
+    pool = _get_pool()
+    futures, temp_paths = [], []
+    for name, data in files:
+        ranges = _split_tasks(name, data)
+        payload: Union[bytes, str] = data
+        if len(ranges) > 1:
+            fd, path = tempfile.mkstemp(suffix=".pdf")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            temp_paths.append(path)
+            payload = path
+        futures.append([pool.submit(_chunk_task, name, payload, pages, size, overlap) for pages in ranges])
+
+    results: List[Union[List[Chunk], Exception]] = []
+    try:
+        for file_futures in futures:
+            try:
+                results.append([c for fut in file_futures for c in fut.result()])
+            except BrokenProcessPool as e:  # worker morreu: o próximo ingest recria o pool
+                _discard_pool(pool)
+                results.append(e)
+            except Exception as e:
+                results.append(e)
+    finally:
+        for path in temp_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return results
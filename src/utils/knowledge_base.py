@@ -1,27 +1,44 @@
 # src/utils/knowledge_base.py
 
 from __future__ import annotations
-import re
-import json
+import time
+import bisect
 import hashlib
 from dataclasses import dataclass
 from typing import List, Dict, Any, Optional, Tuple
 
 import numpy as np
-import requests
-from pathlib import Path
 
-from src.utils.file_reader import (
-    read_csv_file, read_excel_file, read_txt_file, read_docx_file,
-    read_pdf_file, read_pptx_file, read_image_file,
-)
+from src.utils.chunker import CHUNKER_VERSION
+from src.utils.dedup import ChunkSignature, canonical_rows, mmr_select, signature
+from src.utils.ingest import INGEST_VERSION, ingest_files
+from src.utils.embedder import get_embedder
+from src.utils.embedding_store import EmbeddingStore
+from src.utils.vector_index import StackedRows, VectorIndex, normalize_rows
+from src.utils.lexical_index import BM25Index, reciprocal_rank_fusion
+from src.utils.cache import CacheStats, LRUCache
+from src.utils.tracing import span
 
 # Parâmetros padrão (simples)
 CHUNK_SIZE_CHARS = 3000
-CHUNK_OVERLAP_CHARS = 400
+CHUNK_OVERLAP_CHARS = 200  # teto: só frases finais inteiras do chunk anterior se repetem
 EMBED_MODEL = "nomic-embed-text"  # `ollama pull nomic-embed-text`
 TOP_K = 4
 MAX_RETRIEVED_CHARS = 4000
+HYBRID_CANDIDATES = 4  # cada ranking (vetorial e BM25) contribui top_k * N candidatos à fusão
+# Forma dos vetores em RAM no índice (int8 com escala por linha = 1/4 do float32);
+# o top-k final é repontuado em float32 a partir do memmap do store
+KB_VECTOR_STORAGE = "int8"
+# KB só lexical (embeddings falharam): reaproveitada nos reruns, embeddings re-tentados depois disso
+KB_EMBED_RETRY_S = 60
+
+# Caches de consulta: pergunta -> embedding e (KB, pergunta, top_k, max_chars) -> trechos
+QUERY_CACHE_SIZE = 512
+QUERY_CACHE_TTL_S = 3600
+RETRIEVAL_CACHE_SIZE = 128
+RETRIEVAL_CACHE_TTL_S = 600
+_query_vectors = LRUCache(QUERY_CACHE_SIZE, ttl_s=QUERY_CACHE_TTL_S)
+_retrievals = LRUCache(RETRIEVAL_CACHE_SIZE, ttl_s=RETRIEVAL_CACHE_TTL_S)
 
 @dataclass
 class KBChunk:
@@ -31,77 +48,17 @@ class KBChunk:
 @dataclass
 class KnowledgeBase:
     chunks: List[KBChunk]
-    vectors: Optional[np.ndarray]
+    vectors: Optional[np.ndarray]  # ou StackedRows (fatias de memmap por arquivo)
     use_embeddings: bool
     meta: Dict[str, Any]  # ex.: {"embed_model": "...", "file_sigs": [...]}
-
-_WS = re.compile(r"\s+")
-
-def _clean_text(s: str) -> str:
-    s = s.replace("\x00", " ")
-    s = re.sub(r"\r\n?", "\n", s)
-    s = re.sub(_WS, " ", s).strip()
-    return s
-
-def _chunk_text(text: str, size: int = CHUNK_SIZE_CHARS, overlap: int = CHUNK_OVERLAP_CHARS) -> List[str]:
-    text = _clean_text(text)
-    if not text:
-        return []
-    chunks = []
-    start = 0
-    n = len(text)
-    while start < n:
-        end = min(start + size, n)
-        chunk = text[start:end]
-        chunks.append(chunk)
-        if end == n:
-            break
-        start = max(0, end - overlap)
-    return chunks
+    index: Optional[VectorIndex] = None  # montado junto com a KB (vetores já normalizados)
+    lexical: Optional[BM25Index] = None  # BM25: fallback sem embeddings e fusão híbrida
+    canonical: Optional[np.ndarray] = None  # linha do original de cada trecho (cópias -> 1ª ocorrência)
 
 def _embed_ollama(texts: List[str], host: str = "http://localhost:11434", model: str = EMBED_MODEL, timeout: int = 60) -> np.ndarray:
-    vectors = []
-    url = f"{host.rstrip('/')}/api/embeddings"
-    for t in texts:
-        payload = {"model": model, "prompt": t}
-        r = requests.post(url, json=payload, timeout=timeout)
-        r.raise_for_status()
-        j = r.json()
-        vec = j.get("embedding")
-        if not vec:
-            raise RuntimeError("Resposta de embeddings sem vetor.")
-        vectors.append(vec)
-    return np.array(vectors, dtype=np.float32)
-
-def _keyword_score(query: str, texts: List[str]) -> np.ndarray:
-    def toks(x: str) -> set:
-        import re as _re
-        return set(_re.findall(r"[a-zA-ZÀ-ÿ0-9_]+", x.lower()))
-    q = toks(query)
-    return np.array([len(q & toks(t)) for t in texts], dtype=np.float32)
-
-def _cosine_sim(a: np.ndarray, b: np.ndarray) -> np.ndarray:
-    a_norm = a / (np.linalg.norm(a) + 1e-8)
-    b_norm = b / (np.linalg.norm(b, axis=1, keepdims=True) + 1e-8)
-    return b_norm @ a_norm
-
-def _read_any_file(name: str, data: bytes) -> str:
-    ext = Path(name).suffix.lower()
-    if ext == ".csv":
-        return read_csv_file(data)
-    if ext in {".xlsx", ".xls", ".ods"}:
-        return read_excel_file(data)
-    if ext in {".txt", ".md", ".rtf"}:
-        return read_txt_file(data)
-    if ext == ".docx":
-        return read_docx_file(data)
-    if ext == ".pdf":
-        return read_pdf_file(data)
-    if ext in {".pptx", ".odp"}:
-        return read_pptx_file(data)
-    if ext in {".png", ".jpg", ".jpeg", ".gif", ".webp", ".tif"}:
-        return f"[Imagem anexada: {name}]"
-    return f"[Arquivo {name} ({ext}) não suportado]"
+    # Lotes em /api/embed, conexões reaproveitadas e lotes concorrentes (ver embedder.py)
+    with span("embed", texts=len(texts), chars=sum(len(t) for t in texts)):
+        return get_embedder(host=host, model=model, timeout=timeout).embed(texts)
 
 def _fingerprint(name: str, data: bytes) -> str:
     h = hashlib.sha1()
@@ -109,56 +66,277 @@ def _fingerprint(name: str, data: bytes) -> str:
     h.update(data)
     return h.hexdigest()
 
-def build_kb_from_uploads(uploaded_files: List) -> KnowledgeBase:
-    chunks: List[KBChunk] = []
+def _cache_key(sig: str, size: int = CHUNK_SIZE_CHARS, overlap: int = CHUNK_OVERLAP_CHARS, model: str = EMBED_MODEL) -> str:
+    """Chave do cache: conteúdo do arquivo + parâmetros que mudam chunks/vetores."""
+    return f"{sig}:{size}:{overlap}:{model}:v{INGEST_VERSION}:c{CHUNKER_VERSION}"
+
+@dataclass
+class _FileEntry:
+    key: str
+    chunks: List[KBChunk]
+    vectors: Optional[np.ndarray]  # None = ainda não embutido (ou embeddings falharam)
+    error: bool = False             # falha de leitura: não vai para o store persistente
+    signatures: Optional[List[ChunkSignature]] = None  # calculadas uma vez por sessão (ver _signatures)
+
+def _signatures(e: _FileEntry) -> List[ChunkSignature]:
+    if e.signatures is None:
+        e.signatures = [signature(c.text) for c in e.chunks]
+    return e.signatures
+
+class KBCache:
+    """
+    Cache da KB endereçado por conteúdo (vive no session_state).
+    Arquivos inalterados não são relidos, re-chunkados nem re-embutidos;
+    adicionar/remover um anexo só adiciona/descarta os trechos daquele arquivo.
+    """
+    def __init__(self) -> None:
+        self.files: Dict[str, _FileEntry] = {}
+        self._last_keys: Tuple[str, ...] = ()
+        self._last_kb: Optional[KnowledgeBase] = None
+        self._last_built = 0.0  # time.monotonic() da última montagem
+
+    def retain(self, keys: List[str]) -> None:
+        """Descarta entradas de arquivos que não estão mais anexados."""
+        keep = set(keys)
+        for k in [k for k in self.files if k not in keep]:
+            del self.files[k]
+
+def _error_entry(key: str, name: str, exc: Exception) -> _FileEntry:
+    return _FileEntry(key=key, chunks=[KBChunk(text=f"[ERRO ao ler {name}: {exc}]", meta={"file": name, "chunk_id": 0})], vectors=None, error=True)
+
+def _load_file_entries(pending: List[Tuple[str, str, bytes, str]], store: Optional[EmbeddingStore]) -> List[_FileEntry]:
+    """Entradas dos arquivos novos (key, name, raw, sig): do store em disco ou lidas em paralelo."""
+    out: List[Optional[_FileEntry]] = [None] * len(pending)
+    to_parse: List[int] = []
+    for i, (key, name, raw, sig) in enumerate(pending):
+        # Já embutido em outra sessão/execução: nem parse nem Ollama
+        stored = store.get(key) if store is not None else None
+        if stored is not None:
+            chunks, vecs = stored
+            out[i] = _FileEntry(key=key, chunks=[KBChunk(text=t, meta=m) for t, m in chunks], vectors=vecs)
+        else:
+            to_parse.append(i)
+
+    results = ingest_files([(pending[i][1], pending[i][2]) for i in to_parse], CHUNK_SIZE_CHARS, CHUNK_OVERLAP_CHARS)
+    for i, res in zip(to_parse, results):
+        key, name, _, sig = pending[i]
+        if isinstance(res, Exception):
+            out[i] = _error_entry(key, name, res)
+        else:
+            chunks = [KBChunk(text=t, meta={"file": name, "chunk_id": j, "sig": sig, **extra}) for j, (t, extra) in enumerate(res)]
+            out[i] = _FileEntry(key=key, chunks=chunks, vectors=None)
+    return out  # type: ignore[return-value]
+
+def _embed_pending(entries: List[_FileEntry], store: Optional[EmbeddingStore], canonical: Optional[np.ndarray] = None) -> bool:
+    """
+    Embute, numa única chamada, os trechos das entradas ainda sem vetores. Com
+    `canonical` (ver dedup.canonical_rows), cópias de outro trecho da KB não vão ao
+    Ollama: recebem o vetor do original, e cada arquivo continua completo no store.
+    """
+    # O mesmo arquivo anexado duas vezes é a mesma entrada: conta só a 1ª posição
+    pending = list({id(e): e for e in entries if e.vectors is None and e.chunks}.values())
+    if not pending:
+        return True
+    offsets = np.cumsum([0] + [len(e.chunks) for e in entries])
+    if canonical is None:
+        canonical = np.arange(offsets[-1])
+    rows: Dict[int, np.ndarray] = {}
+    for i, e in enumerate(entries):
+        rows.setdefault(id(e), np.arange(offsets[i], offsets[i + 1]))
+    own = [int(r) for e in pending for r in rows[id(e)] if canonical[r] == r]
+    try:
+        vecs = normalize_rows(_embed_ollama([_chunk_at(entries, offsets, r).text for r in own])) if own else None
+    except Exception:
+        return False
+    new = {r: i for i, r in enumerate(own)}
+
+    def vector(r: int) -> np.ndarray:
+        if r in new:
+            return vecs[new[r]]  # type: ignore[index]
+        i = bisect.bisect_right(offsets, r) - 1
+        return entries[i].vectors[r - offsets[i]]  # type: ignore[index]  # original já embutido
+
+    for e in pending:
+        e.vectors = np.stack([vector(int(canonical[r])) for r in rows[id(e)]]).astype(np.float32, copy=False)
+        if store is not None and not e.error:
+            try:
+                store.put(e.key, [(c.text, c.meta) for c in e.chunks], e.vectors)
+            except (OSError, ValueError):
+                continue  # persistência é otimização: a KB da sessão segue válida
+            # Já em disco: a entrada passa a apontar para o memmap e a cópia float32 sai da RAM
+            stored = store.view([e.key])
+            if stored is not None:
+                e.vectors = stored
+    return True
+
+def _chunk_at(entries: List[_FileEntry], offsets: np.ndarray, r: int) -> KBChunk:
+    i = bisect.bisect_right(offsets, r) - 1
+    return entries[i].chunks[r - offsets[i]]
+
+def build_kb_from_uploads(uploaded_files: List, cache: Optional[KBCache] = None, store: Optional[EmbeddingStore] = None) -> KnowledgeBase:
+    """
+    Monta a KB dos anexos. Com `cache`, reruns só processam arquivos novos;
+    com `store` (ver embedding_store.get_store), o que já foi embutido em disco
+    é reaberto via memmap sem chamar o Ollama.
+    """
+    cache = cache if cache is not None else KBCache()
+    keys: List[str] = []
+    entries: List[_FileEntry] = []
     file_sigs: List[str] = []
+    changed = False
 
+    pending: List[Tuple[str, str, bytes, str]] = []
+    slots: List[int] = []
     for f in uploaded_files or []:
         try:
             raw = f.getvalue()
             sig = _fingerprint(f.name, raw)
-            file_sigs.append(sig)
-            text = _read_any_file(f.name, raw)
-            for i, c in enumerate(_chunk_text(text)):
-                chunks.append(KBChunk(text=c, meta={"file": f.name, "chunk_id": i, "sig": sig}))
         except Exception as e:
-            chunks.append(KBChunk(text=f"[ERRO ao ler {f.name}: {e}]", meta={"file": f.name, "chunk_id": 0}))
+            entries.append(_error_entry("", f.name, e))
+            changed = True
+            continue
+        file_sigs.append(sig)
+        key = _cache_key(sig)
+        entry = cache.files.get(key)
+        if entry is None and key not in {p[0] for p in pending}:
+            pending.append((key, f.name, raw, sig))
+            changed = True
+        keys.append(key)
+        slots.append(len(entries))
+        entries.append(entry)  # type: ignore[arg-type]  # preenchido abaixo
+
+    # Arquivos novos são lidos e fatiados juntos (pool de processos, ver ingest.py)
+    if pending:
+        for e in _load_file_entries(pending, store):
+            cache.files[e.key] = e
+        for slot, key in zip(slots, keys):
+            if entries[slot] is None:
+                entries[slot] = cache.files[key]
+
+    cache.retain(keys)
 
+    # Mesmo conjunto de arquivos e nada novo: reaproveita a KB montada no rerun anterior
+    # (a só lexical também, até KB_EMBED_RETRY_S: sem isso cada rerun esperaria o Ollama falhar de novo)
+    if not changed and cache._last_kb is not None and tuple(keys) == cache._last_keys:
+        if cache._last_kb.use_embeddings or time.monotonic() - cache._last_built < KB_EMBED_RETRY_S:
+            return cache._last_kb
+
+    chunks: List[KBChunk] = [c for e in entries for c in e.chunks]
     if not chunks:
         return KnowledgeBase(chunks=[], vectors=None, use_embeddings=False, meta={"embed_model": None, "file_sigs": []})
 
-    texts = [c.text for c in chunks]
-
-    try:
-        vecs = _embed_ollama(texts)
-        use_emb = True
-    except Exception:
-        vecs = None
-        use_emb = False
+    # Versões do mesmo documento (ou o mesmo conteúdo em PDF e PPTX): cópias não são embutidas
+    with span("dedup", chunks=len(chunks)) as sp:
+        canonical = canonical_rows([s for e in entries for s in _signatures(e)])
+        duplicates = int(np.count_nonzero(canonical != np.arange(len(canonical))))
+        sp.set(duplicates=duplicates)
+    use_emb = _embed_pending(entries, store, canonical)
+    vecs = None
+    if use_emb:
+        # Linhas contíguas no store: fatia do memmap; senão as fatias de cada arquivo
+        # empilhadas sem cópia (np.vstack traria tudo para a RAM)
+        with_chunks = [e for e in entries if e.chunks]
+        if store is not None and not any(e.error for e in with_chunks):
+            vecs = store.view([e.key for e in with_chunks])
+        if vecs is None:
+            vecs = StackedRows([e.vectors for e in with_chunks])
 
-    return KnowledgeBase(
+    kb_sig = hashlib.sha1("|".join(keys + [str(use_emb)]).encode()).hexdigest()
+    kb = KnowledgeBase(
         chunks=chunks,
         vectors=vecs,
         use_embeddings=use_emb,
-        meta={"embed_model": EMBED_MODEL if use_emb else None, "file_sigs": file_sigs, "processed": True}
+        meta={"embed_model": EMBED_MODEL if use_emb else None, "file_sigs": file_sigs, "processed": True, "normalized": use_emb, "kb_sig": kb_sig, "duplicates": duplicates},
+        index=VectorIndex(vecs, normalized=True, storage=KB_VECTOR_STORAGE) if use_emb else None,
+        lexical=BM25Index([c.text for c in chunks]),
+        canonical=canonical if duplicates else None,
     )
+    cache._last_keys, cache._last_kb, cache._last_built = tuple(keys), kb, time.monotonic()
+    return kb
 
-def retrieve(query: str, kb: KnowledgeBase, top_k: int = TOP_K, max_chars: int = MAX_RETRIEVED_CHARS) -> Tuple[str, List[Dict[str, Any]]]:
+def normalize_query(query: str) -> str:
+    # Reenvios com espaços/maiúsculas diferentes caem na mesma entrada dos caches
+    return " ".join(query.split()).casefold()
+
+def embed_query(query: str) -> np.ndarray:
+    """Embedding da pergunta, em cache: reenvios (ex.: após "contexto grande demais") não voltam ao Ollama."""
+    key = (EMBED_MODEL, normalize_query(query))
+    with span("embed_query") as sp:
+        vec = _query_vectors.get(key)
+        sp.set(cached=vec is not None)
+        if vec is None:
+            vec = _embed_ollama([" ".join(query.split())])[0]
+            vec.setflags(write=False)  # compartilhado entre chamadas
+            _query_vectors.put(key, vec)
+        return vec
+
+def retrieval_cache_stats() -> Dict[str, CacheStats]:
+    return {"embeddings": _query_vectors.stats(), "trechos": _retrievals.stats()}
+
+def _passage_label(meta: Dict[str, Any]) -> str:
+    """"arquivo, chunk i" + página/slide quando o leitor informou (ex.: "rel.pdf, chunk 3, p. 7-8")."""
+    label = f"{meta.get('file')}, chunk {meta.get('chunk_id')}"
+    for key, abbr in (("page", "p."), ("slide", "slide")):
+        lo, hi = meta.get(f"{key}_start"), meta.get(f"{key}_end")
+        if lo is not None:
+            label += f", {abbr} {lo}" if hi in (None, lo) else f", {abbr} {lo}-{hi}"
+    return label
+
+def retrieve_passages(query: str, kb: KnowledgeBase, top_k: int = TOP_K, max_chars: int = MAX_RETRIEVED_CHARS) -> List[Tuple[str, Dict[str, Any]]]:
+    """Trechos recuperados já formatados ("[arquivo, chunk i] texto"), em ordem de relevância."""
     if not kb or not kb.chunks:
-        return "", []
+        return []
+    with span("retrieve", top_k=top_k) as sp:
+        out = _retrieve_passages(query, kb, top_k, max_chars, sp)
+        sp.set(passages=len(out), chars=sum(len(p) for p, _ in out))
+        return out
+
+def _distinct(ranking: Any, canonical: Optional[np.ndarray]) -> List[int]:
+    """Ranking sem cópias: de cada grupo de duplicatas fica só o mais bem colocado."""
+    if canonical is None:
+        return [int(i) for i in ranking]
+    seen, out = set(), []
+    for i in ranking:
+        c = int(canonical[i])
+        if c not in seen:
+            seen.add(c)
+            out.append(int(i))
+    return out
 
-    texts = [c.text for c in kb.chunks]
+def _retrieve_passages(query: str, kb: KnowledgeBase, top_k: int, max_chars: int, sp: Any) -> List[Tuple[str, Dict[str, Any]]]:
+    kb_sig = kb.meta.get("kb_sig")
+    key = (kb_sig, normalize_query(query), top_k, max_chars)
+    if kb_sig:
+        cached = _retrievals.get(key)
+        if cached is not None:
+            sp.set(cached=True)
+            return list(cached)
+
+    if kb.lexical is None:
+        kb.lexical = BM25Index([c.text for c in kb.chunks])
+    top_k = max(top_k, 1)
 
     if kb.use_embeddings and kb.vectors is not None:
-        qv = _embed_ollama([query])[0]
-        sims = _cosine_sim(qv, kb.vectors)
+        # Híbrido: ranking vetorial + BM25 fundidos por reciprocal rank fusion
+        qv = embed_query(query)
+        if kb.index is None:
+            kb.index = VectorIndex(kb.vectors, normalized=bool(kb.meta.get("normalized")), storage=KB_VECTOR_STORAGE)
+        n_cand = top_k * HYBRID_CANDIDATES
+        vec_idx, _ = kb.index.search(qv, n_cand)
+        lex_idx, _ = kb.lexical.search(query, n_cand)
+        cands = _distinct(reciprocal_rank_fusion([vec_idx, lex_idx]), kb.canonical)[:n_cand]
+        # MMR com os vetores já calculados: relevância = posição na fusão, redundância = cosseno
+        relevance = 1.0 - np.arange(len(cands)) / max(len(cands), 1)
+        idx = [cands[p] for p in mmr_select(kb.vectors[np.asarray(cands, dtype=np.int64)], relevance, top_k)]
     else:
-        sims = _keyword_score(query, texts)
+        idx, _ = kb.lexical.search(query, top_k * HYBRID_CANDIDATES)
+        idx = _distinct(idx, kb.canonical)[:top_k]
+        if not len(idx):  # nenhum termo em comum: mantém os primeiros trechos como antes
+            idx = _distinct(range(min(len(kb.chunks), top_k * HYBRID_CANDIDATES)), kb.canonical)[:top_k]
 
-    idx = np.argsort(-sims)[:max(top_k, 1)]
     picked = [kb.chunks[i] for i in idx]
 
-    out_parts, used, meta_list = [], 0, []
+    out, used = [], 0
     for ch in picked:
         part = ch.text.strip()
         remain = max_chars - used
@@ -166,8 +344,12 @@ def retrieve(query: str, kb: KnowledgeBase, top_k: int = TOP_K, max_chars: int =
             break
         if len(part) > remain:
             part = part[:remain] + " …"
-        out_parts.append(f"[{ch.meta.get('file')}, chunk {ch.meta.get('chunk_id')}] {part}")
+        out.append((f"[{_passage_label(ch.meta)}] {part}", ch.meta))
         used += len(part)
-        meta_list.append(ch.meta)
+    if kb_sig:
+        _retrievals.put(key, tuple(out))
+    return out
 
-    return "\n\n".join(out_parts), meta_list
+def retrieve(query: str, kb: KnowledgeBase, top_k: int = TOP_K, max_chars: int = MAX_RETRIEVED_CHARS) -> Tuple[str, List[Dict[str, Any]]]:
+    passages = retrieve_passages(query, kb, top_k=top_k, max_chars=max_chars)
+    return "\n\n".join(p for p, _ in passages), [m for _, m in passages]
@@ -0,0 +1,79 @@
+# src/utils/lexical_index.py
+from __future__ import annotations
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from src.utils.vector_index import top_k_indices
+
+_TOKEN_RE = re.compile(r"[a-zA-ZÀ-ÿ0-9_]+")
+
+# Parâmetros clássicos do Okapi BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # constante da reciprocal rank fusion
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+class BM25Index:
+    """
+    Índice invertido com pontuação BM25, montado uma vez junto com a KB.
+    Postings em formato CSR (docs/pesos contíguos por termo) com o peso BM25
+    já calculado: a consulta só soma as postings dos seus próprios termos.
+    """
+    def __init__(self, texts: Sequence[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.n_docs = len(texts)
+        self.vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        tfs: List[int] = []
+        doc_len = np.zeros(self.n_docs, dtype=np.float32)
+
+        for d, text in enumerate(texts):
+            toks = tokenize(text)
+            doc_len[d] = len(toks)
+            for term, tf in Counter(toks).items():
+                tid = self.vocab.setdefault(term, len(self.vocab))
+                term_ids.append(tid)
+                doc_ids.append(d)
+                tfs.append(tf)
+
+        terms = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(terms, kind="stable")
+        df = np.bincount(terms, minlength=len(self.vocab))
+        self._offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        self._docs = np.asarray(doc_ids, dtype=np.int32)[order]
+
+        tf = np.asarray(tfs, dtype=np.float32)[order]
+        avgdl = float(doc_len.mean()) if self.n_docs else 0.0
+        norm = k1 * (1 - b + b * doc_len[self._docs] / (avgdl or 1.0))
+        idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self._weights = (np.repeat(idf, df) * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+
+    def scores(self, query: str) -> np.ndarray:
+        out = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            tid = self.vocab.get(term)
+            if tid is None:
+                continue
+            s, e = self._offsets[tid], self._offsets[tid + 1]
+            out[self._docs[s:e]] += self._weights[s:e]  # docs únicos por termo
+        return out
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(índices, scores) dos k melhores trechos com pelo menos um termo em comum."""
+        scores = self.scores(query)
+        idx = top_k_indices(scores, k)
+        idx = idx[scores[idx] > 0]
+        return idx, scores[idx]
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> List[int]:
+    """Funde listas ranqueadas: score(d) = Σ 1 / (k + posição). Não depende da escala dos scores."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for pos, doc in enumerate(ranking):
+            fused[int(doc)] = fused.get(int(doc), 0.0) + 1.0 / (k + pos + 1)
+    return sorted(fused, key=lambda d: -fused[d])
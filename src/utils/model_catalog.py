@@ -0,0 +1,168 @@
+# src/utils/model_catalog.py
+from __future__ import annotations
+import os
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.utils.async_ollama import get_async_client, get_loop
+from src.utils.ollama_client import DEFAULT_HOST, parse_model_names
+
+# Mesma raiz de dados das conversas (ver sidebar.HIST_DIR)
+CATALOG_PATH = Path(__file__).resolve().parent.parent.parent / "conversations" / "model_catalog.json"
+CATALOG_TTL_S = 60          # depois disso a lista é atualizada em segundo plano
+FIRST_LOAD_WAIT_S = 1.5     # sem lista conhecida: espera no máximo isso pela 1ª consulta
+RETRY_S = 10                # após uma falha, nova tentativa no máximo a cada N segundos
+
+@dataclass
+class ModelInfo:
+    name: str
+    size_bytes: int = 0
+    family: str = ""
+    parameter_size: str = ""
+    quantization: str = ""
+
+    @property
+    def label(self) -> str:
+        """Ex.: "gpt-oss:20b · 13.8 GB · gptoss 20.9B Q4_K_M"."""
+        parts = [self.name]
+        if self.size_bytes:
+            parts.append(f"{self.size_bytes / 1e9:.1f} GB")
+        details = " ".join(p for p in (self.family, self.parameter_size, self.quantization) if p)
+        if details:
+            parts.append(details)
+        return " · ".join(parts)
+
+@dataclass
+class CatalogSnapshot:
+    models: List[ModelInfo] = field(default_factory=list)
+    fetched_at: Optional[float] = None   # epoch da última consulta bem-sucedida
+    error: Optional[str] = None          # erro da última tentativa (lista pode estar velha)
+    refreshing: bool = False
+
+    @property
+    def names(self) -> List[str]:
+        return [m.name for m in self.models]
+
+    def age_s(self) -> Optional[float]:
+        return None if self.fetched_at is None else time.time() - self.fetched_at
+
+def parse_model_infos(j: Any) -> List[ModelInfo]:
+    """/api/tags com detalhes (tamanho, família, quantização); formatos antigos viram só nomes."""
+    if isinstance(j, dict) and isinstance(j.get("models"), list) and all(isinstance(m, dict) for m in j["models"]):
+        out = []
+        for m in j["models"]:
+            name = m.get("name") or m.get("model")
+            if not name:
+                continue
+            d = m.get("details") or {}
+            out.append(ModelInfo(
+                name=name,
+                size_bytes=int(m.get("size") or 0),
+                family=d.get("family") or "",
+                parameter_size=d.get("parameter_size") or "",
+                quantization=d.get("quantization_level") or "",
+            ))
+        if out:
+            return out
+    return [ModelInfo(name=n) for n in parse_model_names(j)]
+
+class ModelCatalog:
+    """
+    Catálogo de modelos do Ollama para a UI: a sidebar lê só o que já está em memória
+    (ou no arquivo da última execução) e nunca espera o servidor; quando a lista passa
+    de `ttl_s`, uma atualização roda no event loop do processo. Se o Ollama estiver
+    lento ou fora do ar, continua valendo a última lista conhecida.
+    """
+    def __init__(self, host: str = DEFAULT_HOST, ttl_s: float = CATALOG_TTL_S, path: Optional[Path] = CATALOG_PATH):
+        self.host = host.rstrip("/")
+        self.ttl_s = ttl_s
+        self.path = path
+        self._snap = CatalogSnapshot()
+        self._pending: Optional[Future] = None
+        self._attempted_at = float("-inf")
+        self._lock = threading.Lock()
+        self._load_disk()
+
+    def _load_disk(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("host") == self.host:
+                self._snap = CatalogSnapshot(
+                    models=[ModelInfo(**m) for m in data.get("models", [])],
+                    fetched_at=data.get("fetched_at"),
+                )
+        except (OSError, ValueError, TypeError):
+            pass
+
+    def _save_disk(self, snap: CatalogSnapshot) -> None:
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".json.tmp")
+            tmp.write_text(json.dumps({
+                "host": self.host, "fetched_at": snap.fetched_at, "models": [asdict(m) for m in snap.models],
+            }, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # o arquivo é só um atalho para a próxima inicialização
+
+    async def _refresh(self) -> CatalogSnapshot:
+        # Roda no event loop do processo; publica o resultado antes de concluir o Future
+        try:
+            models = parse_model_infos(await get_async_client(self.host).model_tags())
+        except Exception as e:
+            with self._lock:
+                self._snap = CatalogSnapshot(models=self._snap.models, fetched_at=self._snap.fetched_at, error=str(e) or type(e).__name__)
+                return self._snap
+        with self._lock:
+            self._snap = CatalogSnapshot(models=models, fetched_at=time.time())
+            snap = self._snap
+        self._save_disk(snap)
+        return snap
+
+    def refresh(self) -> Future:
+        """Agenda uma atualização (se já não houver uma em andamento)."""
+        with self._lock:
+            idle = self._pending is None or self._pending.done()
+            backoff = self._snap.error is not None and time.monotonic() - self._attempted_at < RETRY_S
+            if idle and not backoff:
+                self._attempted_at = time.monotonic()
+                self._pending = asyncio.run_coroutine_threadsafe(self._refresh(), get_loop())
+            return self._pending
+
+    def snapshot(self) -> CatalogSnapshot:
+        """Lista atual sem bloquear (exceto na 1ª vez, sem nada conhecido: até FIRST_LOAD_WAIT_S)."""
+        with self._lock:
+            snap = self._snap
+        age = snap.age_s()
+        if age is None or age > self.ttl_s:
+            fut = self.refresh()
+            if not snap.models and snap.error is None:  # só na 1ª consulta; depois de uma falha, não espera
+                try:
+                    fut.result(FIRST_LOAD_WAIT_S)
+                except Exception:
+                    pass  # segue com o que houver; a atualização continua em segundo plano
+        with self._lock:
+            s = self._snap
+            pending = self._pending is not None and not self._pending.done()
+            return CatalogSnapshot(models=s.models, fetched_at=s.fetched_at, error=s.error, refreshing=pending)
+
+_CATALOGS: Dict[str, ModelCatalog] = {}
+_CATALOGS_LOCK = threading.Lock()
+
+def get_model_catalog(host: str = DEFAULT_HOST) -> ModelCatalog:
+    key = host.rstrip("/")
+    with _CATALOGS_LOCK:
+        cat = _CATALOGS.get(key)
+        if cat is None:
+            cat = _CATALOGS[key] = ModelCatalog(host=key)
+        return cat
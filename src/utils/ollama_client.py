@@ -1,66 +1,102 @@
 # src/utils/ollama_client.py
-import requests
-from typing import Dict, List
+# Constantes, tipos e formatos da API do Ollama; o cliente em si é o AsyncOllamaClient
+# (src/utils/async_ollama.py), usado pelo código síncrono via get_bridged_client()
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
 
-class OllamaClient:
-    """
-    Wrapper simples para a API local do Ollama.
-    Compatível com /api/generate e fallback para /api/chat.
-    """
-    def __init__(self, host: str = "http://localhost:11434"):
-        self.host = host.rstrip("/")
+import httpx
 
-    def ask(self, *, prompt: str, model: str, temperature: float = 1.0) -> str:
-        # 1) Tenta /api/generate (não-stream)
-        gen_payload: Dict = {
+DEFAULT_HOST = "http://localhost:11434"
+
+# Timeouts (segundos): conexão curta; leitura = silêncio máximo entre bytes
+CONNECT_TIMEOUT_S = 3.05
+READ_TIMEOUT_S = 120            # listagem, sondagem e embeddings
+GENERATE_READ_TIMEOUT_S = 600   # geração: carga do modelo + avaliação de um prompt longo antes do 1º token
+LIST_TIMEOUT_S = 8
+PROBE_TIMEOUT_S = 5
+POOL_SIZE = 16  # conexões keep-alive mantidas por host
+
+# Campos de estatística que o Ollama devolve na última linha (done=true)
+_STAT_KEYS = (
+    "total_duration", "load_duration", "prompt_eval_count",
+    "prompt_eval_duration", "eval_count", "eval_duration",
+)
+
+@dataclass
+class StreamChunk:
+    """Pedaço do streaming: `text` é o delta; o último traz done=True e as estatísticas."""
+    text: str = ""
+    done: bool = False
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+@dataclass
+class Capabilities:
+    """Rotas que o servidor Ollama expõe (detectadas uma vez por processo)."""
+    generate: bool = True
+    chat: bool = True
+    embed: bool = True        # /api/embed (lote)
+    embeddings: bool = True   # /api/embeddings (legado, um texto)
+    tags: bool = True
+    models: bool = False
+
+# (campo de Capabilities, método, rota) sondados com corpo vazio
+PROBE_ROUTES = (
+    ("generate", "POST", "/api/generate"),
+    ("chat", "POST", "/api/chat"),
+    ("embed", "POST", "/api/embed"),
+    ("embeddings", "POST", "/api/embeddings"),
+    ("tags", "GET", "/api/tags"),
+    ("models", "GET", "/api/models"),
+)
+
+def endpoint_missing(r: httpx.Response) -> bool:
+    """404/405/501 sem corpo JSON = rota inexistente (Ollama antigo), não 'modelo não encontrado'."""
+    return r.status_code in (404, 405, 501) and not r.text.lstrip().startswith("{")
+
+def build_payload(use_generate: bool, prompt: str, model: str, temperature: float, stream: bool, num_ctx: Optional[int] = None) -> Tuple[str, Dict]:
+    """Rota e corpo da geração: /api/generate quando existe, senão /api/chat."""
+    options: Dict[str, Any] = {"temperature": temperature}
+    if num_ctx:
+        options["num_ctx"] = int(num_ctx)  # sem isso o Ollama usa o padrão dele e trunca calado
+    if use_generate:
+        return "/api/generate", {
             "model": model,
             "prompt": prompt,
-            "options": {"temperature": temperature},
-            "stream": False,
+            "options": options,
+            "stream": stream,
         }
-        try:
-            r = requests.post(f"{self.host}/api/generate", json=gen_payload, timeout=120)
-            r.raise_for_status()
-            data = r.json()
-            # respostas típicas: {"response": "..."} ou {"output": "..."}
-            return data.get("response") or data.get("output") or str(data)
-        except Exception:
-            # 2) Fallback: /api/chat com messages
-            chat_payload: Dict = {
-                "model": model,
-                "messages": [{"role": "user", "content": prompt}],
-                "options": {"temperature": temperature},
-                "stream": False,
-            }
-            r = requests.post(f"{self.host}/api/chat", json=chat_payload, timeout=120)
-            r.raise_for_status()
-            data = r.json()
-            # formatos variam
-            return data.get("message", {}).get("content") or data.get("response") or data.get("text") or str(data)
+    return "/api/chat", {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "options": options,
+        "stream": stream,
+    }
+
+def response_text(data: Dict) -> str:
+    # formatos variam: {"response": "..."}, {"output": "..."} ou {"message": {"content": "..."}}
+    return (
+        data.get("response") or data.get("output")
+        or (data.get("message") or {}).get("content") or data.get("text") or str(data)
+    )
+
+def stream_delta(data: Dict) -> str:
+    """Texto novo de uma linha NDJSON do streaming (/api/generate ou /api/chat)."""
+    return data.get("response") or (data.get("message") or {}).get("content") or ""
 
-    def list_models(self) -> List[str]:
-        endpoints = ["/api/tags", "/api/models"]
-        for ep in endpoints:
-            try:
-                r = requests.get(f"{self.host}{ep}", timeout=8)
-                r.raise_for_status()
-                j = r.json()
-                if isinstance(j, dict):
-                    if "models" in j and isinstance(j["models"], list):
-                        names = []
-                        for m in j["models"]:
-                            if isinstance(m, dict) and "name" in m:
-                                names.append(m["name"])
-                            elif isinstance(m, str):
-                                names.append(m)
-                        if names:
-                            return names
-                    if "tags" in j and isinstance(j["tags"], list):
-                        return [t.get("name") if isinstance(t, dict) else str(t) for t in j["tags"]]
-                    if isinstance(j, list):
-                        return [i.get("name") if isinstance(i, dict) and "name" in i else str(i) for i in j]
-                elif isinstance(j, list):
-                    return [i.get("name") if isinstance(i, dict) and "name" in i else str(i) for i in j]
-            except Exception:
-                continue
-        raise RuntimeError("Nenhum modelo listado pelo Ollama (verifique se o serviço está rodando).")
+def parse_model_names(j: Any) -> List[str]:
+    """Nomes de modelos das respostas de /api/tags ou /api/models (formatos variam entre versões)."""
+    if isinstance(j, dict):
+        if "models" in j and isinstance(j["models"], list):
+            names = []
+            for m in j["models"]:
+                if isinstance(m, dict) and "name" in m:
+                    names.append(m["name"])
+                elif isinstance(m, str):
+                    names.append(m)
+            if names:
+                return names
+        if "tags" in j and isinstance(j["tags"], list):
+            return [t.get("name") if isinstance(t, dict) else str(t) for t in j["tags"]]
+    elif isinstance(j, list):
+        return [i.get("name") if isinstance(i, dict) and "name" in i else str(i) for i in j]
+    raise RuntimeError("Nenhum modelo listado pelo Ollama (verifique se o serviço está rodando).")
@@ -0,0 +1,95 @@
+# src/utils/prompt_budget.py
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from src.utils.tokens import count_tokens, get_tokenizer
+
+MIN_TRUNCATED_TOKENS = 64  # abaixo disso não vale a pena incluir um pedaço truncado
+OUTPUT_RESERVE_FRACTION = 0.25   # parte do num_ctx guardada para a resposta gerada...
+OUTPUT_RESERVE_MIN = 256         # ...com piso e teto em tokens
+OUTPUT_RESERVE_MAX = 4096
+
+class PromptBudgetError(ValueError):
+    """O conteúdo obrigatório (pergunta atual) sozinho não cabe no context_size."""
+
+@dataclass
+class BudgetSection:
+    """
+    Bloco do prompt disputando o orçamento. `items` vêm em ordem de prioridade
+    (o primeiro é o mais importante); quando um item não cabe, os seguintes da
+    seção também ficam de fora.
+    - required: se não couber, o prompt é rejeitado (ex.: a pergunta atual)
+    - truncatable: o item que não couber inteiro pode entrar cortado
+    """
+    name: str
+    items: List[str]
+    required: bool = False
+    truncatable: bool = False
+
+@dataclass
+class BudgetResult:
+    kept: Dict[str, List[str]]    # itens mantidos por seção, na ordem de prioridade
+    dropped: Dict[str, int]       # quantos itens ficaram de fora por seção
+    used: int                     # tokens do que foi mantido (+ overhead)
+    budget: int
+    exceeded: bool = False        # só quando algo obrigatório não coube
+    truncated: List[str] = field(default_factory=list)
+
+def _truncate_to(text: str, max_tokens: int) -> str:
+    """Maior prefixo com até max_tokens (busca binária no nº de caracteres)."""
+    tok = get_tokenizer()  # direto, sem poluir o cache com prefixos
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if tok.count(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo].rstrip() + " …" if lo < len(text) else text
+
+def prompt_budget(context_size: int) -> int:
+    """
+    Tokens disponíveis para o prompt: o num_ctx enviado ao Ollama menos a reserva da
+    resposta. Sem ela, um prompt que enche o contexto faz o Ollama descartar/deslocar
+    tokens em silêncio assim que a geração começa.
+    """
+    size = int(context_size)
+    reserve = min(max(int(size * OUTPUT_RESERVE_FRACTION), OUTPUT_RESERVE_MIN), OUTPUT_RESERVE_MAX)
+    return max(size - reserve, size // 2)
+
+def allocate(budget: int, sections: List[BudgetSection], overhead: int = 0) -> BudgetResult:
+    """
+    Distribui o orçamento de tokens (slider context_size) entre as seções,
+    na ordem em que foram passadas: as primeiras têm prioridade.
+    `overhead` = tokens fixos do template (cabeçalhos, instruções de estilo).
+    """
+    remaining = int(budget) - overhead
+    res = BudgetResult(kept={}, dropped={}, used=overhead, budget=int(budget))
+    for sec in sections:
+        kept: List[str] = []
+        for i, item in enumerate(sec.items):
+            n = count_tokens(item)
+            if n <= remaining:
+                kept.append(item)
+                remaining -= n
+                res.used += n
+                continue
+            if sec.required:
+                res.exceeded = True
+                res.used += n
+                kept.append(item)
+                remaining -= n
+                continue
+            if sec.truncatable and remaining >= MIN_TRUNCATED_TOKENS:
+                cut = _truncate_to(item, remaining - 1)  # -1: reticências
+                n = count_tokens(cut)
+                kept.append(cut)
+                remaining -= n
+                res.used += n
+                res.truncated.append(sec.name)
+                i += 1
+            res.dropped[sec.name] = len(sec.items) - i
+            break
+        res.kept[sec.name] = kept
+    return res
@@ -0,0 +1,164 @@
+# src/utils/response_cache.py
+from __future__ import annotations
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+import numpy as np
+
+from src.utils.knowledge_base import normalize_query
+
+# Mesma raiz de dados das conversas (ver sidebar.HIST_DIR)
+RESPONSE_CACHE_DIR = Path(__file__).resolve().parent.parent.parent / "conversations" / "response_cache"
+RESPONSE_CACHE_MAX_ENTRIES = 2000
+RESPONSE_CACHE_TTL_S = 7 * 24 * 3600
+SIMILARITY_THRESHOLD = 0.95   # cosseno mínimo entre perguntas para reaproveitar a resposta
+TEMPERATURE_STEP = 0.5        # temperaturas no mesmo degrau compartilham respostas
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,          -- modelo + degrau de temperatura + KB + contexto do usuário
+    query TEXT NOT NULL,          -- pergunta normalizada (match exato)
+    vector BLOB,                  -- embedding float32 normalizado (match por similaridade)
+    answer TEXT NOT NULL,
+    stats TEXT,
+    created REAL NOT NULL,
+    last_hit REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS responses_scope_query ON responses(scope, query);
+CREATE INDEX IF NOT EXISTS responses_last_hit ON responses(last_hit);
+"""
+
+@dataclass
+class CachedResponse:
+    answer: str
+    stats: Dict[str, Any]
+    similarity: float   # 1.0 = mesma pergunta
+
+def history_fingerprint(history: Sequence[Dict[str, Any]]) -> str:
+    """Assinatura dos turnos anteriores à pergunta ("-" = início de conversa)."""
+    if not history:
+        return "-"
+    h = hashlib.sha1()
+    for m in history:
+        h.update(str(m.get("role", "")).encode("utf-8"))
+        h.update(b"\x00")
+        h.update(str(m.get("content", "")).encode("utf-8"))
+        h.update(b"\x01")
+    return h.hexdigest()[:16]
+
+def cache_scope(model: str, temperature: float, kb_sig: Optional[str], user_ctx: str,
+                effort: str = "", history: Sequence[Dict[str, Any]] = ()) -> str:
+    """
+    O que precisa coincidir, além da pergunta, para uma resposta ser reaproveitável:
+    inclui o tipo de resposta e os turnos anteriores (um "e o segundo item?" depende
+    da conversa em que foi feito).
+    """
+    bucket = round(float(temperature) / TEMPERATURE_STEP) * TEMPERATURE_STEP
+    ctx = hashlib.sha1(user_ctx.strip().encode("utf-8")).hexdigest()[:16]
+    style = effort.strip().lower() or "-"
+    return f"{model}|t{bucket:.1f}|{kb_sig or '-'}|{ctx}|{style}|{history_fingerprint(history)}"
+
+class ResponseCache:
+    """
+    Cache de respostas em SQLite (um arquivo local), com busca exata pela pergunta
+    normalizada e, com embedding disponível, por similaridade dentro do mesmo escopo.
+    Evicção: itens sem uso há mais de `ttl_s` e, acima de `max_entries`, os menos usados recentemente.
+    """
+    def __init__(self, root: Path = RESPONSE_CACHE_DIR, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl_s: float = RESPONSE_CACHE_TTL_S, threshold: float = SIMILARITY_THRESHOLD):
+        self.path = Path(root) / "responses.sqlite"
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:  # commit/rollback
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, scope: str, query: str, vector: Optional[np.ndarray] = None) -> Optional[CachedResponse]:
+        q = normalize_query(query)
+        now = time.time()
+        with self._lock, self._connect() as db:
+            row = db.execute(
+                "SELECT id, answer, stats FROM responses WHERE scope = ? AND query = ? AND last_hit > ?",
+                (scope, q, now - self.ttl_s),
+            ).fetchone()
+            sim = 1.0
+            if row is None and vector is not None:
+                row, sim = self._nearest(db, scope, vector, now)
+            if row is None:
+                return None
+            db.execute("UPDATE responses SET last_hit = ?, hits = hits + 1 WHERE id = ?", (now, row[0]))
+        return CachedResponse(answer=row[1], stats=json.loads(row[2] or "{}"), similarity=sim)
+
+    def _nearest(self, db: sqlite3.Connection, scope: str, vector: np.ndarray, now: float):
+        rows = db.execute(
+            "SELECT id, answer, stats, vector FROM responses WHERE scope = ? AND vector IS NOT NULL AND last_hit > ?",
+            (scope, now - self.ttl_s),
+        ).fetchall()
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        rows = [r for r in rows if len(r[3]) == q.nbytes]  # vetores de outro modelo de embedding ficam de fora
+        if not rows:
+            return None, 0.0
+        mat = np.frombuffer(b"".join(r[3] for r in rows), dtype=np.float32).reshape(len(rows), -1)
+        sims = mat @ q
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None, 0.0
+        return rows[best][:3], float(sims[best])
+
+    def put(self, scope: str, query: str, answer: str, vector: Optional[np.ndarray] = None,
+            stats: Optional[Dict[str, Any]] = None) -> None:
+        blob = None
+        if vector is not None:
+            v = np.asarray(vector, dtype=np.float32)
+            blob = (v / (np.linalg.norm(v) or 1.0)).astype(np.float32).tobytes()
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (scope, query, vector, answer, stats, created, last_hit) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (scope, normalize_query(query), blob, answer, json.dumps(stats or {}), now, now),
+            )
+            self._evict(db, now)
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        db.execute("DELETE FROM responses WHERE last_hit <= ?", (now - self.ttl_s,))
+        db.execute(
+            "DELETE FROM responses WHERE id IN (SELECT id FROM responses ORDER BY last_hit DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self) -> None:
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM responses")
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """Cache de respostas do processo (o arquivo SQLite é compartilhado entre sessões)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,222 @@
+# src/utils/scheduler.py
+from __future__ import annotations
+import time
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Iterator, Optional
+
+from src.utils.async_ollama import BridgedOllamaClient
+from src.utils.ollama_client import StreamChunk
+from src.utils.tracing import generation_attrs, record_span
+
+# Gerações simultâneas por modelo (o Ollama serializa na GPU; mais que isso só divide a VRAM)
+MAX_CONCURRENT_PER_MODEL = 1
+QUEUE_TIMEOUT_S = 600       # desiste de esperar a vez depois disso
+QUEUE_POLL_S = 0.5          # intervalo entre atualizações da posição na fila
+PRIORITY_USER = 0           # perguntas dos usuários
+PRIORITY_BACKGROUND = 1     # trabalho de fundo (ex.: resumos do histórico): só sem usuário esperando
+
+class GenerationCancelled(RuntimeError):
+    """A geração foi cancelada (nova pergunta da mesma sessão ou sessão encerrada)."""
+
+class QueueTimeout(RuntimeError):
+    """Esperou QUEUE_TIMEOUT_S na fila sem conseguir vaga."""
+
+@dataclass(eq=False)
+class Ticket:
+    session_id: str
+    model: str
+    priority: int = PRIORITY_USER
+    enqueued: float = field(default_factory=time.monotonic)
+    granted: threading.Event = field(default_factory=threading.Event)
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    started: Optional[float] = None
+
+    @property
+    def waited_s(self) -> float:
+        return (self.started or time.monotonic()) - self.enqueued
+
+class _ModelQueue:
+    def __init__(self):
+        self.active: set = set()
+        self.waiting: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()  # sessão -> tickets; ordem = rodízio
+        self.background: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()  # idem, PRIORITY_BACKGROUND
+
+    def lane(self, ticket: Ticket) -> "OrderedDict[str, Deque[Ticket]]":
+        return self.background if ticket.priority == PRIORITY_BACKGROUND else self.waiting
+
+class GenerationScheduler:
+    """
+    Fila de geração do processo, na frente do BridgedOllamaClient:
+    - no máximo `max_concurrent` gerações por modelo ao mesmo tempo
+    - vagas distribuídas em rodízio entre sessões (uma sessão com várias
+      perguntas na fila não passa na frente das outras)
+    - nova pergunta de uma sessão cancela a anterior (na fila ou em andamento)
+    - pedidos PRIORITY_BACKGROUND só recebem vaga quando nenhum usuário está na fila
+      (a geração de fundo já em andamento não é interrompida)
+    """
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_PER_MODEL):
+        self.max_concurrent = max_concurrent
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._by_session: Dict[str, Ticket] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_id: str, model: str, priority: int = PRIORITY_USER) -> Ticket:
+        ticket = Ticket(session_id=session_id, model=model, priority=priority)
+        with self._lock:
+            prev = self._by_session.get(session_id)
+            if prev is not None:
+                self._cancel_locked(prev)
+            self._by_session[session_id] = ticket
+            q = self._queues.setdefault(model, _ModelQueue())
+            q.lane(ticket).setdefault(session_id, deque()).append(ticket)
+            self._dispatch_locked(q)
+        return ticket
+
+    def _dispatch_locked(self, q: _ModelQueue) -> None:
+        while len(q.active) < self.max_concurrent:
+            lane = q.waiting or q.background
+            if not lane:
+                return
+            session_id, tickets = next(iter(lane.items()))
+            ticket = tickets.popleft()
+            del lane[session_id]
+            if tickets:  # ainda tem pedidos: volta para o fim do rodízio
+                lane[session_id] = tickets
+            ticket.started = time.monotonic()
+            q.active.add(ticket)
+            ticket.granted.set()
+
+    def _cancel_locked(self, ticket: Ticket) -> None:
+        ticket.cancelled.set()
+        q = self._queues.get(ticket.model)
+        if q is None or ticket.granted.is_set():
+            return  # em andamento: o laço de streaming percebe e libera a vaga
+        lane = q.lane(ticket)
+        tickets = lane.get(ticket.session_id)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del lane[ticket.session_id]
+
+    def cancel(self, ticket: Ticket) -> None:
+        with self._lock:
+            self._cancel_locked(ticket)
+
+    def release(self, ticket: Ticket) -> None:
+        """Libera a vaga (ou sai da fila). Sempre chamar num finally."""
+        with self._lock:
+            q = self._queues.get(ticket.model)
+            if q is not None:
+                if ticket in q.active:
+                    q.active.discard(ticket)
+                else:
+                    self._cancel_locked(ticket)
+                self._dispatch_locked(q)
+            if self._by_session.get(ticket.session_id) is ticket:
+                del self._by_session[ticket.session_id]
+
+    def position(self, ticket: Ticket) -> int:
+        """Quantos pedidos serão atendidos antes deste (0 = é o próximo ou já está gerando)."""
+        with self._lock:
+            q = self._queues.get(ticket.model)
+            if ticket.granted.is_set() or q is None:
+                return 0
+            # Simula o rodízio: rodada r atende o r-ésimo pedido de cada sessão, na ordem atual;
+            # pedidos de fundo ficam atrás de todos os de usuários
+            lane = q.lane(ticket)
+            ahead = 0 if lane is q.waiting else sum(len(t) for t in q.waiting.values())
+            for tickets in lane.values():
+                if ticket in tickets:
+                    mine = tickets.index(ticket)
+                    ahead += mine
+                    break
+            else:
+                return 0
+            for sid, tickets in lane.items():
+                if sid == ticket.session_id:
+                    continue
+                ahead += min(len(tickets), mine + (1 if self._before(lane, sid, ticket.session_id) else 0))
+            return ahead
+
+    @staticmethod
+    def _before(lane: "OrderedDict[str, Deque[Ticket]]", a: str, b: str) -> bool:
+        for sid in lane:
+            if sid == a:
+                return True
+            if sid == b:
+                return False
+        return False
+
+    def stats(self, model: str) -> Dict[str, int]:
+        with self._lock:
+            q = self._queues.get(model)
+            if q is None:
+                return {"active": 0, "waiting": 0, "background": 0}
+            return {
+                "active": len(q.active),
+                "waiting": sum(len(t) for t in q.waiting.values()),
+                "background": sum(len(t) for t in q.background.values()),
+            }
+
+    def stream(
+        self,
+        client: BridgedOllamaClient,
+        session_id: str,
+        *,
+        prompt: str,
+        model: str,
+        temperature: float = 1.0,
+        num_ctx: Optional[int] = None,
+        on_wait: Optional[Callable[[int], None]] = None,
+        priority: int = PRIORITY_USER,
+    ) -> Iterator[StreamChunk]:
+        """
+        client.ask_stream passando pela fila. `on_wait(posição)` é chamado enquanto espera
+        (bom lugar para atualizar a UI). Encerrar o gerador (sessão saiu, exceção) libera a vaga.
+        """
+        ticket = self.submit(session_id, model, priority)
+        t_queue = time.perf_counter()
+        try:
+            deadline = time.monotonic() + QUEUE_TIMEOUT_S
+            while not ticket.granted.is_set():
+                if ticket.cancelled.is_set():
+                    raise GenerationCancelled("pergunta substituída por outra mais recente")
+                if time.monotonic() > deadline:
+                    raise QueueTimeout(f"sem vaga no modelo {model} após {QUEUE_TIMEOUT_S} s na fila")
+                if on_wait is not None:
+                    on_wait(self.position(ticket))
+                ticket.granted.wait(QUEUE_POLL_S)
+            if ticket.cancelled.is_set():
+                raise GenerationCancelled("pergunta substituída por outra mais recente")
+            # Spans registrados sem `with`: este gerador entrega o controle ao chamador a cada yield
+            t_gen = time.perf_counter()
+            record_span("queue", t_queue, t_gen, model=model, waited_s=round(ticket.waited_s, 3))
+            gen_attrs = {"model": model, "prompt_chars": len(prompt)}
+            gen = client.ask_stream(prompt=prompt, model=model, temperature=temperature, num_ctx=num_ctx)
+            try:
+                for chunk in gen:
+                    if ticket.cancelled.is_set():
+                        gen_attrs["error"] = "GenerationCancelled"
+                        raise GenerationCancelled("pergunta substituída por outra mais recente")
+                    if chunk.done:
+                        chunk.stats["queue_s"] = round(ticket.waited_s, 3)
+                        gen_attrs.update(generation_attrs(chunk.stats))
+                    yield chunk
+            finally:
+                gen.close()  # fecha a conexão: o Ollama interrompe a geração
+                record_span("generate", t_gen, time.perf_counter(), **gen_attrs)
+        finally:
+            self.release(ticket)
+
+_scheduler: Optional[GenerationScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> GenerationScheduler:
+    """Fila compartilhada por todas as sessões do processo."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = GenerationScheduler()
+        return _scheduler
@@ -0,0 +1,188 @@
+# src/utils/tabular.py
+from __future__ import annotations
+import io
+import csv
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Planilhas são lidas em blocos de linhas: a memória fica limitada ao bloco, não ao arquivo
+TABLE_ROWS_PER_FRAME = 20000
+TABLE_EXTS = {".csv", ".xlsx", ".xls", ".ods"}
+
+Frame = Tuple[Optional[str], pd.DataFrame]  # (aba, bloco); índice do bloco = nº da linha de dados (a partir de 1)
+
+def _sniff_delimiter(bytes_: bytes) -> str:
+    sample = bytes_[:1 << 16].decode("utf-8", errors="ignore")
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+def iter_csv_frames(bytes_: bytes, rows_per_frame: int = TABLE_ROWS_PER_FRAME) -> Iterator[Frame]:
+    """CSV em blocos de `rows_per_frame` linhas (pd.read_csv com chunksize); separador detectado."""
+    reader = pd.read_csv(
+        io.BytesIO(bytes_), sep=_sniff_delimiter(bytes_), dtype=str, keep_default_na=False,
+        chunksize=rows_per_frame, encoding="utf-8", encoding_errors="ignore", on_bad_lines="skip",
+    )
+    row = 1
+    with reader:
+        for df in reader:
+            df.index = pd.RangeIndex(row, row + len(df))
+            yield None, df
+            row += len(df)
+
+def _header(values: Tuple[Any, ...]) -> List[str]:
+    names, seen = [], {}
+    for i, v in enumerate(values):
+        name = str(v).strip() if v is not None and str(v).strip() else f"Coluna{i + 1}"
+        if name in seen:  # nomes repetidos: Valor, Valor.1, ... (como o pandas)
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _iter_xlsx_frames(bytes_: bytes, rows_per_frame: int) -> Iterator[Frame]:
+    # openpyxl em modo read_only percorre as linhas sem carregar a aba inteira
+    from openpyxl import load_workbook
+    wb = load_workbook(io.BytesIO(bytes_), read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            raw_header: Optional[Tuple[Any, ...]] = None
+            for values in rows:  # 1ª linha não vazia = cabeçalho
+                if any(v is not None and str(v).strip() for v in values):
+                    raw_header = tuple(values)
+                    break
+            if raw_header is None:
+                continue
+            header = _header(raw_header)
+            block: List[Tuple[Any, ...]] = []
+            nums: List[int] = []
+            # Linha de dados n = n-ésima linha depois do cabeçalho: linhas vazias puladas continuam contando
+            for row, values in enumerate(rows, start=1):
+                if not any(v is not None for v in values):
+                    continue
+                if len(values) > len(header):  # colunas além do cabeçalho: nomes gerados (Coluna7, ...)
+                    header = _header(raw_header + (None,) * (len(values) - len(raw_header)))
+                block.append(values)
+                nums.append(row)
+                if len(block) >= rows_per_frame:
+                    yield ws.title, pd.DataFrame(block, columns=header[:max(map(len, block))], index=nums)
+                    block, nums = [], []
+            if block:
+                yield ws.title, pd.DataFrame(block, columns=header[:max(map(len, block))], index=nums)
+    finally:
+        wb.close()
+
+def iter_excel_frames(bytes_: bytes, ext: str = ".xlsx", rows_per_frame: int = TABLE_ROWS_PER_FRAME) -> Iterator[Frame]:
+    """Todas as abas da planilha, em blocos. .xls/.ods não permitem leitura em fluxo: carregam a aba inteira."""
+    if ext == ".xlsx":
+        yield from _iter_xlsx_frames(bytes_, rows_per_frame)
+        return
+    for sheet, df in pd.read_excel(io.BytesIO(bytes_), sheet_name=None, dtype=str).items():
+        df.index = pd.RangeIndex(1, len(df) + 1)
+        for start in range(0, len(df), rows_per_frame):
+            yield str(sheet), df.iloc[start:start + rows_per_frame]
+
+def _render_rows(df: pd.DataFrame) -> pd.Series:
+    """
+    Uma linha de texto por registro ("v1 | v2 | ..."), montada coluna a coluna (sem loop por linha); mantém o índice (nº da linha).
+    Células não são cortadas: linhas maiores que o chunk são divididas em partes na hora de emitir.
+    """
+    cols = []
+    for c in df.columns:
+        s = df[c].fillna("").astype(str)
+        cols.append(s.str.replace(r"\s+", " ", regex=True).str.strip())
+    if not cols:
+        return pd.Series([], dtype=object, index=df.index)
+    return cols[0].str.cat(cols[1:], sep=" | ") if len(cols) > 1 else cols[0]
+
+def _split_line(line: str, room: int) -> List[str]:
+    """Partes de até `room` caracteres, quebrando no último espaço quando ele não fica cedo demais."""
+    parts = []
+    while len(line) > room:
+        cut = line.rfind(" ", room // 2, room + 1)
+        cut = cut if cut > 0 else room
+        parts.append(line[:cut].rstrip())
+        line = line[cut:].lstrip()
+    if line:
+        parts.append(line)
+    return parts
+
+def _group_bounds(lengths: np.ndarray, budget: int) -> List[Tuple[int, int]]:
+    """Fronteiras [i, j) de grupos consecutivos com soma de comprimentos <= budget (ao menos 1 linha cada)."""
+    cum = np.cumsum(lengths)
+    bounds, i, n = [], 0, len(lengths)
+    while i < n:
+        base = cum[i - 1] if i else 0
+        j = max(int(np.searchsorted(cum, base + budget, side="right")), i + 1)
+        bounds.append((i, j))
+        i = j
+    return bounds
+
+def _label(name: str, sheet: Optional[str]) -> str:
+    return f"{name} — aba {sheet}" if sheet is not None else name
+
+def iter_table_chunks(name: str, bytes_: bytes, size: int) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Chunks de uma planilha/CSV inteira: grupos de linhas com até ~`size` caracteres,
+    cada um prefixado com arquivo/aba, faixa de linhas e o cabeçalho das colunas.
+    Uma linha que sozinha não cabe vira vários chunks ("linha n, parte k/m"), todos com o cabeçalho.
+    Meta: {"sheet", "row_start", "row_end"} (linhas de dados, a partir de 1).
+    """
+    ext = Path(name).suffix.lower()
+    frames = iter_csv_frames(bytes_) if ext == ".csv" else iter_excel_frames(bytes_, ext)
+
+    def emit(sheet, lines, header_line, keep_tail):
+        label = _label(name, sheet)
+        budget = max(size - len(label) - len(header_line) - 32, 1)  # 32: "[..., linhas a–b]\n"
+        bounds = _group_bounds(lines.str.len().to_numpy() + 1, budget)
+        tail = bounds.pop() if keep_tail and bounds else None
+        arr = lines.to_numpy(dtype=object)  # join sobre ndarray: evita iterar a Series elemento a elemento
+        nums = lines.index.to_numpy()
+        chunks = []
+        for i, j in bounds:
+            a, b = int(nums[i]), int(nums[j - 1])
+            if j == i + 1 and len(arr[i]) > budget:
+                chunks.extend(split_row(label, sheet, a, arr[i], header_line))
+                continue
+            text = f"[{label}, linhas {a}–{b}]\n{header_line}\n" + "\n".join(arr[i:j])
+            chunks.append((text, {"sheet": sheet, "row_start": a, "row_end": b}))
+        # O último grupo de um bloco pode estar incompleto: segue junto com o próximo bloco
+        rest = lines.iloc[tail[0]:] if tail else lines.iloc[:0]
+        return chunks, rest
+
+    def split_row(label, sheet, row, line, header_line):
+        # Prefixo medido com o maior nº de partes possível: nenhuma parte passa de `size`
+        widest = f"[{label}, linha {row}, parte {len(line)}/{len(line)}]\n{header_line}\n"
+        parts = _split_line(line, max(size - len(widest), 1))
+        return [
+            (f"[{label}, linha {row}, parte {k}/{len(parts)}]\n{header_line}\n{part}", {"sheet": sheet, "row_start": row, "row_end": row})
+            for k, part in enumerate(parts, 1)
+        ]
+
+    carry = pd.Series([], dtype=object)
+    carry_sheet: Optional[str] = None
+    header_line = ""
+    for sheet, df in frames:
+        if len(carry) and sheet != carry_sheet:
+            chunks, carry = emit(carry_sheet, carry, header_line, keep_tail=False)
+            yield from chunks
+        header_line = " | ".join(map(str, df.columns))[: size // 2]
+        lines = _render_rows(df)
+        if len(carry):
+            lines = pd.concat([carry, lines])
+        chunks, carry = emit(sheet, lines, header_line, keep_tail=True)
+        carry_sheet = sheet
+        yield from chunks
+    if len(carry):
+        chunks, _ = emit(carry_sheet, carry, header_line, keep_tail=False)
+        yield from chunks
+
+def read_table_text(name: str, bytes_: bytes, size: int = 3000) -> str:
+    return "\n\n".join(text for text, _ in iter_table_chunks(name, bytes_, size))
@@ -0,0 +1,81 @@
+# src/utils/tokens.py
+from __future__ import annotations
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, Protocol
+
+TOKEN_CACHE_SIZE = 8192  # textos (mensagens, trechos da KB, chunks do histórico) com contagem em cache
+
+class Tokenizer(Protocol):
+    name: str
+
+    def count(self, text: str) -> int: ...
+
+class HeuristicTokenizer:
+    """
+    Aproximação offline de um BPE moderno (o200k, usado pelo gpt-oss), sem dependências:
+    - palavras ASCII: ~1 token a cada 4 letras; com acento (PT-BR): ~1 a cada 3
+    - números: 1 token a cada 3 dígitos
+    - pontuação/símbolos (código!): 1 token cada
+    - espaço simples antes de palavra vai junto com ela; quebras/indentação: 1 por sequência
+    Bem mais próxima do real do que contar palavras separadas por espaço.
+    """
+    name = "heuristic"
+    _RE = re.compile(r"[^\W\d_]+|\d+|[^\S\n]+|\n+|[^\w\s]|_")
+
+    def count(self, text: str) -> int:
+        n = 0
+        for m in self._RE.finditer(text):
+            tok = m.group()
+            c = tok[0]
+            if c.isalpha():
+                n += -(-len(tok) // (4 if tok.isascii() else 3))
+            elif c.isdigit():
+                n += -(-len(tok) // 3)
+            elif c == " " and len(tok) == 1:
+                continue
+            else:
+                n += 1
+        return n
+
+class TiktokenTokenizer:
+    """Contagem exata com tiktoken (opcional; a codificação precisa estar no cache local)."""
+    def __init__(self, encoding: str = "o200k_base"):
+        import tiktoken  # dependência opcional
+        self._enc = tiktoken.get_encoding(encoding)
+        self.name = f"tiktoken:{encoding}"
+
+    def count(self, text: str) -> int:
+        return len(self._enc.encode(text, disallowed_special=()))
+
+_tokenizer: Tokenizer = HeuristicTokenizer()
+_cache: "OrderedDict[tuple, int]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def set_tokenizer(tokenizer: Tokenizer) -> None:
+    """Troca o tokenizador do processo (ex.: TiktokenTokenizer()) e zera o cache de contagens."""
+    global _tokenizer
+    with _cache_lock:
+        _tokenizer = tokenizer
+        _cache.clear()
+
+def get_tokenizer() -> Tokenizer:
+    return _tokenizer
+
+def count_tokens(text: Optional[str]) -> int:
+    """Conta tokens com cache LRU: mensagens e trechos repetidos entre turnos não são recontados."""
+    if not text:
+        return 0
+    key = (_tokenizer.name, text)
+    with _cache_lock:
+        n = _cache.get(key)
+        if n is not None:
+            _cache.move_to_end(key)
+            return n
+    n = _tokenizer.count(text)
+    with _cache_lock:
+        _cache[key] = n
+        if len(_cache) > TOKEN_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return n
@@ -0,0 +1,129 @@
+# src/utils/tracing.py
+from __future__ import annotations
+import json
+import time
+import uuid
+import contextvars
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+MAX_SPANS_PER_TRACE = 256   # proteção contra laços instrumentados por engano
+
+@dataclass
+class Span:
+    name: str
+    start_ms: float                 # desde o início do trace
+    dur_ms: float = 0.0
+    depth: int = 0                  # 0 = etapa de topo; >0 = dentro de outra etapa
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+@dataclass
+class Trace:
+    """Etapas (spans) de um pedido: da pergunta até o último token."""
+    name: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    started: float = field(default_factory=time.time)   # epoch, para o JSONL
+    total_ms: float = 0.0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    spans: List[Span] = field(default_factory=list)
+    _t0: float = field(default_factory=time.perf_counter, repr=False)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000
+
+    def add(self, span: Span) -> None:
+        if len(self.spans) < MAX_SPANS_PER_TRACE:
+            self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d.pop("_t0", None)
+        return d
+
+    def summary(self) -> Dict[str, float]:
+        """Tempo (ms) por etapa de topo, somando repetições."""
+        out: Dict[str, float] = {}
+        for s in self.spans:
+            if s.depth == 0:
+                out[s.name] = out.get(s.name, 0.0) + s.dur_ms
+        return out
+
+class _NoSpan:
+    """Fora de um trace: etapas não custam nada além de uma leitura de contextvar."""
+    def set(self, **attrs: Any) -> None:
+        pass
+
+_NO_SPAN = _NoSpan()
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_depth: contextvars.ContextVar[int] = contextvars.ContextVar("trace_depth", default=0)
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+@contextmanager
+def start_trace(name: str, **attrs: Any) -> Iterator[Trace]:
+    """Abre um trace para o pedido atual; spans criados dentro (mesma thread/contexto) entram nele."""
+    trace = Trace(name=name, attrs=dict(attrs))
+    token = _trace.set(trace)
+    depth_token = _depth.set(0)
+    try:
+        yield trace
+    finally:
+        trace.total_ms = round(trace.elapsed_ms(), 3)
+        _depth.reset(depth_token)
+        _trace.reset(token)
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    """Mede uma etapa. Sem trace ativo, vira no-op (o objeto devolvido aceita .set() e ignora)."""
+    trace = _trace.get()
+    if trace is None:
+        yield _NO_SPAN
+        return
+    depth = _depth.get()
+    s = Span(name=name, start_ms=round(trace.elapsed_ms(), 3), depth=depth, attrs=dict(attrs))
+    token = _depth.set(depth + 1)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        s.dur_ms = round((time.perf_counter() - t0) * 1000, 3)
+        _depth.reset(token)
+        trace.add(s)
+
+def record_span(name: str, start: float, end: float, **attrs: Any) -> None:
+    """
+    Registra uma etapa já medida (perf_counter de início/fim). Para geradores e
+    esperas em que um `with span(...)` atravessaria yields do chamador.
+    """
+    trace = _trace.get()
+    if trace is None:
+        return
+    start_ms = (start - trace._t0) * 1000
+    trace.add(Span(name=name, start_ms=round(start_ms, 3), dur_ms=round((end - start) * 1000, 3), depth=_depth.get(), attrs=attrs))
+
+def generation_attrs(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Estatísticas do Ollama (done=true) em unidades legíveis: contagens, ms e tokens/s."""
+    out: Dict[str, Any] = {}
+    for k in ("prompt_eval_count", "eval_count"):
+        if k in stats:
+            out[k] = stats[k]
+    for k in ("load_duration", "prompt_eval_duration", "eval_duration"):
+        if k in stats:
+            out[k.replace("duration", "ms")] = round(stats[k] / 1e6, 3)  # ns -> ms
+    if "ttft_s" in stats:
+        out["ttft_ms"] = round(stats["ttft_s"] * 1000, 3)
+    if stats.get("eval_count") and stats.get("eval_duration"):
+        out["tokens_per_s"] = round(stats["eval_count"] / (stats["eval_duration"] / 1e9), 2)
+    return out
+
+# ---------- exportação ----------
+def traces_to_jsonl(traces: Iterable[Trace]) -> bytes:
+    return "".join(json.dumps(t.to_dict(), ensure_ascii=False) + "\n" for t in traces).encode("utf-8")
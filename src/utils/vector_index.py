@@ -0,0 +1,260 @@
+# src/utils/vector_index.py
+from __future__ import annotations
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Com mode="auto", IVF a partir deste tamanho (abaixo, a varredura exata já é barata).
+# O padrão é "exact": IVF troca recall por velocidade e só entra quando pedido
+IVF_MIN_ROWS = 20000
+IVF_NPROBE = 8            # listas visitadas por consulta (mais = mais recall, menos QPS)
+IVF_TRAIN_ITERS = 10
+IVF_TRAIN_PER_LIST = 64   # amostra de treino do k-means por lista
+_BLOCK_ROWS = 16384       # linhas por bloco nas multiplicações grandes
+_CODE_BLOCK_ROWS = 256    # linhas convertidas para float32 por vez ao pontuar a forma compacta (cabe no L2)
+
+# Forma compacta usada na varredura; só a shortlist é repontuada em float32
+STORAGES = ("float32", "float16", "int8")
+RESCORE_FACTOR = 8        # shortlist = k * N candidatos...
+RESCORE_MIN = 32          # ...e no mínimo isso
+
+def normalize_rows(v: np.ndarray) -> np.ndarray:
+    v = np.asarray(v, dtype=np.float32)
+    return (v / (np.linalg.norm(v, axis=-1, keepdims=True) + 1e-8)).astype(np.float32, copy=False)
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Índices dos k maiores scores, em ordem decrescente (argpartition + ordena só k)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(len(scores))
+    return part[np.argsort(-scores[part], kind="stable")]
+
+def quantize_rows(v: np.ndarray, storage: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Forma compacta dos vetores: float16 (2 bytes/dim) ou int8 com escala por linha
+    (1 byte/dim; linha ≈ codes * scale, scale = max|x| / 127). Processa em blocos:
+    um memmap float32 não é carregado inteiro na RAM.
+    """
+    n, dim = len(v), (v.shape[1] if v.ndim == 2 else 0)
+    if storage == "float16":
+        codes = np.empty((n, dim), dtype=np.float16)
+        for s in range(0, n, _BLOCK_ROWS):
+            codes[s:s + _BLOCK_ROWS] = np.asarray(v[s:s + _BLOCK_ROWS])
+        return codes, None
+    if storage == "int8":
+        codes = np.empty((n, dim), dtype=np.int8)
+        scales = np.empty(n, dtype=np.float32)
+        for s in range(0, n, _BLOCK_ROWS):
+            block = np.asarray(v[s:s + _BLOCK_ROWS], dtype=np.float32)
+            scale = np.abs(block).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            codes[s:s + _BLOCK_ROWS] = np.rint(block / scale[:, None])
+            scales[s:s + _BLOCK_ROWS] = scale
+        return codes, scales
+    raise ValueError(f"Armazenamento compacto desconhecido: {storage}")
+
+def _on_disk(v) -> bool:
+    """Vetores lidos do disco sob demanda (memmap, ou só fatias de memmap)?"""
+    if isinstance(v, StackedRows):
+        return bool(v.parts) and all(isinstance(p, np.memmap) for p in v.parts)
+    return isinstance(v, np.memmap)
+
+class StackedRows:
+    """
+    Linhas de vários arrays 2D (ex.: as fatias do memmap de cada arquivo) vistas como
+    uma matriz só, sem concatenar: leituras por fatia ou por lista de linhas copiam só
+    as linhas pedidas. Cobre o que o VectorIndex e o MMR usam (len, shape, [], @).
+    """
+    def __init__(self, parts: Sequence[np.ndarray]):
+        self.parts: List[np.ndarray] = [p for p in parts if len(p)]
+        self.offsets = np.concatenate([[0], np.cumsum([len(p) for p in self.parts])]).astype(np.int64)
+        dim = self.parts[0].shape[1] if self.parts else 0
+        self.shape = (int(self.offsets[-1]), dim)
+        self.ndim = 2
+        self.dtype = np.dtype(np.float32)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    @property
+    def ram_bytes(self) -> int:
+        """Bytes das partes que estão na RAM (as que são memmap não contam)."""
+        return sum(int(p.nbytes) for p in self.parts if not isinstance(p, np.memmap))
+
+    def _rows(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        out = np.empty((len(rows), self.shape[1]), dtype=np.float32)
+        part_of = np.searchsorted(self.offsets, rows, side="right") - 1
+        for p in np.unique(part_of):
+            mask = part_of == p
+            out[mask] = self.parts[p][rows[mask] - self.offsets[p]]
+        return out
+
+    def __getitem__(self, key) -> np.ndarray:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return self._rows(np.arange(start, stop, step))
+            blocks = []
+            for p, part in enumerate(self.parts):
+                a, b = max(start - self.offsets[p], 0), min(stop - self.offsets[p], len(part))
+                if a < b:
+                    blocks.append(np.asarray(part[a:b], dtype=np.float32))
+            return np.concatenate(blocks) if blocks else np.zeros((0, self.shape[1]), dtype=np.float32)
+        if isinstance(key, (int, np.integer)):
+            return self._rows([key])[0]
+        return self._rows(key)
+
+    def __matmul__(self, q: np.ndarray) -> np.ndarray:
+        return np.concatenate([np.asarray(p, dtype=np.float32) @ q for p in self.parts]) if self.parts else np.zeros(0, dtype=np.float32)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        out = self[:]  # cópia inteira: só para quem insiste em np.asarray(...)
+        return out if dtype is None else out.astype(dtype, copy=False)
+
+class VectorIndex:
+    """
+    Busca por similaridade de cosseno sobre vetores pré-normalizados.
+    - exact: um produto matriz-vetor + argpartition (top-k exato, sem argsort completo)
+    - ivf:   k-means esférico em NumPy; cada consulta só varre as `nprobe`
+             listas cujos centróides são mais próximos (recall ajustável)
+    - auto:  ivf a partir de IVF_MIN_ROWS linhas, exact abaixo disso
+    O padrão é exact; ivf/auto só quando pedidos explicitamente.
+    Os vetores podem ser um memmap já normalizado (normalized=True), ou um StackedRows
+    com as fatias de vários memmaps: nada é copiado.
+    Com storage="int8"/"float16" a varredura usa a forma compacta (em RAM, 4x/2x menor)
+    e só a shortlist (k * RESCORE_FACTOR) é repontuada em float32, lendo poucas linhas
+    de `vectors` (num memmap, só essas páginas vão para a memória). int8 pontua quase
+    tão rápido quanto float32; float16 economiza menos e é bem mais lento (o NumPy
+    converte float16 sem SIMD), fica como opção só de memória.
+    """
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        normalized: bool = False,
+        mode: str = "exact",
+        n_lists: Optional[int] = None,
+        nprobe: int = IVF_NPROBE,
+        seed: int = 0,
+        storage: str = "float32",
+        rescore_factor: int = RESCORE_FACTOR,
+    ):
+        self.vectors = vectors if normalized else normalize_rows(vectors)
+        n = len(self.vectors)
+        if mode == "auto":
+            mode = "ivf" if n >= IVF_MIN_ROWS else "exact"
+        if mode not in {"exact", "ivf"}:
+            raise ValueError(f"Modo de índice desconhecido: {mode}")
+        if storage not in STORAGES:
+            raise ValueError(f"Armazenamento desconhecido: {storage}")
+        self.mode = mode
+        self.nprobe = nprobe
+        self.storage = storage
+        self.rescore_factor = rescore_factor
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        if storage != "float32" and not _on_disk(self.vectors):
+            self.storage = storage = "float32"
+        if storage != "float32" and n:
+            self.codes, self.scales = quantize_rows(self.vectors, storage)
+        self.centroids: Optional[np.ndarray] = None
+        self._list_rows: Optional[np.ndarray] = None   # linhas ordenadas por lista
+        self._list_offsets: Optional[np.ndarray] = None
+        if mode == "ivf" and n:
+            self._train(n_lists or max(1, int(np.sqrt(n))), seed)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def nbytes(self) -> int:
+        """RAM ocupada pelo índice: forma compacta + vetores float32 que não estejam num memmap."""
+        if isinstance(self.vectors, StackedRows):
+            total = self.vectors.ram_bytes
+        else:
+            total = 0 if isinstance(self.vectors, np.memmap) else int(np.asarray(self.vectors).nbytes)
+        for arr in (self.codes, self.scales, self.centroids, self._list_rows, self._list_offsets):
+            if arr is not None:
+                total += arr.nbytes
+        return total
+
+    def _assign(self, centroids: np.ndarray) -> np.ndarray:
+        out = np.empty(len(self.vectors), dtype=np.int32)
+        for s in range(0, len(self.vectors), _BLOCK_ROWS):
+            out[s:s + _BLOCK_ROWS] = np.argmax(np.asarray(self.vectors[s:s + _BLOCK_ROWS]) @ centroids.T, axis=1)
+        return out
+
+    def _train(self, n_lists: int, seed: int) -> None:
+        n = len(self.vectors)
+        n_lists = min(n_lists, n)
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(n, size=min(n, n_lists * IVF_TRAIN_PER_LIST), replace=False))
+        sample = np.asarray(self.vectors[sample_rows])
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(IVF_TRAIN_ITERS):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=n_lists) == 0
+            sums[empty] = centroids[empty]  # lista vazia mantém o centróide anterior
+            centroids = normalize_rows(sums)
+        self.centroids = centroids
+
+        assign = self._assign(centroids)
+        self._list_rows = np.argsort(assign, kind="stable")
+        self._list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+
+    def _approx_scores(self, q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Similaridades na forma compacta (todas as linhas ou só `rows`)."""
+        codes = self.codes if rows is None else self.codes[rows]
+        n = len(codes)
+        out = np.empty(n, dtype=np.float32)
+        buf = np.empty((min(n, _CODE_BLOCK_ROWS), codes.shape[1]), dtype=np.float32)
+        for s in range(0, n, _CODE_BLOCK_ROWS):
+            m = min(_CODE_BLOCK_ROWS, n - s)
+            np.copyto(buf[:m], codes[s:s + m], casting="unsafe")
+            np.dot(buf[:m], q, out=out[s:s + m])
+        if self.scales is not None:
+            out *= self.scales if rows is None else self.scales[rows]
+        return out
+
+    def _rescore(self, q: np.ndarray, rows: np.ndarray, approx: np.ndarray, k: int, factor: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Shortlist pelos scores aproximados; top-k final com os vetores float32."""
+        if factor <= 0:  # sem repontuação (só para medir a perda de recall)
+            best = top_k_indices(approx, k)
+            return rows[best], approx[best]
+        short = np.sort(rows[top_k_indices(approx, max(k * factor, RESCORE_MIN))])  # ordem crescente: amigável ao memmap
+        exact = np.asarray(self.vectors[short]) @ q
+        best = top_k_indices(exact, k)
+        return short[best], exact[best]
+
+    def search(
+        self, query: np.ndarray, k: int, nprobe: Optional[int] = None, rescore_factor: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Devolve (índices, similaridades) dos k vizinhos mais próximos, em ordem decrescente."""
+        q = normalize_rows(query)
+        if not len(self.vectors):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        factor = self.rescore_factor if rescore_factor is None else rescore_factor
+
+        if self.mode == "exact" or self.centroids is None:
+            rows = None
+        else:
+            nprobe = min(nprobe or self.nprobe, len(self.centroids))
+            lists = top_k_indices(self.centroids @ q, nprobe)
+            rows = np.concatenate([self._list_rows[self._list_offsets[l]:self._list_offsets[l + 1]] for l in lists])
+            if len(rows) < k:  # listas pequenas demais: completa com varredura exata
+                rows = None
+            else:
+                rows.sort()  # leitura em ordem crescente (amigável ao memmap)
+
+        if self.codes is None:
+            scores = np.asarray(self.vectors @ q) if rows is None else np.asarray(self.vectors[rows]) @ q
+            best = top_k_indices(scores, k)
+            return (best if rows is None else rows[best]), scores[best]
+        approx = self._approx_scores(q, rows)
+        return self._rescore(q, np.arange(len(self.vectors)) if rows is None else rows, approx, k, factor)
@@ -0,0 +1,48 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.utils.vector_index import VectorIndex, normalize_rows
+
+# KB sintética grande: 100k trechos agrupados em tópicos (como documentos reais)
+N, DIM, N_TOPICS = 100_000, 384, 500
+N_QUERIES, K = 200, 4
+
+rng = np.random.default_rng(42)
+topics = normalize_rows(rng.standard_normal((N_TOPICS, DIM)))
+data = normalize_rows(topics[rng.integers(0, N_TOPICS, N)] + (1.5 / np.sqrt(DIM)) * rng.standard_normal((N, DIM)).astype(np.float32))
+queries = normalize_rows(data[rng.integers(0, N, N_QUERIES)] + (0.8 / np.sqrt(DIM)) * rng.standard_normal((N_QUERIES, DIM)).astype(np.float32))
+
+
+# Comportamento antigo de retrieve(): renormaliza tudo e ordena tudo a cada consulta
+def brute_force(q: np.ndarray) -> np.ndarray:
+    b_norm = data / (np.linalg.norm(data, axis=1, keepdims=True) + 1e-8)
+    sims = b_norm @ (q / (np.linalg.norm(q) + 1e-8))
+    return np.argsort(-sims)[:K]
+
+
+def bench(label: str, fn, truth=None):
+    start = time.time()
+    results = [fn(q) for q in queries]
+    elapsed = time.time() - start
+    recall = 1.0 if truth is None else np.mean([len(set(r) & set(t)) / K for r, t in zip(results, truth)])
+    print(f"{label:<28} recall@{K}: {recall:6.3f} | {N_QUERIES / elapsed:9.1f} consultas/s")
+    return results
+
+
+print(f"\n🔎 Benchmark de busca vetorial ({N} vetores x {DIM} dims, {N_QUERIES} consultas)\n")
+
+truth = bench("Força bruta (antigo)", brute_force)
+
+exact = VectorIndex(data, normalized=True, mode="exact")
+bench("Exato (argpartition)", lambda q: exact.search(q, K)[0], truth)
+
+start = time.time()
+ivf = VectorIndex(data, normalized=True, mode="ivf")
+print(f"\n🏗️  Treino IVF ({len(ivf.centroids)} listas): {time.time() - start:.2f} s\n")
+for nprobe in (1, 4, 8, 16, 32):
+    bench(f"IVF nprobe={nprobe}", lambda q: ivf.search(q, K, nprobe=nprobe)[0], truth)
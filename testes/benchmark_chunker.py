@@ -0,0 +1,118 @@
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.utils.chunker import iter_text_segments, pack_segments
+from src.utils.lexical_index import BM25Index
+
+# Corpus sintético em markdown: seções com parágrafos, blocos de código e tabelas; cada seção tem
+# um fato plantado ("o código de acesso do módulo X é Y") que as consultas procuram
+N_DOCS, SECTIONS_PER_DOC = 40, 12
+SIZE, OLD_OVERLAP, NEW_OVERLAP = 3000, 400, 200   # antes: janelas fixas com 400 de sobreposição
+K = 4
+
+rng = np.random.default_rng(7)
+VOCAB = [f"{a}{b}" for a in ("ba", "ce", "di", "fo", "gu", "la", "me", "ni", "po", "ru", "sa", "te", "vi", "zo") for b in ("ral", "ndo", "tico", "mento", "vel", "ção", "ista", "oso")]
+
+
+def sentence() -> str:
+    words = rng.choice(VOCAB, rng.integers(8, 22))
+    return " ".join(words).capitalize() + "."
+
+
+def paragraph() -> str:
+    return " ".join(sentence() for _ in range(rng.integers(2, 9)))
+
+
+def make_doc(d: int):
+    parts, facts, paras_all = [f"# Manual {d}"], [], []
+    for s in range(SECTIONS_PER_DOC):
+        module = f"mod{d:02d}x{s:02d}"
+        fact = f"O código de acesso do módulo {module} é {rng.integers(10**5, 10**6)}."
+        facts.append((module, fact))
+        parts.append(f"## Seção {s} do manual {d}")
+        paras = [paragraph() for _ in range(rng.integers(2, 7))]
+        paras.insert(int(rng.integers(0, len(paras) + 1)), f"{paragraph()} {fact} {paragraph()}")
+        if rng.random() < 0.3:
+            paras.append("```python\n" + "\n".join(f"x{i} = carregar('{module}', {i})" for i in range(rng.integers(3, 12))) + "\n```")
+        if rng.random() < 0.3:
+            rows = "\n".join(f"| {rng.choice(VOCAB)} | {rng.integers(0, 999)} |" for _ in range(rng.integers(3, 10)))
+            paras.append(f"| campo | valor |\n|---|---|\n{rows}")
+        parts.extend(paras)
+        paras_all.extend(paras)
+    return "\n\n".join(parts), facts, paras_all
+
+
+_WS = re.compile(r"\s+")
+
+
+def fixed_chunks(text: str, size: int, overlap: int):
+    """Chunking anterior: texto com espaços colapsados, fatiado em janelas fixas."""
+    clean = _WS.sub(" ", text).strip()
+    step = size - overlap
+    out = []
+    while len(clean) > size:
+        out.append(clean[:size])
+        clean = clean[step:]
+    if clean:
+        out.append(clean)
+    return out
+
+
+def structured_chunks(text: str, size: int, overlap: int):
+    return [t for t, _ in pack_segments(iter_text_segments([text]), size, overlap)]
+
+
+def norm(text: str) -> str:
+    return _WS.sub(" ", text)
+
+
+docs = [make_doc(d) for d in range(N_DOCS)]
+source_chars = sum(len(norm(t).strip()) for t, *_ in docs)
+n_facts = sum(len(f) for _, f, _ in docs)
+n_paras = sum(len(p) for *_, p in docs)
+
+print(f"\n✂️  Chunking: janelas fixas x estrutural ({N_DOCS} documentos, {source_chars / 1e6:.2f} M caracteres, {n_facts} fatos, size={SIZE})\n")
+print(f"{'chunker':<28} {'chunks':>7} {'média':>7} {'maior':>7} {'embedados':>10} {'repetido':>9} {'parágr. partidos':>17} {'início no meio':>15} {'acerto@' + str(K):>9} {'c/ seção':>9} {'tempo':>9}")
+
+for label, fn, overlap in (
+    (f"janelas fixas (overlap {OLD_OVERLAP})", fixed_chunks, OLD_OVERLAP),
+    (f"estrutural (overlap ≤ {NEW_OVERLAP})", structured_chunks, NEW_OVERLAP),
+):
+    start = time.perf_counter()
+    per_doc = [fn(text, SIZE, overlap) for text, *_ in docs]
+    elapsed = time.perf_counter() - start
+    chunks = [norm(c) for cs in per_doc for c in cs]
+    embedded = sum(len(c) for c in chunks)
+    split = sum(not any(norm(p) in c for c in map(norm, cs)) for cs, (*_, paras) in zip(per_doc, docs) for p in paras)
+    mid = sum(c[:1].islower() for c in chunks)  # frases do corpus começam com maiúscula
+    index = BM25Index(chunks)
+    hits = with_section = 0
+    for d, (_, facts, _) in enumerate(docs):
+        for s, (module, fact) in enumerate(facts):
+            idx, _ = index.search(f"qual é o código de acesso do módulo {module}?", K)
+            found = [chunks[i] for i in idx if fact in chunks[i]]
+            hits += bool(found)
+            with_section += any(f"Seção {s} do manual {d}" in c for c in found)
+    print(f"{label:<28} {len(chunks):>7} {embedded / len(chunks):>7.0f} {max(map(len, chunks)):>7} {embedded / 1e6:>8.2f} M {(embedded - source_chars) / source_chars:>9.1%} "
+          f"{split / n_paras:>17.1%} {mid / len(chunks):>15.1%} {hits / n_facts:>9.1%} {with_section / n_facts:>9.1%} {elapsed * 1000:>7.0f} ms")
+
+# Tempo linear no tamanho da entrada: o documento cresce, o custo por MB não
+print("\n⏱️  Escala (um único documento, em blocos de 64 KB como o leitor de .txt entrega)\n")
+big = "\n\n".join(t for t, *_ in docs)
+for mult in (1, 4, 16):
+    text = big * mult
+    blocks = [text[i:i + 65536] for i in range(0, len(text), 65536)]
+    start = time.perf_counter()
+    n = sum(1 for _ in pack_segments(iter_text_segments(blocks), SIZE, NEW_OVERLAP))
+    elapsed = time.perf_counter() - start
+    print(f"{len(text) / 1e6:7.1f} M caracteres: {n:>7} chunks em {elapsed:6.2f} s ({len(text) / 1e6 / elapsed:5.1f} M caracteres/s)")
+
+print(f"\nℹ️ 'maior' = chunk mais longo (o estrutural nunca passa de size={SIZE}); 'repetido' = caracteres embedados além do texto original (sobreposição + títulos repetidos);")
+print("   'parágr. partidos' = parágrafos que não aparecem inteiros em nenhum chunk; 'início no meio' = chunks que começam no meio de uma frase;")
+print("   'acerto' = top-k do BM25 com o fato inteiro; 'c/ seção' = e com o título da seção do fato no mesmo chunk.")
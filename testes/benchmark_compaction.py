@@ -0,0 +1,90 @@
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import wait
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.utils.history_compactor import COMPACTOR_SESSION, HistoryCompactor, old_segments
+from src.utils.history_manager import HistoryBuffer
+from src.utils.scheduler import PRIORITY_BACKGROUND, GenerationScheduler
+from src.utils.tokens import count_tokens
+from stub_ollama import StubOllama
+
+# Conversa roteirizada: perguntas curtas, respostas longas (como as do modelo 20B); o stub
+# devolve resumos de SUMMARY_TOKENS tokens
+N_TURNS = 40
+SUMMARY_TOKENS = 90
+MODEL = "gpt-oss:20b"
+REPORT_AT = (5, 10, 20, 30, 40)
+
+rnd = random.Random(5)
+VOCAB = (
+    "contrato prazo entrega fornecedor pagamento multa cláusula rescisão garantia auditoria "
+    "estoque pedido fatura imposto frete servidor latência memória índice consulta relatório"
+).split()
+
+
+def text(n_words: int) -> str:
+    return " ".join(rnd.choice(VOCAB) for _ in range(n_words)) + "."
+
+
+conversation = []
+for _ in range(N_TURNS):
+    conversation.append({"role": "user", "content": text(rnd.randint(20, 60))})
+    conversation.append({"role": "assistant", "content": text(rnd.randint(150, 400))})
+
+
+def history_tokens(items) -> int:
+    return count_tokens("\n\n".join(items))
+
+
+print(f"\n🗜️  Compactação do histórico ({N_TURNS} turnos, resumos de ~{SUMMARY_TOKENS} tokens pelo stub)\n")
+print(f"{'turno':>6} {'histórico inteiro':>18} {'compactado':>11} {'segmentos resumidos':>20} {'compact() ms':>13}")
+
+root = tempfile.TemporaryDirectory()
+with StubOllama(ttft_s=0.01, tokens_per_s=5000, reply_tokens=SUMMARY_TOKENS) as stub:
+    compactor = HistoryCompactor(host=stub.url, root=Path(root.name))
+    buf = HistoryBuffer(max_chars_per_chunk=8000, overlap=800)
+    history, sizes = [], []
+    for turn in range(1, N_TURNS + 1):
+        history.extend(conversation[2 * turn - 2:2 * turn])
+        full = history_tokens(buf.sync(history).chunks())
+        start = time.perf_counter()
+        compacted = compactor.compact(history)
+        elapsed = time.perf_counter() - start
+        compact_tokens = history_tokens(compacted.items)
+        sizes.append(compact_tokens)
+        if turn in REPORT_AT:
+            print(f"{turn:>6} {full:>18} {compact_tokens:>11} {compacted.summarized:>20} {elapsed * 1000:>13.2f}")
+        # depois da resposta: resumos em segundo plano (aqui esperados, como o tempo de leitura do usuário)
+        wait(compactor.schedule(history, MODEL, num_ctx=8192))
+
+    segments = len(old_segments(len(history)))
+    print(f"\nSegmentos resumíveis: {segments} | resumos gerados: {compactor.stats()['gerados']} | chamadas ao modelo: {stub.generations}")
+    late = sizes[N_TURNS // 4:]
+    print(f"Histórico compactado a partir do turno {N_TURNS // 4}: {min(late)}–{max(late)} tokens, "
+          f"contra {history_tokens(buf.chunks())} tokens do histórico inteiro no último turno")
+
+    # Mesma conversa reaberta (outra sessão/processo): tudo vem do SQLite, nada é resumido de novo
+    before = stub.generations
+    again = HistoryCompactor(host=stub.url, root=Path(root.name))
+    wait(again.schedule(history, MODEL, num_ctx=8192))
+    print(f"Conversa reaberta: {again.compact(history).summarized} segmentos cobertos pelo resumo salvo, {stub.generations - before} resumos gerados de novo")
+
+# Prioridade: resumo esperando vaga não passa na frente de uma pergunta que chega depois
+sched = GenerationScheduler()
+busy = sched.submit("usuario-a", MODEL)
+background = sched.submit(COMPACTOR_SESSION, MODEL, PRIORITY_BACKGROUND)
+user = sched.submit("usuario-b", MODEL)
+ahead = sched.position(background)
+sched.release(busy)
+print(f"Fila com um resumo à espera: a pergunta seguinte é atendida {'antes' if user.granted.is_set() and not background.granted.is_set() else 'depois'} "
+      f"do resumo ({ahead} pedido(s) de usuário na frente dele)")
+for t in (user, background):
+    sched.release(t)
+
+print("\nℹ️ O prompt leva só o resumo acumulado mais recente (tamanho fixo) + o que veio depois dele, literal.")
+print("ℹ️ Sem resumos os segmentos entram literais; o prompt final ainda passa pelo orçamento de tokens (prompt_budget).")
@@ -0,0 +1,117 @@
+import random
+import re
+import sys
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import src.utils.knowledge_base as kb_mod
+from src.utils.dedup import canonical_rows, signature
+from src.utils.knowledge_base import HYBRID_CANDIDATES, KBCache, build_kb_from_uploads, embed_query, retrieve
+from src.utils.lexical_index import reciprocal_rank_fusion
+
+# Anexos típicos: cada especificação em 3 versões (v2 com ~2% de palavras trocadas, v3 com uma
+# seção nova no meio) e também exportada de novo (mesmo texto, caixa/espaços diferentes)
+N_SPECS, PARAGRAPHS, N_QUERIES = 6, 120, 200
+DIM = 768
+K = 4
+
+rnd = random.Random(11)
+VOCAB = [f"{a}{b}" for a in ("con", "pra", "for", "pag", "mul", "cla", "res", "gar", "aud", "est") for b in ("trato", "zo", "necedor", "amento", "ta", "usula", "cisao", "antia", "itoria", "oque")]
+
+
+def paragraph() -> str:
+    return " ".join(rnd.choice(VOCAB) + str(rnd.randint(0, 300)) for _ in range(rnd.randint(40, 90))) + "."
+
+
+def edit(p: str, rate: float) -> str:
+    return " ".join("alterado" if rnd.random() < rate else w for w in p.split())
+
+
+class FakeUpload:
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self._data = data
+
+    def getvalue(self) -> bytes:
+        return self._data
+
+
+uploads, sources = [], []
+for s in range(N_SPECS):
+    paras = [paragraph() for _ in range(PARAGRAPHS)]
+    sources.extend(paras)
+    versions = {
+        "v1": paras,
+        "v2": [edit(p, 0.02) for p in paras],
+        "v3": paras[:PARAGRAPHS // 2] + [paragraph() for _ in range(5)] + paras[PARAGRAPHS // 2:],
+        "export": [p.upper() for p in paras],
+    }
+    for tag, ps in versions.items():
+        uploads.append(FakeUpload(f"spec{s}_{tag}.txt", "\n\n".join(ps).encode("utf-8")))
+
+# Embedder falso: bag-of-words com hashing (textos parecidos -> vetores parecidos), contando o que chega
+embedded = []
+_WORD = re.compile(r"\w+")
+
+
+def fake_embed(texts, **_):
+    embedded.append(len(texts))
+    out = np.zeros((len(texts), DIM), dtype=np.float32)
+    for i, t in enumerate(texts):
+        for w in _WORD.findall(t.casefold()):
+            out[i, zlib.crc32(w.encode()) % DIM] += 1.0
+    return out
+
+
+kb_mod._embed_ollama = fake_embed
+
+print(f"\n🧬 Deduplicação de trechos ({N_SPECS} especificações x 4 cópias = {len(uploads)} anexos, {N_QUERIES} consultas, top-{K})\n")
+
+start = time.perf_counter()
+kb = build_kb_from_uploads(uploads, cache=KBCache())
+build_s = time.perf_counter() - start
+n = len(kb.chunks)
+start = time.perf_counter()
+canonical_rows([signature(c.text) for c in kb.chunks])
+dedup_s = time.perf_counter() - start
+print(f"Trechos na KB:          {n}")
+print(f"Embutidos:              {sum(embedded)} (antes: {n}; {1 - sum(embedded) / n:.1%} a menos)")
+print(f"Cópias detectadas:      {kb.meta['duplicates']}")
+print(f"Custo da deduplicação:  {dedup_s * 1000:.0f} ms ({dedup_s / n * 1000:.2f} ms/trecho; montagem inteira {build_s * 1000:.0f} ms)")
+
+
+def old_top_k(query: str):
+    """Recuperação anterior: top-k da fusão, sem colapsar cópias nem diversificar."""
+    n_cand = K * HYBRID_CANDIDATES
+    vec_idx, _ = kb.index.search(embed_query(query), n_cand)
+    lex_idx, _ = kb.lexical.search(query, n_cand)
+    return reciprocal_rank_fusion([vec_idx, lex_idx])[:K]
+
+
+def new_top_k(query: str):
+    metas = retrieve(query, kb, top_k=K, max_chars=10**9)[1]
+    row = {(c.meta["file"], c.meta["chunk_id"]): i for i, c in enumerate(kb.chunks)}
+    return [row[(m["file"], m["chunk_id"])] for m in metas]
+
+
+canon = canonical_rows([signature(c.text) for c in kb.chunks])
+queries = [" ".join(p.split()[5:25]) for p in rnd.sample(sources, N_QUERIES)]
+print(f"\n{'recuperação':<34} {'trechos distintos':>18} {'contém a resposta':>18} {'ms/consulta':>12}")
+for label, fn in (("fusão top-k (antes)", old_top_k), ("sem cópias + MMR", new_top_k)):
+    kb_mod._retrievals.clear()
+    distinct = found = 0
+    start = time.perf_counter()
+    for q in queries:
+        rows = fn(q)
+        distinct += len({int(canon[r]) for r in rows})
+        found += any(q.casefold() in " ".join(kb.chunks[r].text.split()).casefold() for r in rows)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {distinct / len(queries):>15.2f}/{K} {found / len(queries):>18.1%} {elapsed / len(queries) * 1000:>12.2f}")
+
+print("\nℹ️ 'trechos distintos' conta grupos de cópias no top-k: com 4 versões do mesmo texto, o ranking antigo")
+print("   gasta as vagas (e o orçamento de caracteres do prompt) com o mesmo trecho repetido.")
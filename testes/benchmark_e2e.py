@@ -0,0 +1,317 @@
+"""
+Benchmark ponta a ponta do caminho do chat, offline (stub_ollama.py no lugar do Ollama):
+ingestão dos anexos, recuperação, montagem do prompt e geração (direta e pela fila),
+com conversas roteirizadas e corpora sintéticos. Reporta p50/p95, vazão e pico de
+memória (tracemalloc, numa execução separada para não distorcer os tempos).
+
+    python benchmark_e2e.py                  # roda e compara com a baseline salva
+    python benchmark_e2e.py --save-baseline  # grava os resultados como nova baseline
+    python benchmark_e2e.py --quick          # menos repetições (checagem rápida)
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import streamlit as st
+from streamlit.logger import set_log_level
+
+set_log_level("error")  # session_state fora do `streamlit run` avisa a cada acesso
+
+import src.utils.knowledge_base as kb_mod
+from src.components.chat_window import _build_prompt
+from src.utils.async_ollama import AsyncOllamaClient, BridgedOllamaClient, get_bridged_client
+from src.utils.knowledge_base import KBCache, build_kb_from_uploads, retrieve
+from src.utils.scheduler import GenerationScheduler
+from stub_ollama import StubOllama
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline_e2e.json"
+REGRESSION_TOLERANCE = 0.20   # p50/p95 mais de 20% acima da baseline = regressão...
+REGRESSION_MIN_MS = 2.0       # ...e pelo menos 2 ms (ruído de cenários de poucos ms)
+CONTEXT_SIZE = 8192
+MODEL = "gpt-oss:20b"
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--save-baseline", action="store_true", help=f"grava os resultados em {BASELINE_PATH.name}")
+parser.add_argument("--quick", action="store_true", help="menos repetições e arquivos menores")
+parser.add_argument("--fail-on-regression", action="store_true", help="sai com código 1 se houver regressão")
+args = parser.parse_args()
+
+REPEATS = 2 if args.quick else 5
+N_DOCS = 4 if args.quick else 12
+N_TURNS = 6 if args.quick else 16
+N_SESSIONS = 4
+
+# ---------- corpus e conversa sintéticos (determinísticos) ----------
+VOCAB = (
+    "contrato prazo entrega fornecedor pagamento multa cláusula rescisão garantia auditoria "
+    "estoque pedido fatura imposto frete servidor latência memória índice consulta relatório "
+    "orçamento projeto equipe reunião cronograma risco métrica cliente suporte versão"
+).split()
+
+
+class FakeUpload:
+    """Mesma interface usada do UploadedFile do Streamlit (name + getvalue)."""
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self._data = data
+
+    def getvalue(self) -> bytes:
+        return self._data
+
+
+def make_corpus(seed: int = 7) -> list:
+    rnd = random.Random(seed)
+    files = []
+    for d in range(N_DOCS):
+        paragraphs = []
+        for p in range(60):
+            words = rnd.choices(VOCAB, k=rnd.randint(40, 120))
+            paragraphs.append(f"Seção {d}.{p}. " + " ".join(words).capitalize() + ".")
+        files.append(FakeUpload(f"documento_{d:02d}.txt", "\n\n".join(paragraphs).encode("utf-8")))
+    rows = ["id;cliente;valor;status"] + [
+        f"{i};{rnd.choice(VOCAB)}_{i % 97};{rnd.randint(10, 99999)};{rnd.choice(['pago', 'aberto', 'atrasado'])}"
+        for i in range(20000)
+    ]
+    files.append(FakeUpload("faturas.csv", "\n".join(rows).encode("utf-8")))
+    return files
+
+
+def make_queries(n: int, seed: int = 11) -> list:
+    rnd = random.Random(seed)
+    return [f"O que diz o documento sobre {' e '.join(rnd.sample(VOCAB, 3))}?" for _ in range(n)]
+
+
+# ---------- medição ----------
+def summarize(samples_s: list, work: float, unit: str) -> dict:
+    ms = np.array(samples_s) * 1000
+    total = float(np.sum(samples_s))
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "throughput": round(work / total, 2) if total else 0.0,
+        "unit": unit,
+        "n": len(samples_s),
+    }
+
+
+def peak_mb(fn) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def clear_query_caches() -> None:
+    kb_mod._query_vectors.clear()
+    kb_mod._retrievals.clear()
+
+
+# ---------- cenários ----------
+def bench_ingest(files) -> dict:
+    mb = sum(len(f.getvalue()) for f in files) / 2**20
+    build_kb_from_uploads(files, cache=KBCache(), store=None)  # aquece o pool de processos e o embedder
+    samples = []
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        build_kb_from_uploads(files, cache=KBCache(), store=None)
+        samples.append(time.perf_counter() - t0)
+    out = summarize(samples, mb * REPEATS, "MB/s")
+    out["peak_mb"] = peak_mb(lambda: build_kb_from_uploads(files, cache=KBCache(), store=None))
+    return out
+
+
+def bench_retrieve(kb, queries, cold: bool) -> dict:
+    samples = []
+    if not cold:
+        for q in queries:
+            retrieve(q, kb)
+    for q in queries:
+        if cold:
+            clear_query_caches()
+        t0 = time.perf_counter()
+        retrieve(q, kb)
+        samples.append(time.perf_counter() - t0)
+    out = summarize(samples, len(queries), "consultas/s")
+    if cold:
+        clear_query_caches()
+    out["peak_mb"] = peak_mb(lambda: [retrieve(q, kb) for q in queries[:10]])
+    return out
+
+
+def scripted_turns(kb, queries, reply: str, per_turn) -> list:
+    """Conversa roteirizada: pergunta -> prompt (histórico crescente) -> per_turn(prompt) -> resposta."""
+    st.session_state.clear()
+    st.session_state["kb"] = kb
+    st.session_state["context"] = "Responda como analista financeiro da empresa."
+    history, samples = [], []
+    for q in queries[:N_TURNS]:
+        history.append({"role": "user", "content": q})
+        t0 = time.perf_counter()
+        prompt, exceeded, _ = _build_prompt(history, CONTEXT_SIZE)
+        answer = per_turn(prompt) if per_turn else reply
+        samples.append(time.perf_counter() - t0)
+        assert not exceeded
+        history.append({"role": "assistant", "content": answer})
+    return samples
+
+
+def bench_prompt(kb, queries, reply: str) -> dict:
+    samples = []
+    for _ in range(REPEATS):
+        clear_query_caches()
+        samples += scripted_turns(kb, queries, reply, None)
+    out = summarize(samples, len(samples), "prompts/s")
+    out["peak_mb"] = peak_mb(lambda: scripted_turns(kb, queries, reply, None))
+    return out
+
+
+def stream_once(client, prompt: str) -> tuple:
+    t0, ttft, tokens = time.perf_counter(), None, 0
+    for chunk in client.ask_stream(prompt=prompt, model=MODEL, num_ctx=CONTEXT_SIZE):
+        if chunk.text:
+            tokens += 1
+            if ttft is None:
+                ttft = time.perf_counter() - t0
+    return time.perf_counter() - t0, ttft or 0.0, tokens
+
+
+def bench_generate(url: str, prompt: str) -> tuple:
+    client = BridgedOllamaClient(AsyncOllamaClient(host=url))  # sem fila: só o cliente
+    stream_once(client, prompt)  # sonda as rotas e abre a conexão keep-alive
+    totals, ttfts, tokens = [], [], 0
+    for _ in range(REPEATS * 4):
+        total, ttft, n = stream_once(client, prompt)
+        totals.append(total)
+        ttfts.append(ttft)
+        tokens += n
+    out = summarize(totals, tokens, "tokens/s")
+    out["peak_mb"] = peak_mb(lambda: stream_once(client, prompt))
+    ttft = summarize(ttfts, len(ttfts), "pedidos/s")
+    ttft["throughput"] = out["throughput"]  # TTFT não tem vazão própria
+    ttft["unit"] = "tokens/s"
+    ttft["peak_mb"] = out["peak_mb"]
+    return out, ttft
+
+
+def bench_queue(url: str, prompt: str) -> dict:
+    """N_SESSIONS sessões pedindo ao mesmo tempo pela fila do processo (cliente assíncrono)."""
+    scheduler, client = GenerationScheduler(), get_bridged_client(url)
+    samples, lock = [], threading.Lock()
+
+    def session(sid: str) -> None:
+        for _ in range(REPEATS):
+            t0 = time.perf_counter()
+            for _chunk in scheduler.stream(client, sid, prompt=prompt, model=MODEL, num_ctx=CONTEXT_SIZE):
+                pass
+            with lock:
+                samples.append(time.perf_counter() - t0)
+
+    def run_all() -> float:
+        threads = [threading.Thread(target=session, args=(f"s{i}",)) for i in range(N_SESSIONS)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - t0
+
+    wall = run_all()
+    out = summarize(samples, len(samples), "pedidos/s")
+    out["throughput"] = round(len(samples) / wall, 2)  # vazão real: sessões em paralelo
+    samples.clear()
+    out["peak_mb"] = peak_mb(run_all)
+    return out
+
+
+def bench_turn(kb, queries, url: str) -> dict:
+    client = get_bridged_client(url)
+    per_turn = lambda prompt: "".join(c.text for c in client.ask_stream(prompt=prompt, model=MODEL, num_ctx=CONTEXT_SIZE))  # noqa: E731
+    clear_query_caches()
+    samples = scripted_turns(kb, queries, "", per_turn)
+    out = summarize(samples, len(samples), "turnos/s")
+    out["peak_mb"] = peak_mb(lambda: scripted_turns(kb, queries[:4], "", per_turn))
+    return out
+
+
+# ---------- relatório ----------
+def print_results(results: dict, baseline: dict) -> bool:
+    regressed = False
+    print(f"{'Cenário':<44}{'p50 (ms)':>10}{'p95 (ms)':>10}{'vazão':>20}{'pico (MB)':>11}   vs baseline")
+    for name, r in results.items():
+        line = f"{name:<44}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['throughput']:>12.1f} {r['unit']:<7}{r['peak_mb']:>11.1f}"
+        base = baseline.get(name)
+        if base:
+            d50 = r["p50_ms"] / base["p50_ms"] - 1 if base["p50_ms"] else 0.0
+            d95 = r["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+            slower = any(
+                d > REGRESSION_TOLERANCE and r[k] - base[k] >= REGRESSION_MIN_MS
+                for d, k in ((d50, "p50_ms"), (d95, "p95_ms"))
+            )
+            flag = "⚠️ " if slower else "  "
+            regressed |= flag != "  "
+            line += f"   {flag}p50 {d50:+.0%} · p95 {d95:+.0%}"
+        print(line)
+    return regressed
+
+
+print(f"\n🚀 Benchmark ponta a ponta (stub Ollama, {REPEATS} repetições{', modo rápido' if args.quick else ''})\n")
+
+with StubOllama(latency_s=0.005, per_item_s=0.0005, dim=384, ttft_s=0.04, tokens_per_s=400, reply_tokens=48) as stub:
+    # A KB embute por _embed_ollama (host padrão); aqui o destino é o servidor stub
+    kb_mod._embed_ollama = partial(kb_mod._embed_ollama, host=stub.url)
+    files = make_corpus()
+    queries = make_queries(40)
+    reply = " ".join(VOCAB[:48])
+
+    results = {}
+    mb = sum(len(f.getvalue()) for f in files) / 2**20
+    results[f"Ingestão ({len(files)} arquivos, {mb:.1f} MB)"] = bench_ingest(files)
+    kb = build_kb_from_uploads(files, cache=KBCache(), store=None)
+    results[f"Recuperação a frio ({len(kb.chunks)} trechos)"] = bench_retrieve(kb, queries, cold=True)
+    results["Recuperação em cache"] = bench_retrieve(kb, queries, cold=False)
+    results[f"Montagem do prompt ({N_TURNS} turnos)"] = bench_prompt(kb, queries, reply)
+    prompt = _build_prompt([{"role": "user", "content": queries[0]}], CONTEXT_SIZE)[0]
+    results["Geração streaming (total)"], results["Geração streaming (TTFT)"] = bench_generate(stub.url, prompt)
+    results[f"Fila: {N_SESSIONS} sessões simultâneas"] = bench_queue(stub.url, prompt)
+    results[f"Turno completo ({N_TURNS} turnos)"] = bench_turn(kb, queries, stub.url)
+    print(f"Requisições no servidor: {stub.requests} · gerações: {stub.generations}\n")
+
+baseline = {}
+if BASELINE_PATH.exists():
+    saved = json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+    baseline = saved.get("results", {})
+    if saved.get("quick") != args.quick:
+        print(f"ℹ️ Baseline de {saved.get('saved')} gravada {'com' if saved.get('quick') else 'sem'} --quick: compare no mesmo modo.\n")
+regressed = print_results(results, baseline)
+
+if args.save_baseline:
+    BASELINE_PATH.write_text(json.dumps({
+        "saved": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "quick": args.quick,
+        "results": results,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 Baseline salva em {BASELINE_PATH.name}")
+elif not baseline:
+    print("\nℹ️ Sem baseline para comparar: rode com --save-baseline para criar uma.")
+elif regressed:
+    print(f"\n⚠️ Regressão: algum cenário ficou mais de {REGRESSION_TOLERANCE:.0%} mais lento que a baseline.")
+else:
+    print("\n✅ Nenhum cenário mais lento que a baseline além da tolerância.")
+
+if regressed and args.fail_on_regression:
+    sys.exit(1)
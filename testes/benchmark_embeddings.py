@@ -0,0 +1,47 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.utils.embedder import BatchEmbedder
+from stub_ollama import StubOllama
+
+# ~300 páginas de PDF em trechos de 3000 caracteres
+N_CHUNKS = 400
+texts = [f"Trecho {i}: " + ("lorem ipsum dolor sit amet " * 110) for i in range(N_CHUNKS)]
+
+
+# Comportamento antigo: um requests.post por trecho, conexão nova a cada chamada
+def embed_serial(host: str) -> np.ndarray:
+    vectors = []
+    for t in texts:
+        r = requests.post(f"{host}/api/embeddings", json={"model": "nomic-embed-text", "prompt": t}, timeout=60)
+        r.raise_for_status()
+        vectors.append(r.json()["embedding"])
+    return np.array(vectors, dtype=np.float32)
+
+
+def run(label: str, fn) -> np.ndarray:
+    start = time.time()
+    out = fn()
+    elapsed = time.time() - start
+    print(f"{label:<38} {elapsed:7.2f} s | {N_CHUNKS / elapsed:8.1f} trechos/s")
+    return out
+
+
+print(f"\n🚀 Benchmark de embeddings ({N_CHUNKS} trechos, servidor stub local)\n")
+
+with StubOllama(latency_s=0.01, per_item_s=0.002) as stub:
+    ref = run("Serial (/api/embeddings, sem pool)", lambda: embed_serial(stub.url))
+    batched = run("Lote (/api/embed, pool, 4 em voo)", lambda: BatchEmbedder(host=stub.url).embed(texts))
+    print(f"\nRequisições no servidor: {stub.requests}")
+
+with StubOllama(latency_s=0.01, per_item_s=0.002, batch_endpoint=False) as stub:
+    legacy = run("Fallback (/api/embeddings, pool)", lambda: BatchEmbedder(host=stub.url).embed(texts))
+
+assert np.allclose(ref, batched) and np.allclose(ref, legacy), "Ordem/valores dos vetores divergiram"
+print("\n✅ Vetores idênticos e na mesma ordem nos três modos")
@@ -0,0 +1,54 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Cada cenário roda num processo Python novo (import "a frio") e imprime tempo e RSS de pico
+PROBE = r"""
+import sys, time
+t0 = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - t0
+try:
+    import resource
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform != "darwin" else 1024 ** 2)
+except ImportError:  # Windows
+    rss_mb = float("nan")
+print(f"{{elapsed:.3f}} {{rss_mb:.0f}}")
+"""
+
+# Módulos que o caminho do chat importa a cada execução do app.py
+CHAT_IMPORTS = """
+import streamlit
+import src.components.sidebar
+import src.utils.gpu_info
+"""
+
+SCENARIOS = [
+    ("Chat (TensorFlow preguiçoso)", CHAT_IMPORTS),
+    ("Chat + TensorFlow no topo (antigo)", CHAT_IMPORTS + "import tensorflow\nfrom tensorflow.python.client import device_lib\n"),
+    ("Painel GPU aberto (1ª consulta)", CHAT_IMPORTS + "src.utils.gpu_info.probe_devices()\n"),
+    ("Painel GPU aberto (consulta em cache)", CHAT_IMPORTS + "src.utils.gpu_info.probe_devices()\nt0 = time.perf_counter()\nsrc.utils.gpu_info.probe_devices()\n"),
+]
+
+
+def run(code: str, repeats: int = 3):
+    times, rss = [], 0.0
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(code=code)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.split()
+        times.append(float(out[-2]))
+        rss = max(rss, float(out[-1]))
+    return min(times), rss
+
+
+print("\n⏱️  Benchmark de inicialização (processo novo a cada medição, melhor de 3)\n")
+for label, code in SCENARIOS:
+    try:
+        t, rss = run(code)
+        print(f"{label:<40} {t:7.3f} s | RSS pico: {rss:6.0f} MB")
+    except subprocess.CalledProcessError as e:
+        print(f"{label:<40} falhou: {e.stderr.strip().splitlines()[-1] if e.stderr else e}")
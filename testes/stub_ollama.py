@@ -0,0 +1,205 @@
+"""
+Servidor Ollama "de mentira" para benchmarks offline.
+Responde /api/embed (lote) e /api/embeddings (um texto) com vetores determinísticos,
+/api/generate e /api/chat (JSON ou streaming NDJSON, com vazão de tokens configurável)
+e /api/tags, sem precisar de GPU nem do Ollama instalado.
+"""
+import hashlib
+import json
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+STUB_MODELS = [
+    {"name": "gpt-oss:20b", "size": 13_780_000_000, "details": {"family": "gptoss", "parameter_size": "20.9B", "quantization_level": "MXFP4"}},
+    {"name": "nomic-embed-text:latest", "size": 274_000_000, "details": {"family": "nomic-bert", "parameter_size": "137M", "quantization_level": "F16"}},
+]
+
+# Vocabulário das respostas geradas (um "token" = uma palavra com espaço)
+_WORDS = "o modelo responde com texto sintético para medir latência e vazão do chat".split()
+
+
+def fake_vector(text: str, dim: int) -> list:
+    """Vetor determinístico derivado do hash do texto (mesmo texto → mesmo vetor)."""
+    out, counter = [], 0
+    seed = text.encode("utf-8")
+    while len(out) < dim:
+        block = hashlib.sha256(seed + counter.to_bytes(4, "little")).digest()
+        out.extend(v / 2**31 for v in struct.unpack("<8i", block))
+        counter += 1
+    return out[:dim]
+
+
+class StubOllama:
+    """
+    Uso:
+        with StubOllama(latency_s=0.02) as stub:
+            client = BatchEmbedder(host=stub.url)
+    - latency_s: custo fixo por requisição (rede + agendamento do servidor)
+    - per_item_s: custo adicional por texto embutido
+    - batch_endpoint: False simula um Ollama antigo sem /api/embed
+    - ttft_s: espera antes do 1º token de /api/generate e /api/chat (carga + avaliação do prompt)
+    - tokens_per_s: vazão da geração; reply_tokens: tamanho de cada resposta
+    - max_concurrent_generations: gerações simultâneas (o Ollama serializa na GPU; 1 = fila)
+    """
+
+    def __init__(
+        self,
+        latency_s: float = 0.01,
+        per_item_s: float = 0.001,
+        dim: int = 768,
+        batch_endpoint: bool = True,
+        ttft_s: float = 0.05,
+        tokens_per_s: float = 200.0,
+        reply_tokens: int = 64,
+        max_concurrent_generations: int = 1,
+    ):
+        self.latency_s = latency_s
+        self.per_item_s = per_item_s
+        self.dim = dim
+        self.batch_endpoint = batch_endpoint
+        self.ttft_s = ttft_s
+        self.tokens_per_s = tokens_per_s
+        self.reply_tokens = reply_tokens
+        self.requests = 0
+        self.generations = 0
+        self._gpu = threading.Semaphore(max(1, max_concurrent_generations))
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            # Cabeçalho e corpo saem em writes separados: com Nagle + ACK atrasado do cliente,
+            # cada resposta ganharia ~40 ms artificiais
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # cliente fechou a conexão no meio do streaming (parou de ler após done)
+
+            def _send_json(self, obj, status=200):
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_not_found(self):
+                body = b"404 page not found"
+                self.send_response(404)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_chunk(self, obj):
+                # Transfer-Encoding: chunked, uma linha NDJSON por pedaço (como o Ollama)
+                line = (json.dumps(obj) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+            def _generate(self, payload, chat: bool):
+                model = payload.get("model")
+                if not model:
+                    self._send_json({"error": "model is required"}, status=400)
+                    return
+                if chat:
+                    prompt = "".join(m.get("content", "") for m in payload.get("messages") or [])
+                else:
+                    prompt = payload.get("prompt", "")
+                words = [_WORDS[i % len(_WORDS)] + " " for i in range(stub.reply_tokens)]
+
+                def piece(text, done, **extra):
+                    out = {"model": model, "done": done, **extra}
+                    if chat:
+                        out["message"] = {"role": "assistant", "content": text}
+                    else:
+                        out["response"] = text
+                    return out
+
+                with stub._gpu:
+                    with stub._lock:
+                        stub.generations += 1
+                    start = time.perf_counter()
+                    time.sleep(stub.ttft_s)
+                    prompt_ns = int((time.perf_counter() - start) * 1e9)
+                    stats = lambda: {  # noqa: E731
+                        "total_duration": int((time.perf_counter() - start) * 1e9),
+                        "load_duration": 0,
+                        "prompt_eval_count": max(1, len(prompt) // 4),
+                        "prompt_eval_duration": prompt_ns,
+                        "eval_count": len(words),
+                        "eval_duration": max(1, int((time.perf_counter() - start) * 1e9) - prompt_ns),
+                    }
+                    if not payload.get("stream", True):
+                        time.sleep(len(words) / stub.tokens_per_s)
+                        self._send_json(piece("".join(words), True, **stats()))
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    try:
+                        for w in words:
+                            self._send_chunk(piece(w, False))
+                            time.sleep(1 / stub.tokens_per_s)
+                        self._send_chunk(piece("", True, **stats()))
+                        self.wfile.write(b"0\r\n\r\n")
+                    except (BrokenPipeError, ConnectionResetError):
+                        self.close_connection = True  # cliente cancelou no meio: libera a "GPU"
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                if self.path == "/api/tags":
+                    self._send_json({"models": STUB_MODELS})
+                else:
+                    self._send_not_found()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with stub._lock:
+                    stub.requests += 1
+
+                if self.path == "/api/embed" and stub.batch_endpoint:
+                    texts = payload.get("input") or []
+                    if isinstance(texts, str):
+                        texts = [texts]
+                    time.sleep(stub.latency_s + stub.per_item_s * len(texts))
+                    self._send_json({"model": payload.get("model"), "embeddings": [fake_vector(t, stub.dim) for t in texts]})
+                elif self.path == "/api/embeddings":
+                    time.sleep(stub.latency_s + stub.per_item_s)
+                    self._send_json({"embedding": fake_vector(payload.get("prompt", ""), stub.dim)})
+                elif self.path in ("/api/generate", "/api/chat"):
+                    self._generate(payload, chat=self.path == "/api/chat")
+                else:
+                    self._send_not_found()
+
+        return Handler